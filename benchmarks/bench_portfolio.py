@@ -0,0 +1,204 @@
+"""
+Бенчмарк: пересчёт метрик в каждом экране против общего Portfolio.
+
+Старый путь — как было в хендлерах: каждый экран (дашборд, отчёт,
+инвестиции, счётчик боли, аналитика) сам проходит по подпискам
+и зовёт get_monthly_price со словарём на каждый вызов.
+Новый — один Portfolio на запрос, экраны читают готовые агрегаты.
+
+База не нужна, подписки синтетические.
+
+    python -m benchmarks.bench_portfolio --sizes 1 10 100 1000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+_tmp_dir = tempfile.mkdtemp(prefix="subkiller_bench_")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from bot.config import SUBSCRIPTION_CATEGORIES  # noqa: E402
+from bot.database import (  # noqa: E402
+    BillingCycle, SubscriptionStatus, UsageLevel,
+)
+from bot.services.portfolio import (  # noqa: E402
+    Portfolio, investment_projection,
+)
+from bot.services.read_models import SubRow  # noqa: E402
+from bot.utils.helpers import (  # noqa: E402
+    get_health_score, calculate_lifetime_loss,
+)
+
+
+def _legacy_monthly(price: float, billing_cycle: str) -> float:
+    """get_monthly_price в старом виде — словарь на каждый вызов."""
+    multipliers = {
+        BillingCycle.WEEKLY.value: 4.33,
+        BillingCycle.MONTHLY.value: 1.0,
+        BillingCycle.QUARTERLY.value: 1 / 3,
+        BillingCycle.SEMI_ANNUAL.value: 1 / 6,
+        BillingCycle.ANNUAL.value: 1 / 12,
+    }
+    return price * multipliers.get(billing_cycle, 1.0)
+
+
+def _legacy_investment(monthly: float, years: int, rate: float) -> float:
+    monthly_rate = rate / 12
+    months = years * 12
+    fv = monthly * (((1 + monthly_rate) ** months - 1) / monthly_rate)
+    return round(fv, 0)
+
+
+def make_rows(n: int, rng: random.Random) -> list[SubRow]:
+    cycles = [c.value for c in BillingCycle]
+    levels = [lvl.value for lvl in UsageLevel]
+    statuses = [
+        SubscriptionStatus.ACTIVE.value,
+        SubscriptionStatus.ACTIVE.value,
+        SubscriptionStatus.TRIAL.value,
+        SubscriptionStatus.CANCELLED.value,
+    ]
+    categories = list(SUBSCRIPTION_CATEGORIES)
+    rows = []
+    for i in range(n):
+        price = float(rng.randint(99, 2999))
+        cycle = rng.choice(cycles)
+        rows.append(SubRow(
+            id=i,
+            name=f"Sub {i}",
+            category=rng.choice(categories),
+            price=price,
+            billing_cycle=cycle,
+            status=rng.choice(statuses),
+            usage_level=rng.choice(levels),
+            last_used=date.today(),
+            monthly=_legacy_monthly(price, cycle),
+        ))
+    return rows
+
+
+def legacy_screens(rows: list[SubRow]) -> tuple:
+    """Все экраны по-старому: отдельный проход на каждый."""
+    active = [
+        s for s in rows
+        if s.status in (
+            SubscriptionStatus.ACTIVE.value,
+            SubscriptionStatus.TRIAL.value,
+        )
+    ]
+    wasted_levels = (UsageLevel.LOW.value, UsageLevel.NONE.value)
+    results = []
+
+    # Дашборд здоровья и еженедельный отчёт
+    for unknown_share in (0.5, 0.3):
+        total = wasted = 0
+        used = 0
+        for s in active:
+            m = _legacy_monthly(s.price, s.billing_cycle)
+            total += m
+            if s.usage_level in (
+                UsageLevel.HIGH.value, UsageLevel.MEDIUM.value,
+            ):
+                used += 1
+            elif s.usage_level in wasted_levels:
+                wasted += m
+            else:
+                wasted += m * unknown_share
+        results.append(get_health_score(len(active), used, total, wasted))
+
+    # Инвестиции
+    wasted = sum(
+        _legacy_monthly(s.price, s.billing_cycle)
+        * (1 if s.usage_level in wasted_levels else 0.5)
+        for s in active
+        if s.usage_level in wasted_levels
+        or s.usage_level == UsageLevel.UNKNOWN.value
+    )
+    results.append([
+        _legacy_investment(wasted, y, 0.10) for y in (1, 5, 10, 20)
+    ])
+
+    # Счётчик боли
+    results.append(calculate_lifetime_loss(wasted))
+
+    # Аналитика: категории, отменённые, самая дорогая
+    categories: dict[str, float] = {}
+    for s in active:
+        m = _legacy_monthly(s.price, s.billing_cycle)
+        categories[s.category] = categories.get(s.category, 0) + m
+    saved = sum(
+        _legacy_monthly(s.price, s.billing_cycle)
+        for s in rows
+        if s.status == SubscriptionStatus.CANCELLED.value
+    )
+    most = max(
+        active,
+        key=lambda s: _legacy_monthly(s.price, s.billing_cycle),
+        default=None,
+    )
+    results.append((categories, saved, most))
+    return tuple(results)
+
+
+def portfolio_screens(rows: list[SubRow]) -> tuple:
+    """Те же экраны из одного Portfolio."""
+    p = Portfolio(rows)
+    wasted = p.wasted_monthly(0.5)
+    return (
+        p.health_score(0.5),
+        p.health_score(0.3),
+        investment_projection(wasted, (1, 5, 10, 20), 0.10),
+        p.pain(0.5)["lifetime_wasted"],
+        (p.by_category(), p.saved_monthly, p.most_expensive()),
+    )
+
+
+def measure(fn, rows, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> float:
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"  {name:<10} median {median:9.1f} мкс   p95 {p95:9.1f} мкс")
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for n in args.sizes:
+        rows = make_rows(n, rng)
+        # Прогрев
+        legacy_screens(rows)
+        portfolio_screens(rows)
+
+        print(f"Подписок: {n}")
+        old = report("legacy", measure(legacy_screens, rows, args.repeat))
+        new = report("portfolio", measure(portfolio_screens, rows, args.repeat))
+        print(f"  ускорение: x{old / new:.2f}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Бенчмарк: ORM-сущности Subscription против read-моделей SubRow.
+
+Создаёт временную SQLite-базу с пользователями, у каждого
+из которых 50+ подписок, и сравнивает время и пиковую память
+загрузки одного пользователя.
+
+    python -m benchmarks.bench_read_models --users 20 --subs 60
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_tmp_dir = tempfile.mkdtemp(prefix="subkiller_bench_")
+os.environ["DATABASE_URL"] = (
+    f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import select, insert  # noqa: E402
+
+from bot.database import (  # noqa: E402
+    async_session, init_db, User, Subscription,
+    BillingCycle, SubscriptionStatus, UsageLevel,
+)
+from bot.services.read_models import load_sub_rows  # noqa: E402
+from bot.services.stats_service import ACTIVE_STATUSES  # noqa: E402
+from bot.utils.helpers import get_monthly_price  # noqa: E402
+
+
+async def seed(users: int, subs_per_user: int) -> list[int]:
+    """Заполнить базу тестовыми данными."""
+    await init_db()
+    cycles = [c.value for c in BillingCycle]
+    levels = [lvl.value for lvl in UsageLevel]
+    statuses = [
+        SubscriptionStatus.ACTIVE.value,
+        SubscriptionStatus.ACTIVE.value,
+        SubscriptionStatus.TRIAL.value,
+        SubscriptionStatus.CANCELLED.value,
+    ]
+
+    async with async_session() as session:
+        await session.execute(insert(User), [
+            {
+                "telegram_id": 10_000 + i,
+                "referral_code": f"bench_{i}",
+            }
+            for i in range(users)
+        ])
+        user_ids = list(
+            (await session.execute(select(User.id))).scalars()
+        )
+        await session.execute(insert(Subscription), [
+            {
+                "user_id": uid,
+                "name": f"Service {j}",
+                "category": "other",
+                "price": random.uniform(99, 2990),
+                "billing_cycle": random.choice(cycles),
+                "status": random.choice(statuses),
+                "usage_level": random.choice(levels),
+                "notes": "x" * 200,
+                "cancel_url": "https://example.com/cancel",
+            }
+            for uid in user_ids
+            for j in range(subs_per_user)
+        ])
+        await session.commit()
+    return user_ids
+
+
+async def load_orm(user_id: int) -> float:
+    async with async_session() as session:
+        result = await session.execute(
+            select(Subscription).where(
+                Subscription.user_id == user_id,
+                Subscription.status.in_(ACTIVE_STATUSES),
+            )
+        )
+        subs = list(result.scalars().all())
+    return sum(
+        get_monthly_price(s.price, s.billing_cycle) for s in subs
+    )
+
+
+async def load_rows(user_id: int) -> float:
+    subs = await load_sub_rows(user_id)
+    return sum(s.monthly for s in subs)
+
+
+async def measure(fn, user_ids: list[int], rounds: int) -> dict:
+    """Медианное время на пользователя и пиковая память."""
+    # Прогрев
+    for uid in user_ids[:3]:
+        await fn(uid)
+
+    timings = []
+    for _ in range(rounds):
+        for uid in user_ids:
+            start = time.perf_counter()
+            await fn(uid)
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    for uid in user_ids:
+        await fn(uid)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95)] * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--subs", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    user_ids = await seed(args.users, args.subs)
+    print(
+        f"Пользователей: {args.users}, "
+        f"подписок у каждого: {args.subs}"
+    )
+
+    for label, fn in (
+        ("ORM Subscription", load_orm),
+        ("SubRow", load_rows),
+    ):
+        r = await measure(fn, user_ids, args.rounds)
+        print(
+            f"{label:<18} median {r['median_ms']:.2f} ms  "
+            f"p95 {r['p95_ms']:.2f} ms  "
+            f"peak {r['peak_kb']:.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
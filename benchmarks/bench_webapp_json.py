@@ -0,0 +1,176 @@
+"""
+Бенчмарк: сериализация ответов Mini App.
+
+Старый путь — как было в webapp/app.py: хендлер собирает dict,
+FastAPI прогоняет его через jsonable_encoder и стандартный
+JSONResponse; справочники кодируются на каждый запрос.
+Новый — реальные эндпоинты: orjson, SubscriptionOut,
+предкодированные справочники.
+
+Запросы идут в процессе через ASGI-транспорт httpx (без сети),
+база — временный SQLite. Заодно проверяется, что тела ответов
+совпадают.
+
+    python -m benchmarks.bench_webapp_json --subs 10 50 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="subkiller_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp_dir}/bench.db"
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+# Меряется сериализация: запросы без initData и без лимитов
+os.environ["WEBAPP_AUTH_REQUIRED"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import insert, select, delete  # noqa: E402
+
+from bot.config import (  # noqa: E402
+    POPULAR_SUBSCRIPTIONS, SUBSCRIPTION_CATEGORIES,
+)
+from bot.database import (  # noqa: E402
+    async_session, init_db, User, Subscription,
+)
+from bot.services.read_models import load_sub_list_rows  # noqa: E402
+from bot.utils.helpers import billing_cycle_name, days_until  # noqa: E402
+from webapp.app import app  # noqa: E402
+
+TELEGRAM_ID = 777
+
+legacy = FastAPI()
+
+
+@legacy.get("/api/popular-subscriptions")
+async def legacy_popular():
+    return {
+        "subscriptions": POPULAR_SUBSCRIPTIONS,
+        "categories": SUBSCRIPTION_CATEGORIES,
+    }
+
+
+@legacy.get("/api/subscriptions/{telegram_id}")
+async def legacy_subscriptions(telegram_id: int):
+    async with async_session() as session:
+        user = (await session.execute(
+            select(User).where(User.telegram_id == telegram_id)
+        )).scalar_one_or_none()
+    if not user:
+        raise HTTPException(404, "User not found")
+
+    subs = await load_sub_list_rows(user.id)
+    subscriptions = []
+    for s in subs:
+        subscriptions.append({
+            "id": s.id,
+            "name": s.name,
+            "price": s.price,
+            "monthly_price": s.monthly,
+            "category": s.category,
+            "category_name": SUBSCRIPTION_CATEGORIES.get(
+                s.category, "Другое"
+            ),
+            "billing_cycle": s.billing_cycle,
+            "billing_cycle_name": billing_cycle_name(s.billing_cycle),
+            "status": s.status,
+            "usage_level": s.usage_level,
+            "is_trial": s.is_trial,
+            "trial_end_date": (
+                s.trial_end_date.isoformat()
+                if s.trial_end_date else None
+            ),
+            "next_billing_date": (
+                s.next_billing_date.isoformat()
+                if s.next_billing_date else None
+            ),
+            "days_until_billing": (
+                days_until(s.next_billing_date)
+                if s.next_billing_date else None
+            ),
+            "last_used": s.last_used.isoformat() if s.last_used else None,
+            "notes": s.notes,
+            "created_at": s.created_at.isoformat(),
+        })
+    return {"subscriptions": subscriptions}
+
+
+async def seed(n: int) -> None:
+    from datetime import date, timedelta
+
+    async with async_session() as session:
+        await session.execute(delete(Subscription))
+        await session.execute(delete(User))
+        await session.execute(insert(User), [
+            {"id": 1, "telegram_id": TELEGRAM_ID, "referral_code": "bench"}
+        ])
+        categories = list(SUBSCRIPTION_CATEGORIES)
+        await session.execute(insert(Subscription), [
+            {
+                "user_id": 1,
+                "name": f"Подписка {i}",
+                "price": 99.0 + i,
+                "category": categories[i % len(categories)],
+                "next_billing_date": date.today() + timedelta(days=i % 30),
+                "last_used": date.today() - timedelta(days=i % 10),
+                "notes": "заметка" if i % 3 else None,
+            }
+            for i in range(n)
+        ])
+        await session.commit()
+
+
+async def rps(client: httpx.AsyncClient, path: str, seconds: float) -> float:
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        r = await client.get(path)
+        r.raise_for_status()
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subs", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    await init_db()
+    old = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=legacy), base_url="http://bench"
+    )
+    new = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    )
+
+    paths = [("/api/popular-subscriptions", None)] + [
+        (f"/api/subscriptions/{TELEGRAM_ID}", n) for n in args.subs
+    ]
+    for path, n in paths:
+        if n is not None:
+            await seed(n)
+        a = (await old.get(path)).json()
+        b = (await new.get(path)).json()
+        assert json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+        before = await rps(old, path, args.seconds)
+        after = await rps(new, path, args.seconds)
+        label = path if n is None else f"{path} ({n} подп.)"
+        print(label)
+        print(f"  до      {before:8.0f} req/s")
+        print(f"  после   {after:8.0f} req/s   x{after / before:.2f}\n")
+
+    await old.aclose()
+    await new.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
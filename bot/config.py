@@ -43,21 +43,39 @@ class GigaChatConfig:
 class YooKassaConfig:
     shop_id: str = ""
     secret_key: str = ""
+    api_url: str = "https://api.yookassa.ru/v3"
+    # Таймауты запросов к API (сек)
+    timeout: float = 15.0
+    connect_timeout: float = 5.0
+    max_connections: int = 10
+    # Повторы при сетевой ошибке, 5xx и 202 (тот же ключ идемпотентности)
+    retries: int = 2
 
     def __post_init__(self):
         self.shop_id = os.getenv("YOOKASSA_SHOP_ID", "")
         self.secret_key = os.getenv("YOOKASSA_SECRET_KEY", "")
+        self.timeout = float(os.getenv("YOOKASSA_TIMEOUT", "15"))
+        self.retries = int(os.getenv("YOOKASSA_RETRIES", "2"))
 
 
 @dataclass
 class DatabaseConfig:
     url: str = ""
+    write_queue: bool = False
+    write_queue_interval_ms: int = 50
 
     def __post_init__(self):
         self.url = os.getenv(
             "DATABASE_URL",
             "sqlite+aiosqlite:///./subkiller.db"
         )
+        # Отложенная запись мелких обновлений (см. write_queue)
+        self.write_queue = os.getenv(
+            "WRITE_QUEUE_ENABLED", ""
+        ).lower() in ("1", "true", "yes")
+        self.write_queue_interval_ms = int(
+            os.getenv("WRITE_QUEUE_INTERVAL_MS", "50")
+        )
 
 
 @dataclass
@@ -65,10 +83,23 @@ class WebAppConfig:
     url: str = ""
     host: str = "0.0.0.0"
     port: int = 8080
+    # Проверка initData в /api/* (выключать только для локальной отладки)
+    auth_required: bool = True
+    # Срок жизни initData (сек)
+    auth_max_age: int = 86400
+    # Разработка: страницы пересобираются при изменении шаблонов
+    dev_mode: bool = False
 
     def __post_init__(self):
         self.url = os.getenv("WEBAPP_URL", "https://your-app.railway.app")
         self.host = os.getenv("WEBAPP_HOST", "0.0.0.0")
+        self.auth_required = os.getenv(
+            "WEBAPP_AUTH_REQUIRED", "true"
+        ).lower() in ("1", "true", "yes")
+        self.auth_max_age = int(os.getenv("WEBAPP_AUTH_MAX_AGE", "86400"))
+        self.dev_mode = os.getenv(
+            "WEBAPP_DEV", ""
+        ).lower() in ("1", "true", "yes")
         
         # Railway ставит PORT автоматически
         port_str = os.getenv("PORT", "") or os.getenv("WEBAPP_PORT", "") or "8080"
@@ -78,6 +109,34 @@ class WebAppConfig:
             self.port = 8080
 
 
+@dataclass
+class RateLimitConfig:
+    enabled: bool = True
+    # Пользователь: запросов в секунду и запас на всплеск
+    user_rate: float = 5.0
+    user_burst: int = 30
+    # IP (за одним адресом бывает много пользователей)
+    ip_rate: float = 20.0
+    ip_burst: int = 100
+    # Одновременных запросов к /api/* на процесс, сверх — 429
+    max_concurrent: int = 64
+    # Сколько ключей держать и через сколько секунд простоя забыть
+    max_keys: int = 10000
+    idle_ttl: int = 600
+
+    def __post_init__(self):
+        self.enabled = os.getenv(
+            "RATE_LIMIT_ENABLED", "true"
+        ).lower() in ("1", "true", "yes")
+        self.user_rate = float(os.getenv("RATE_LIMIT_USER_RPS", "5"))
+        self.user_burst = int(os.getenv("RATE_LIMIT_USER_BURST", "30"))
+        self.ip_rate = float(os.getenv("RATE_LIMIT_IP_RPS", "20"))
+        self.ip_burst = int(os.getenv("RATE_LIMIT_IP_BURST", "100"))
+        self.max_concurrent = int(
+            os.getenv("RATE_LIMIT_MAX_CONCURRENT", "64")
+        )
+
+
 @dataclass
 class PremiumConfig:
     price: int = 490
@@ -88,6 +147,70 @@ class PremiumConfig:
         self.trial_days = int(os.getenv("PREMIUM_TRIAL_DAYS", "7"))
 
 
+@dataclass
+class RetentionConfig:
+    notifications_days: int = 30
+    social_proof_days: int = 7
+    batch_size: int = 500
+    archive_dir: str = ""
+    full_vacuum: bool = False
+
+    def __post_init__(self):
+        self.notifications_days = int(
+            os.getenv("RETENTION_NOTIFICATIONS_DAYS", "30")
+        )
+        self.social_proof_days = int(
+            os.getenv("RETENTION_SOCIAL_PROOF_DAYS", "7")
+        )
+        self.batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+        # Пусто — удалённые строки не архивируются
+        self.archive_dir = os.getenv("RETENTION_ARCHIVE_DIR", "")
+        # Разрешить разовый полный VACUUM для перевода SQLite
+        # в режим auto_vacuum=INCREMENTAL
+        self.full_vacuum = os.getenv(
+            "RETENTION_FULL_VACUUM", ""
+        ).lower() in ("1", "true", "yes")
+
+
+@dataclass
+class PredictionConfig:
+    model_path: str = "abandon_model.json"
+    uncertainty: float = 0.1
+    gigachat_max_calls: int = 3
+    min_samples: int = 200
+
+    def __post_init__(self):
+        # Коэффициенты локальной модели заброса (JSON)
+        self.model_path = os.getenv(
+            "PREDICTION_MODEL_PATH", "abandon_model.json"
+        )
+        # |p - 0.5| меньше порога — модель не уверена, спрашиваем GigaChat
+        self.uncertainty = float(
+            os.getenv("PREDICTION_UNCERTAINTY", "0.1")
+        )
+        self.gigachat_max_calls = int(
+            os.getenv("PREDICTION_GIGACHAT_MAX_CALLS", "3")
+        )
+        self.min_samples = int(
+            os.getenv("PREDICTION_MIN_SAMPLES", "200")
+        )
+
+
+@dataclass
+class ProcessConfig:
+    # combined — всё в одном процессе; bot / web / worker — раздельно
+    role: str = "combined"
+    # Число процессов uvicorn в роли web
+    web_workers: int = 1
+
+    def __post_init__(self):
+        self.role = os.getenv("APP_ROLE", "combined").lower()
+        self.web_workers = int(
+            os.getenv("WEB_CONCURRENCY", "")
+            or min(4, os.cpu_count() or 1)
+        )
+
+
 # Категории подписок
 SUBSCRIPTION_CATEGORIES: dict[str, str] = {
     "streaming": "🎬 Стриминг",
@@ -387,7 +510,13 @@ class Config:
     yookassa: YooKassaConfig = field(default_factory=YooKassaConfig)
     db: DatabaseConfig = field(default_factory=DatabaseConfig)
     webapp: WebAppConfig = field(default_factory=WebAppConfig)
+    rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
     premium: PremiumConfig = field(default_factory=PremiumConfig)
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
+    prediction: PredictionConfig = field(
+        default_factory=PredictionConfig
+    )
+    process: ProcessConfig = field(default_factory=ProcessConfig)
 
 
 
@@ -1,17 +1,26 @@
-from bot.database.database import async_session, init_db, get_session
+from bot.database.database import (
+    async_session, init_db, get_session, dialect_insert,
+)
 from bot.database.models import (
     User, Subscription, UserAchievement,
-    Payment, Notification, SocialProofEvent,
-    GlobalStats, Base, BillingCycle,
-    SubscriptionStatus, UsageLevel,
-    NotificationType, PaymentStatus,
+    Payment, PaymentEvent, Notification, SocialProofEvent,
+    GlobalStats, UserStats, SubscriptionPrediction,
+    DistributionSnapshot, UserDataVersion,
+    Base, BillingCycle, SubscriptionStatus, UsageLevel,
+    NotificationType, PaymentStatus, PaymentEventStatus,
+)
+from bot.database.versioning import (
+    bump_data_version, bump_for_rows, get_data_version,
 )
 
 __all__ = [
-    "async_session", "init_db", "get_session",
+    "async_session", "init_db", "get_session", "dialect_insert",
     "User", "Subscription", "UserAchievement",
-    "Payment", "Notification", "SocialProofEvent",
-    "GlobalStats", "Base", "BillingCycle",
+    "Payment", "PaymentEvent", "Notification", "SocialProofEvent",
+    "GlobalStats", "UserStats", "SubscriptionPrediction",
+    "DistributionSnapshot", "UserDataVersion",
+    "bump_data_version", "bump_for_rows", "get_data_version",
+    "Base", "BillingCycle",
     "SubscriptionStatus", "UsageLevel",
-    "NotificationType", "PaymentStatus",
+    "NotificationType", "PaymentStatus", "PaymentEventStatus",
 ]
\ No newline at end of file
@@ -21,9 +21,22 @@ async_session = async_sessionmaker(
 )
 
 
+def dialect_insert(model):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта БД."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
 async def init_db():
     """Создание всех таблиц."""
     async with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Действует только для новой (пустой) базы — позволяет
+            # retention-задаче освобождать место incremental_vacuum
+            await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
         await conn.run_sync(Base.metadata.create_all)
 
 
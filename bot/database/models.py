@@ -56,6 +56,13 @@ class PaymentStatus(str, enum.Enum):
     FAILED = "failed"
 
 
+class PaymentEventStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
 # ============== USERS ==============
 
 class User(Base):
@@ -304,6 +311,37 @@ class Payment(Base):
     )
 
 
+class PaymentEvent(Base):
+    """
+    Сырое уведомление YooKassa. Пара (платёж, событие) — ключ,
+    повторные доставки того же события схлопываются.
+    Обрабатывается фоновым обработчиком (payment_events).
+    """
+    __tablename__ = "payment_events"
+
+    payment_id: Mapped[str] = mapped_column(
+        String(255), primary_key=True
+    )
+    event: Mapped[str] = mapped_column(
+        String(60), primary_key=True
+    )  # payment.succeeded, payment.canceled, ...
+    payload: Mapped[str] = mapped_column(Text)  # JSON как пришёл
+    status: Mapped[str] = mapped_column(
+        String(20), default=PaymentEventStatus.PENDING.value, index=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True
+    )
+    received_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+    # Последний захват или завершение обработки
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, nullable=True
+    )
+
+
 # ============== NOTIFICATIONS ==============
 
 class Notification(Base):
@@ -392,4 +430,124 @@ class GlobalStats(Base):
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow
-    )
\ No newline at end of file
+    )
+
+# ============== USER STATS ==============
+
+class UserStats(Base):
+    """
+    Агрегаты по подпискам пользователя.
+    Обновляются инкрементально в той же транзакции,
+    что и изменение подписки.
+    """
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), primary_key=True
+    )
+    total_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )
+    active_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )  # active + trial
+    cancelled_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )
+    used_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )  # активные с high/medium
+    wasted_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )  # активные с low/none
+    unknown_count: Mapped[int] = mapped_column(
+        Integer, default=0
+    )  # активные без оценки
+    total_monthly: Mapped[float] = mapped_column(
+        Float, default=0.0
+    )
+    wasted_monthly: Mapped[float] = mapped_column(
+        Float, default=0.0
+    )
+    unknown_monthly: Mapped[float] = mapped_column(
+        Float, default=0.0
+    )
+    saved_monthly: Mapped[float] = mapped_column(
+        Float, default=0.0
+    )  # сумма отменённых
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+# ============== PREDICTIONS ==============
+
+class SubscriptionPrediction(Base):
+    """
+    Оценка риска заброса подписки.
+    Пересчитывается ночным пакетным заданием.
+    """
+    __tablename__ = "subscription_predictions"
+
+    subscription_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("subscriptions.id"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False, index=True
+    )
+    probability: Mapped[int] = mapped_column(
+        Integer, default=0
+    )  # 5..95, %
+    usage_level: Mapped[str] = mapped_column(
+        String(20), default=UsageLevel.UNKNOWN.value
+    )  # на момент оценки
+    waste_6m: Mapped[float] = mapped_column(
+        Float, default=0.0
+    )
+    days_since_last_use: Mapped[int] = mapped_column(
+        Integer, default=0
+    )
+    model: Mapped[str] = mapped_column(
+        String(30), default="heuristic"
+    )
+    scored_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+# ============== DATA VERSIONS ==============
+
+class UserDataVersion(Base):
+    """
+    Версия данных пользователя для ETag в Mini App.
+    Увеличивается при любой записи в users/subscriptions.
+    """
+    __tablename__ = "user_data_versions"
+
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+# ============== DISTRIBUTIONS ==============
+
+class DistributionSnapshot(Base):
+    """
+    Гистограмма метрики по всем пользователям.
+    Пересобирается периодическим заданием.
+    """
+    __tablename__ = "distribution_snapshots"
+
+    metric: Mapped[str] = mapped_column(
+        String(60), primary_key=True
+    )  # health_score, monthly_spend, category:streaming, ...
+    edges: Mapped[str] = mapped_column(Text)  # JSON: левые границы корзин
+    counts: Mapped[str] = mapped_column(Text)  # JSON: число пользователей
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    built_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
@@ -0,0 +1,96 @@
+"""
+Версии данных пользователя (user_data_versions).
+
+ORM-записи в User, Subscription и UserAchievement учитываются
+автоматически — обработчиком after_flush, в той же транзакции.
+Core-запросы (insert/update мимо ORM, очередь записи) вызывают
+bump_data_version сами.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from bot.database.database import async_session, dialect_insert
+from bot.database.models import (
+    User, Subscription, UserAchievement, UserDataVersion,
+)
+
+
+def _bump_stmt(user_ids: Iterable[int]):
+    now = datetime.utcnow()
+    stmt = dialect_insert(UserDataVersion).values([
+        {"user_id": uid, "version": 1, "updated_at": now}
+        for uid in sorted(set(user_ids))
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "version": UserDataVersion.version + 1,
+            "updated_at": now,
+        },
+    )
+
+
+async def bump_data_version(session: AsyncSession, *user_ids: int) -> None:
+    """Увеличить версии. Коммит остаётся за вызывающим кодом."""
+    ids = [uid for uid in user_ids if uid is not None]
+    if ids:
+        await session.execute(_bump_stmt(ids))
+
+
+async def bump_for_rows(session: AsyncSession, model, pks: Iterable) -> None:
+    """Увеличить версии владельцев строк User/Subscription."""
+    pks = list(pks)
+    if not pks:
+        return
+    if model is User:
+        await bump_data_version(session, *pks)
+    elif model is Subscription:
+        result = await session.execute(
+            select(Subscription.user_id)
+            .where(Subscription.id.in_(pks))
+            .distinct()
+        )
+        await bump_data_version(session, *result.scalars())
+
+
+async def get_data_version(telegram_id: int) -> Optional[tuple[int, int]]:
+    """
+    (user_id, версия) по telegram_id одним запросом
+    без обращения к подпискам. None — пользователя нет.
+    """
+    async with async_session() as session:
+        row = (await session.execute(
+            select(User.id, UserDataVersion.version)
+            .outerjoin(
+                UserDataVersion, UserDataVersion.user_id == User.id
+            )
+            .where(User.telegram_id == telegram_id)
+        )).one_or_none()
+    if row is None:
+        return None
+    return row[0], row[1] or 0
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session: Session, flush_context) -> None:
+    """Пользователи, чьи данные меняет этот flush."""
+    user_ids = set()
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Subscription):
+            user_ids.add(obj.user_id)
+    for obj in (*session.new, *session.deleted):
+        # Ачивки тоже отдаются в /api/bootstrap
+        if isinstance(obj, (Subscription, UserAchievement)):
+            user_ids.add(obj.user_id)
+    user_ids.discard(None)
+    if user_ids:
+        session.connection().execute(_bump_stmt(user_ids))
@@ -1,24 +1,22 @@
 """🔮 Предсказатель утечки денег + 📊 Дашборд здоровья."""
 
 import logging
-from datetime import date, datetime
+from datetime import date
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
-from bot.services.gigachat_service import gigachat_service
-from bot.utils.helpers import (
-    format_money, get_monthly_price,
-    get_health_score, health_emoji,
-)
+from bot.database import async_session, User, UsageLevel
+from bot.utils.helpers import format_money, health_emoji
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import SUBSCRIPTION_CATEGORIES
+from bot.services.portfolio import Portfolio
+from bot.services.distribution_service import compare_portfolio
+from bot.services.prediction_service import (
+    load_predictions, refine_uncertain,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -58,20 +56,11 @@ async def show_predictions(callback: CallbackQuery):
         await callback.answer()
         return
 
-    # Загружаем подписки
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status.in_([
-                    SubscriptionStatus.ACTIVE.value,
-                    SubscriptionStatus.TRIAL.value,
-                ]),
-            )
-        )
-        subs = list(result.scalars().all())
+    # Оценки посчитаны ночным пересчётом; GigaChat — только
+    # для подписок, где локальная модель не уверена
+    predictions = await refine_uncertain(await load_predictions(user.id))
 
-    if not subs:
+    if not predictions:
         await callback.message.edit_text(
             "🔮 <b>Предсказатель</b>\n\n"
             "Добавь подписки, чтобы я мог предсказать утечки.",
@@ -80,54 +69,11 @@ async def show_predictions(callback: CallbackQuery):
         await callback.answer()
         return
 
-    loading_msg = await callback.message.edit_text(
-        "🔮 Анализирую твои подписки...\n"
-        "Предсказываю будущее... ⏳"
-    )
-
     text = "🔮 <b>ПРЕДСКАЗАТЕЛЬ УТЕЧКИ ДЕНЕГ</b>\n\n"
     total_predicted_waste = 0
 
-    for sub in subs:
-        days_since_signup = (
-            datetime.utcnow() - sub.created_at
-        ).days
-        days_since_last_use = 0
-        if sub.last_used:
-            days_since_last_use = (
-                date.today() - sub.last_used
-            ).days
-        elif sub.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        ):
-            days_since_last_use = days_since_signup
-
-        monthly = get_monthly_price(sub.price, sub.billing_cycle)
-
-        try:
-            prediction = (
-                await gigachat_service.analyze_usage_prediction(
-                    sub_name=sub.name,
-                    days_since_signup=days_since_signup,
-                    days_since_last_use=days_since_last_use,
-                    monthly_price=monthly,
-                )
-            )
-        except Exception as e:
-            logger.error(f"Prediction error for {sub.name}: {e}")
-            # Фоллбэк-предсказание
-            abandon_prob = min(95, days_since_last_use * 2)
-            prediction = {
-                "will_abandon": days_since_last_use > 30,
-                "probability_percent": abandon_prob,
-                "predicted_waste_6months": monthly * 6,
-                "recommendation": "Оцени использование",
-                "reason": (
-                    f"Не использовалось {days_since_last_use} дней"
-                ),
-            }
-
+    for sub, prediction in predictions:
+        monthly = sub.monthly
         prob = prediction.get("probability_percent", 50)
         waste = prediction.get(
             "predicted_waste_6months", monthly * 6
@@ -192,7 +138,7 @@ async def show_predictions(callback: CallbackQuery):
         )
     )
 
-    await loading_msg.edit_text(
+    await callback.message.edit_text(
         text, reply_markup=builder.as_markup()
     )
     await callback.answer()
@@ -221,27 +167,9 @@ async def show_health_dashboard(event: Message | CallbackQuery):
             await event.answer(text)
         return
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status.in_([
-                    SubscriptionStatus.ACTIVE.value,
-                    SubscriptionStatus.TRIAL.value,
-                ]),
-            )
-        )
-        active_subs = list(result.scalars().all())
-
-        cancelled_result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status == SubscriptionStatus.CANCELLED.value,
-            )
-        )
-        cancelled_subs = list(cancelled_result.scalars().all())
+    portfolio = await Portfolio.load(user.id)
 
-    if not active_subs and not cancelled_subs:
+    if not portfolio.active_count and not portfolio.cancelled_count:
         text = (
             "📊 <b>Дашборд здоровья</b>\n\n"
             "Добавь подписки, чтобы увидеть отчёт."
@@ -255,38 +183,18 @@ async def show_health_dashboard(event: Message | CallbackQuery):
         return
 
     # Группируем подписки
-    green = []  # Активно используемые
-    yellow = []  # Редко
-    red = []  # Не используемые
-    unknown = []  # Не оценены
-
-    total_monthly = 0
-    wasted_monthly = 0
-
-    for s in active_subs:
-        monthly = get_monthly_price(s.price, s.billing_cycle)
-        total_monthly += monthly
-
-        if s.usage_level == UsageLevel.HIGH.value:
-            green.append(s)
-        elif s.usage_level == UsageLevel.MEDIUM.value:
-            yellow.append(s)
-        elif s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        ):
-            red.append(s)
-            wasted_monthly += monthly
-        else:
-            unknown.append(s)
-            wasted_monthly += monthly * 0.5
+    green = portfolio.active_rows(UsageLevel.HIGH.value)
+    yellow = portfolio.active_rows(UsageLevel.MEDIUM.value)
+    red = portfolio.active_rows(
+        UsageLevel.LOW.value, UsageLevel.NONE.value,
+    )
+    unknown = portfolio.active_rows(UsageLevel.UNKNOWN.value)
+
+    total_monthly = portfolio.total_monthly
+    wasted_monthly = portfolio.wasted_monthly(0.5)
 
     # Расчёт оценки
-    used_count = len(green) + len(yellow)
-    score = get_health_score(
-        len(active_subs), used_count,
-        total_monthly, wasted_monthly,
-    )
+    score = portfolio.health_score(0.5)
     h_emoji = health_emoji(score)
 
     text = f"📊 <b>ДАШБОРД ПОДПИСОЧНОГО ЗДОРОВЬЯ</b>\n\n"
@@ -298,30 +206,25 @@ async def show_health_dashboard(event: Message | CallbackQuery):
 
     # Зелёные
     if green:
-        green_total = sum(
-            get_monthly_price(s.price, s.billing_cycle) for s in green
-        )
+        green_total = portfolio.usage_monthly(UsageLevel.HIGH.value)
         text += (
             f"🟢 <b>Активно используешь</b> ({len(green)}): "
             f"{format_money(green_total)}\n"
         )
         for s in green:
-            m = get_monthly_price(s.price, s.billing_cycle)
+            m = s.monthly
             text += f"   {s.name} ({format_money(m)})\n"
         text += "\n"
 
     # Жёлтые
     if yellow:
-        yellow_total = sum(
-            get_monthly_price(s.price, s.billing_cycle)
-            for s in yellow
-        )
+        yellow_total = portfolio.usage_monthly(UsageLevel.MEDIUM.value)
         text += (
             f"🟡 <b>Редко используешь</b> ({len(yellow)}): "
             f"{format_money(yellow_total)}\n"
         )
         for s in yellow:
-            m = get_monthly_price(s.price, s.billing_cycle)
+            m = s.monthly
             last_use = ""
             if s.last_used:
                 days_ago = (date.today() - s.last_used).days
@@ -331,30 +234,28 @@ async def show_health_dashboard(event: Message | CallbackQuery):
 
     # Красные
     if red:
-        red_total = sum(
-            get_monthly_price(s.price, s.billing_cycle) for s in red
+        red_total = (
+            portfolio.usage_monthly(UsageLevel.LOW.value)
+            + portfolio.usage_monthly(UsageLevel.NONE.value)
         )
         text += (
             f"🔴 <b>Не используешь</b> ({len(red)}): "
             f"{format_money(red_total)}\n"
         )
         for s in red:
-            m = get_monthly_price(s.price, s.billing_cycle)
+            m = s.monthly
             text += f"   ❌ {s.name} ({format_money(m)})\n"
         text += "\n"
 
     # Не оценены
     if unknown:
-        unknown_total = sum(
-            get_monthly_price(s.price, s.billing_cycle)
-            for s in unknown
-        )
+        unknown_total = portfolio.usage_monthly(UsageLevel.UNKNOWN.value)
         text += (
             f"⚪ <b>Не оценено</b> ({len(unknown)}): "
             f"{format_money(unknown_total)}\n"
         )
         for s in unknown:
-            m = get_monthly_price(s.price, s.billing_cycle)
+            m = s.monthly
             text += f"   ❓ {s.name} ({format_money(m)})\n"
         text += "\n"
 
@@ -369,6 +270,26 @@ async def show_health_dashboard(event: Message | CallbackQuery):
         f"[{bar}]\n\n"
     )
 
+    # Сравнение со всеми пользователями
+    comparison = await compare_portfolio(portfolio)
+    if comparison:
+        text += (
+            f"👥 Здоровье лучше, чем у "
+            f"<b>{comparison['health_score']}%</b> пользователей\n"
+            f"💸 Тратишь больше, чем "
+            f"<b>{comparison['monthly_spend']}%</b> пользователей\n"
+        )
+        top = comparison.get("top_category")
+        if top:
+            cat_name = SUBSCRIPTION_CATEGORIES.get(
+                top["category"], "Другое"
+            )
+            text += (
+                f"📂 На «{cat_name}» — больше, чем "
+                f"<b>{top['percentile']}%</b>\n"
+            )
+        text += "\n"
+
     if wasted_monthly > 0:
         pct = int(wasted_monthly / total_monthly * 100) if total_monthly > 0 else 0
         text += (
@@ -7,12 +7,11 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from sqlalchemy import select, func
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
+from bot.database import async_session, User, UsageLevel
 from bot.services.gigachat_service import gigachat_service
-from bot.utils.helpers import format_money, get_monthly_price
+from bot.utils.helpers import format_money
+from bot.services.read_models import load_sub_list_rows
+from bot.services.portfolio import Portfolio
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import SUBSCRIBER_TYPES
 
@@ -53,13 +52,8 @@ async def show_dna_profile(callback: CallbackQuery):
         return
 
     # Собираем данные
-    async with async_session() as session:
-        all_subs = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id
-            )
-        )
-        subs = list(all_subs.scalars().all())
+    subs = await load_sub_list_rows(user.id)
+    portfolio = Portfolio(subs)
 
     if len(subs) < 1:
         await callback.message.edit_text(
@@ -75,23 +69,10 @@ async def show_dna_profile(callback: CallbackQuery):
         "Секвенирую ДНК подписок... 🔬"
     )
 
-    active = [
-        s for s in subs
-        if s.status in (
-            SubscriptionStatus.ACTIVE.value,
-            SubscriptionStatus.TRIAL.value,
-        )
-    ]
-    cancelled = [
-        s for s in subs
-        if s.status == SubscriptionStatus.CANCELLED.value
-    ]
+    active = portfolio.active_rows()
     trials = [s for s in subs if s.is_trial]
 
-    total_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in active
-    )
+    total_monthly = portfolio.total_monthly
 
     avg_age = 0
     if subs:
@@ -101,17 +82,8 @@ async def show_dna_profile(callback: CallbackQuery):
         avg_age = sum(ages) / len(ages)
 
     # Паттерн использования
-    high_use = sum(
-        1 for s in active
-        if s.usage_level == UsageLevel.HIGH.value
-    )
-    low_use = sum(
-        1 for s in active
-        if s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        )
-    )
+    high_use = portfolio.usage_count(UsageLevel.HIGH.value)
+    low_use = portfolio.wasted_count
     usage_pct = (
         int(high_use / len(active) * 100)
         if active else 0
@@ -125,7 +97,7 @@ async def show_dna_profile(callback: CallbackQuery):
         dna_result = await gigachat_service.get_subscriber_dna(
             total_subs=len(subs),
             active_subs=len(active),
-            cancelled_subs=len(cancelled),
+            cancelled_subs=portfolio.cancelled_count,
             trial_subs=len(trials),
             avg_sub_age_days=avg_age,
             total_monthly_spend=total_monthly,
@@ -169,7 +141,7 @@ async def show_dna_profile(callback: CallbackQuery):
         f"━━━━━━━━━━━━━━━━━━\n\n"
         f"📊 <b>Статистика:</b>\n"
         f"• Активных подписок: {len(active)}\n"
-        f"• Отменённых: {len(cancelled)}\n"
+        f"• Отменённых: {portfolio.cancelled_count}\n"
         f"• Пробных периодов: {len(trials)}\n"
         f"• Используешь реально: {usage_pct}%\n"
         f"• Трата в месяц: {format_money(total_monthly)}\n\n"
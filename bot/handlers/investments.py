@@ -5,20 +5,27 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
-from bot.utils.helpers import (
-    format_money, get_monthly_price,
-    calculate_investment_return, get_comparable_purchase,
-)
+from bot.database import async_session, User
+from bot.utils.helpers import format_money, get_comparable_purchase
 from bot.keyboards.inline import back_to_menu_keyboard
+from bot.services.portfolio import PortfolioTotals, investment_projection
+from bot.services.scenario_service import get_scenarios
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
+def _bands_text(scenarios: dict) -> str:
+    lines = []
+    for years, b in scenarios.items():
+        label = "год" if years == 1 else "лет"
+        lines.append(
+            f"   {years} {label}: {format_money(b.p10)} – "
+            f"{format_money(b.p90)} (медиана {format_money(b.p50)})\n"
+        )
+    return "".join(lines)
+
+
 @router.callback_query(F.data == "investments")
 async def show_investments(callback: CallbackQuery):
     """Калькулятор инвестиций вместо подписок."""
@@ -34,19 +41,9 @@ async def show_investments(callback: CallbackQuery):
         await callback.answer("❌ /start", show_alert=True)
         return
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status.in_([
-                    SubscriptionStatus.ACTIVE.value,
-                    SubscriptionStatus.TRIAL.value,
-                ]),
-            )
-        )
-        subs = list(result.scalars().all())
+    portfolio = await PortfolioTotals.load(user.id, categories=False)
 
-    if not subs:
+    if not portfolio.active_count:
         await callback.message.edit_text(
             "🎰 <b>Инвестиционный калькулятор</b>\n\n"
             "Добавь подписки, чтобы увидеть, "
@@ -57,52 +54,27 @@ async def show_investments(callback: CallbackQuery):
         return
 
     # Считаем потерянные деньги
-    wasted_monthly = 0
-    total_monthly = 0
-
-    for s in subs:
-        monthly = get_monthly_price(s.price, s.billing_cycle)
-        total_monthly += monthly
-        if s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        ):
-            wasted_monthly += monthly
-        elif s.usage_level == UsageLevel.UNKNOWN.value:
-            wasted_monthly += monthly * 0.5
-
+    wasted_monthly = portfolio.wasted_monthly(0.5)
     if wasted_monthly <= 0:
-        wasted_monthly = total_monthly * 0.3
+        wasted_monthly = portfolio.total_monthly * 0.3
 
     # S&P 500 (средняя ~10% годовых)
-    sp500_1y = calculate_investment_return(
-        wasted_monthly, 1, 0.10
-    )
-    sp500_5y = calculate_investment_return(
-        wasted_monthly, 5, 0.10
-    )
-    sp500_10y = calculate_investment_return(
-        wasted_monthly, 10, 0.10
-    )
-    sp500_20y = calculate_investment_return(
-        wasted_monthly, 20, 0.10
-    )
-
+    sp500 = investment_projection(wasted_monthly, (1, 5, 10, 20), 0.10)
     # Депозит (средняя ~8% годовых)
-    deposit_1y = calculate_investment_return(
-        wasted_monthly, 1, 0.08
-    )
-    deposit_5y = calculate_investment_return(
-        wasted_monthly, 5, 0.08
+    deposit = investment_projection(wasted_monthly, (1, 5, 10), 0.08)
+    # Crypto (условно ~30% годовых)
+    crypto = investment_projection(wasted_monthly, (5,), 0.30)
+
+    sp500_1y, sp500_5y, sp500_10y, sp500_20y = (
+        sp500[1], sp500[5], sp500[10], sp500[20]
     )
-    deposit_10y = calculate_investment_return(
-        wasted_monthly, 10, 0.08
+    deposit_1y, deposit_5y, deposit_10y = (
+        deposit[1], deposit[5], deposit[10]
     )
+    crypto_5y = crypto[5]
 
-    # Crypto (условно ~30% годовых)
-    crypto_5y = calculate_investment_return(
-        wasted_monthly, 5, 0.30
-    )
+    # Разброс исходов с учётом волатильности и инфляции
+    scenarios = await get_scenarios(wasted_monthly)
 
     comparable_5 = get_comparable_purchase(sp500_5y)
     comparable_10 = get_comparable_purchase(sp500_10y)
@@ -121,6 +93,9 @@ async def show_investments(callback: CallbackQuery):
         f"= {comparable_10}\n"
         f"   Через 20 лет:  <b>{format_money(sp500_20y)}</b> "
         f"= {comparable_20}\n\n"
+        f"🎲 <b>Реалистично</b> (в сегодняшних деньгах, "
+        f"8 из 10 сценариев):\n"
+        f"{_bands_text(scenarios)}\n"
         f"🏦 <b>Банковский депозит</b> (~8% годовых):\n"
         f"   Через 1 год:   <b>{format_money(deposit_1y)}</b>\n"
         f"   Через 5 лет:   <b>{format_money(deposit_5y)}</b>\n"
@@ -1,233 +1,23 @@
 """🏆 Лидерборд экономии + система ачивок."""
 
 import logging
-from datetime import date, datetime, timedelta
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from sqlalchemy import select, func, desc
+from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    UserAchievement, SubscriptionStatus, UsageLevel,
-)
-from bot.utils.helpers import format_money, get_monthly_price
+from bot.database import async_session, User
+from bot.utils.helpers import format_money
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import ACHIEVEMENTS
+from bot.services.leaderboard_service import leaderboard
+from bot.services.achievement_service import achievements
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
-# ============== Проверка ачивок ==============
-
-async def check_achievements(telegram_id: int) -> list[dict]:
-    """
-    Проверить и выдать новые ачивки.
-    Возвращает список новых ачивок.
-    """
-    new_achievements = []
-
-    async with async_session() as session:
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = user_result.scalar_one_or_none()
-        if not user:
-            return []
-
-        # Получаем существующие ачивки
-        existing_result = await session.execute(
-            select(UserAchievement.achievement_key).where(
-                UserAchievement.user_id == user.id
-            )
-        )
-        existing_keys = set(
-            row[0] for row in existing_result.fetchall()
-        )
-
-        # Подписки
-        subs_result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id
-            )
-        )
-        all_subs = list(subs_result.scalars().all())
-
-        active_subs = [
-            s for s in all_subs
-            if s.status in (
-                SubscriptionStatus.ACTIVE.value,
-                SubscriptionStatus.TRIAL.value,
-            )
-        ]
-        cancelled_subs = [
-            s for s in all_subs
-            if s.status == SubscriptionStatus.CANCELLED.value
-        ]
-
-        # Месячная экономия
-        saved_monthly = user.total_saved
-
-        checks = []
-
-        # --- Подписки ---
-        if all_subs and "first_sub_added" not in existing_keys:
-            checks.append("first_sub_added")
-
-        # --- Отмены ---
-        if (
-            cancelled_subs
-            and "first_sub_cancelled" not in existing_keys
-        ):
-            checks.append("first_sub_cancelled")
-
-        if (
-            len(cancelled_subs) >= 5
-            and "five_subs_cancelled" not in existing_keys
-        ):
-            checks.append("five_subs_cancelled")
-
-        if (
-            len(cancelled_subs) >= 10
-            and "ten_subs_cancelled" not in existing_keys
-        ):
-            checks.append("ten_subs_cancelled")
-
-        # --- Экономия ---
-        if (
-            saved_monthly >= 1000
-            and "saved_1000" not in existing_keys
-        ):
-            checks.append("saved_1000")
-
-        if (
-            saved_monthly >= 5000
-            and "saved_5000" not in existing_keys
-        ):
-            checks.append("saved_5000")
-
-        if (
-            saved_monthly >= 10000
-            and "saved_10000" not in existing_keys
-        ):
-            checks.append("saved_10000")
-
-        if (
-            saved_monthly >= 50000
-            and "saved_50000" not in existing_keys
-        ):
-            checks.append("saved_50000")
-
-        if (
-            saved_monthly >= 100000
-            and "saved_100000" not in existing_keys
-        ):
-            checks.append("saved_100000")
-
-        # --- Стрики ---
-        if (
-            user.current_streak >= 7
-            and "week_streak" not in existing_keys
-        ):
-            checks.append("week_streak")
-
-        if (
-            user.current_streak >= 30
-            and "month_streak" not in existing_keys
-        ):
-            checks.append("month_streak")
-
-        # --- Без новых подписок ---
-        if user.last_new_sub_date:
-            days_no_new = (
-                date.today() - user.last_new_sub_date
-            ).days
-            if (
-                days_no_new >= 7
-                and "no_new_subs_week" not in existing_keys
-            ):
-                checks.append("no_new_subs_week")
-            if (
-                days_no_new >= 30
-                and "no_new_subs_month" not in existing_keys
-            ):
-                checks.append("no_new_subs_month")
-
-        # --- Здоровье ---
-        from bot.utils.helpers import get_health_score
-        if active_subs:
-            used = sum(
-                1 for s in active_subs
-                if s.usage_level in (
-                    UsageLevel.HIGH.value,
-                    UsageLevel.MEDIUM.value,
-                )
-            )
-            total_m = sum(
-                get_monthly_price(s.price, s.billing_cycle)
-                for s in active_subs
-            )
-            wasted_m = sum(
-                get_monthly_price(s.price, s.billing_cycle)
-                for s in active_subs
-                if s.usage_level in (
-                    UsageLevel.LOW.value,
-                    UsageLevel.NONE.value,
-                )
-            )
-            score = get_health_score(
-                len(active_subs), used, total_m, wasted_m
-            )
-
-            if (
-                score >= 80
-                and "health_score_80" not in existing_keys
-            ):
-                checks.append("health_score_80")
-            if (
-                score >= 100
-                and "health_score_100" not in existing_keys
-            ):
-                checks.append("health_score_100")
-
-        # --- Рефералы ---
-        referral_count_result = await session.execute(
-            select(func.count(User.id)).where(
-                User.referred_by == telegram_id
-            )
-        )
-        referral_count = referral_count_result.scalar() or 0
-
-        if (
-            referral_count >= 1
-            and "invited_friend" not in existing_keys
-        ):
-            checks.append("invited_friend")
-
-        if (
-            referral_count >= 5
-            and "invited_five" not in existing_keys
-        ):
-            checks.append("invited_five")
-
-        # Сохраняем новые ачивки
-        for key in checks:
-            if key in ACHIEVEMENTS:
-                ach = UserAchievement(
-                    user_id=user.id,
-                    achievement_key=key,
-                )
-                session.add(ach)
-                new_achievements.append(ACHIEVEMENTS[key])
-
-        if new_achievements:
-            await session.commit()
-
-    return new_achievements
-
-
 # ============== Лидерборд ==============
 
 @router.callback_query(F.data == "leaderboard")
@@ -238,38 +28,19 @@ async def show_leaderboard(event: Message | CallbackQuery):
     tg_id = event.from_user.id
 
     async with async_session() as session:
-        # Топ-10 по экономии
-        top_result = await session.execute(
-            select(User)
-            .where(User.total_saved > 0)
-            .order_by(desc(User.total_saved))
-            .limit(10)
-        )
-        top_users = list(top_result.scalars().all())
-
-        # Позиция текущего пользователя
         user_result = await session.execute(
             select(User).where(User.telegram_id == tg_id)
         )
         current_user = user_result.scalar_one_or_none()
 
-        # Общее количество
-        total_result = await session.execute(
-            select(func.count(User.id)).where(
-                User.total_saved > 0
-            )
-        )
-        total_savers = total_result.scalar() or 0
+    await leaderboard.ensure_fresh()
+    if current_user:
+        # Своя строка всегда актуальна, даже если снимок отстаёт
+        leaderboard.update_user(current_user)
 
-        # Позиция пользователя
-        user_position = 0
-        if current_user and current_user.total_saved > 0:
-            pos_result = await session.execute(
-                select(func.count(User.id)).where(
-                    User.total_saved > current_user.total_saved
-                )
-            )
-            user_position = (pos_result.scalar() or 0) + 1
+    top_users = leaderboard.top(10)
+    total_savers = leaderboard.total
+    user_position = leaderboard.rank(tg_id)
 
     medals = ["🥇", "🥈", "🥉"]
     text = "🏆 <b>РЕЙТИНГ ЭКОНОМИИ</b>\n\n"
@@ -283,7 +54,7 @@ async def show_leaderboard(event: Message | CallbackQuery):
         for i, u in enumerate(top_users):
             medal = medals[i] if i < 3 else f"{i + 1}."
 
-            name = u.username or u.first_name or "Аноним"
+            name = u.name
             if u.telegram_id == tg_id:
                 name = f"<b>→ {name} (ты)</b>"
             else:
@@ -313,44 +84,42 @@ async def show_leaderboard(event: Message | CallbackQuery):
 
             if user_position > 10:
                 # Рассчитываем, сколько нужно сэкономить
-                if top_users:
-                    tenth_saved = top_users[-1].total_saved
-                    need_more = tenth_saved - (
-                        current_user.total_saved or 0
+                need_more = leaderboard.gap_to_position(tg_id, 10)
+                if need_more > 0:
+                    text += (
+                        f"💪 Отключи ещё подписок на "
+                        f"{format_money(need_more)}/мес "
+                        f"и войди в TOP-10!\n\n"
                     )
-                    if need_more > 0:
-                        text += (
-                            f"💪 Отключи ещё подписок на "
-                            f"{format_money(need_more)}/мес "
-                            f"и войди в TOP-10!\n\n"
-                        )
 
         text += "🎁 <b>TOP-10 получают Premium бесплатно!</b>"
 
     # Ачивки текущего пользователя
     if current_user:
-        async with async_session() as session:
-            ach_result = await session.execute(
-                select(UserAchievement).where(
-                    UserAchievement.user_id == current_user.id
-                )
+        # Ачивки, заработанные до событийной проверки
+        new_achs = await achievements.sync(current_user)
+        new_keys = {a["key"] for a in new_achs}
+        earned = [
+            key for key in achievements.earned_keys(
+                await achievements.earned_mask(current_user.id)
             )
-            user_achs = list(ach_result.scalars().all())
+            if key not in new_keys
+        ]
 
-        if user_achs:
+        if earned:
             text += "\n\n🏅 <b>Твои ачивки:</b>\n"
-            for ua in user_achs:
-                ach_data = ACHIEVEMENTS.get(ua.achievement_key)
-                if ach_data:
-                    text += (
-                        f"{ach_data['emoji']} {ach_data['name']} "
-                        f"— {ach_data['description']}\n"
-                    )
+            for key in earned:
+                ach_data = ACHIEVEMENTS[key]
+                text += (
+                    f"{ach_data['emoji']} {ach_data['name']} "
+                    f"— {ach_data['description']}\n"
+                )
 
         # Показываем незаработанные
-        locked = set(ACHIEVEMENTS.keys()) - set(
-            ua.achievement_key for ua in user_achs
-        )
+        locked = [
+            key for key in ACHIEVEMENTS
+            if key not in earned and key not in new_keys
+        ]
         if locked:
             text += "\n🔒 <b>Ещё можно получить:</b>\n"
             count = 0
@@ -386,9 +155,8 @@ async def show_leaderboard(event: Message | CallbackQuery):
         )
     )
 
-    # Проверяем новые ачивки
+    # Новые ачивки
     if current_user:
-        new_achs = await check_achievements(tg_id)
         if new_achs:
             ach_text = "\n\n🎉 <b>НОВЫЕ АЧИВКИ!</b>\n"
             for a in new_achs:
@@ -14,6 +14,7 @@ from bot.database import (
 )
 from bot.utils.helpers import format_money, days_until
 from bot.keyboards.inline import back_to_menu_keyboard
+from bot.services.forecast_service import get_forecast
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -149,7 +150,117 @@ async def show_upcoming_payments(callback: CallbackQuery):
         f"<b>{format_money(total_upcoming)}</b>"
     )
 
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    from aiogram.types import InlineKeyboardButton
+
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(
+        text="📆 Прогноз на год вперёд",
+        callback_data="cash_forecast",
+    ))
+    builder.row(InlineKeyboardButton(
+        text="🔙 Главное меню", callback_data="back_to_menu",
+    ))
+
     await callback.message.edit_text(
-        text, reply_markup=back_to_menu_keyboard()
+        text, reply_markup=builder.as_markup()
+    )
+    await callback.answer()
+
+
+# ============== Прогноз списаний ==============
+
+MONTH_NAMES = (
+    "янв", "фев", "мар", "апр", "май", "июн",
+    "июл", "авг", "сен", "окт", "ноя", "дек",
+)
+
+
+def _forecast_text(forecast) -> str:
+    months = forecast.by_month()
+    peak = max((m.total for m in months), default=0)
+
+    text = "📆 <b>Прогноз списаний на год вперёд</b>\n\n"
+    for m in months:
+        bar = "▇" * round(8 * m.total / peak) if peak else ""
+        # Первый и последний месяцы года от сегодня — неполные
+        days = f" {m.first.day}–{m.last.day}" if m.partial else ""
+        text += (
+            f"<code>{MONTH_NAMES[m.month.month - 1]} "
+            f"{m.month.year % 100:02d}</code>{days} "
+            f"{bar} {format_money(m.total)}"
+            f"{f' ({m.count})' if m.count else ''}\n"
+        )
+
+    text += f"\n💰 Итого за год: <b>{format_money(forecast.total)}</b>\n"
+    if peak:
+        top = max(months, key=lambda m: m.total)
+        text += (
+            f"📈 Самый дорогой месяц: "
+            f"{MONTH_NAMES[top.month.month - 1]} — "
+            f"{format_money(top.total)}\n"
+        )
+    if forecast.unscheduled:
+        text += (
+            f"\nℹ️ Без даты списания: {forecast.unscheduled} "
+            f"подп. — в прогноз не вошли"
+        )
+    return text
+
+
+@router.message(Command("forecast"))
+async def cmd_forecast(message: Message):
+    """Календарь списаний на год по месяцам (команда /forecast)."""
+    async with async_session() as session:
+        user_result = await session.execute(
+            select(User).where(
+                User.telegram_id == message.from_user.id
+            )
+        )
+        user = user_result.scalar_one_or_none()
+
+    if not user:
+        await message.answer("❌ Сначала /start")
+        return
+
+    forecast = await get_forecast(user.id)
+    if not forecast.charges:
+        await message.answer(
+            "📆 Нет запланированных списаний.",
+            reply_markup=back_to_menu_keyboard(),
+        )
+        return
+
+    await message.answer(
+        _forecast_text(forecast), reply_markup=back_to_menu_keyboard()
+    )
+
+
+@router.callback_query(F.data == "cash_forecast")
+async def show_cash_forecast(callback: CallbackQuery):
+    """Календарь списаний на год по месяцам."""
+    async with async_session() as session:
+        user_result = await session.execute(
+            select(User).where(
+                User.telegram_id == callback.from_user.id
+            )
+        )
+        user = user_result.scalar_one_or_none()
+
+    if not user:
+        await callback.answer("❌ /start", show_alert=True)
+        return
+
+    forecast = await get_forecast(user.id)
+    if not forecast.charges:
+        await callback.message.edit_text(
+            "📆 Нет запланированных списаний.",
+            reply_markup=back_to_menu_keyboard(),
+        )
+        await callback.answer()
+        return
+
+    await callback.message.edit_text(
+        _forecast_text(forecast), reply_markup=back_to_menu_keyboard()
     )
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
@@ -1,22 +1,18 @@
 """💀 Счётчик боли — сколько денег утекает в реальном времени."""
 
 import logging
-from datetime import date, datetime
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
-from bot.utils.helpers import (
-    format_money, get_monthly_price,
-    get_comparable_purchase, calculate_lifetime_loss,
-)
+from bot.database import async_session, User
+from bot.utils.helpers import format_money, get_comparable_purchase
 from bot.keyboards.inline import back_to_menu_keyboard
+from bot.services.stats_service import WASTED_LEVELS
+from bot.services.read_models import load_sub_rows
+from bot.services.portfolio import PortfolioTotals
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -24,19 +20,9 @@ router = Router()
 
 async def calculate_pain_data(user_id: int) -> dict:
     """Рассчитать данные для счётчика боли."""
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user_id,
-                Subscription.status.in_([
-                    SubscriptionStatus.ACTIVE.value,
-                    SubscriptionStatus.TRIAL.value,
-                ]),
-            )
-        )
-        subs = list(result.scalars().all())
+    portfolio = await PortfolioTotals.load(user_id, categories=False)
 
-    if not subs:
+    if not portfolio.active_count:
         return {
             "total_monthly": 0,
             "wasted_monthly": 0,
@@ -53,66 +39,28 @@ async def calculate_pain_data(user_id: int) -> dict:
             "wasted_subs": [],
         }
 
-    total_monthly = 0
-    wasted_monthly = 0
-    wasted_subs = []
+    # Если не оценено — считаем 50% потерей
+    pain = portfolio.pain(0.5)
 
-    for s in subs:
-        monthly = get_monthly_price(s.price, s.billing_cycle)
-        total_monthly += monthly
-
-        if s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        ):
-            wasted_monthly += monthly
-            wasted_subs.append({
+    # Список утечек — только неиспользуемые подписки
+    wasted_subs = []
+    if portfolio.wasted_count:
+        wasted_subs = [
+            {
                 "name": s.name,
-                "monthly": monthly,
+                "monthly": s.monthly,
                 "usage": s.usage_level,
-            })
-        elif s.usage_level == UsageLevel.UNKNOWN.value:
-            # Если не оценено — считаем 50% потерей
-            wasted_monthly += monthly * 0.5
-
-    total_daily = total_monthly / 30
-    wasted_daily = wasted_monthly / 30
-    per_minute = wasted_daily / (24 * 60)
-
-    # Сколько утекло сегодня (с начала дня)
-    now = datetime.now()
-    minutes_today = now.hour * 60 + now.minute
-    today_wasted = per_minute * minutes_today
-
-    # За месяц (с начала месяца)
-    day_of_month = now.day
-    month_wasted = wasted_daily * day_of_month
-
-    # С начала года
-    day_of_year = (now.date() - date(now.year, 1, 1)).days + 1
-    year_wasted = wasted_daily * day_of_year
-
-    # За жизнь (40 лет)
-    lifetime_wasted = calculate_lifetime_loss(wasted_monthly)
-
-    comparable = get_comparable_purchase(lifetime_wasted)
-
-    active_count = len(subs)
-    wasted_count = len(wasted_subs)
+            }
+            for s in await load_sub_rows(
+                user_id, usage_levels=WASTED_LEVELS
+            )
+        ]
 
     return {
-        "total_monthly": total_monthly,
-        "wasted_monthly": wasted_monthly,
-        "total_daily": total_daily,
-        "wasted_daily": wasted_daily,
-        "per_minute": per_minute,
-        "today_wasted": today_wasted,
-        "month_wasted": month_wasted,
-        "year_wasted": year_wasted,
-        "lifetime_wasted": lifetime_wasted,
-        "comparable": comparable,
-        "active_count": active_count,
-        "wasted_count": wasted_count,
+        **pain,
+        "comparable": get_comparable_purchase(pain["lifetime_wasted"]),
+        "active_count": portfolio.active_count,
+        "wasted_count": len(wasted_subs),
         "wasted_subs": wasted_subs,
     }
 
@@ -7,13 +7,13 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
-from sqlalchemy import select
+from sqlalchemy import select, insert
 
 from bot.database import (
     async_session, User, Subscription,
     SubscriptionStatus, UsageLevel, BillingCycle,
-    GlobalStats, SocialProofEvent, Notification,
-    NotificationType,
+    SocialProofEvent, Notification,
+    NotificationType, bump_data_version,
 )
 from bot.services.gigachat_service import gigachat_service
 from bot.utils.helpers import (
@@ -22,6 +22,13 @@ from bot.utils.helpers import (
 )
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import SUBSCRIPTION_CATEGORIES
+from bot.services.stats_service import (
+    SubscriptionSnapshot, subscription_delta, apply_stats_delta,
+)
+from bot.services.global_stats_service import increment_global_stats
+from bot.services.achievement_service import (
+    achievements, AchievementEvent,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -132,12 +139,40 @@ async def parse_forwarded_message(message: Message):
     added = []
     skipped = []
 
+    candidates = []
+    for sub_data in found_subs:
+        confidence = sub_data.get("confidence", 0.5)
+        if confidence < 0.3:
+            continue
+
+        name = sub_data.get("name", "Неизвестный сервис")
+        if sub_data.get("price", 0) <= 0:
+            skipped.append(name)
+            continue
+        candidates.append(sub_data)
+
     async with async_session() as session:
-        for sub_data in found_subs:
-            confidence = sub_data.get("confidence", 0.5)
-            if confidence < 0.3:
-                continue
+        # Проверяем дубликаты — один запрос на все найденные имена
+        existing_names = set()
+        if candidates:
+            existing_result = await session.execute(
+                select(Subscription.name).where(
+                    Subscription.user_id == user.id,
+                    Subscription.name.in_({
+                        d.get("name", "Неизвестный сервис")
+                        for d in candidates
+                    }),
+                    Subscription.status.in_([
+                        SubscriptionStatus.ACTIVE.value,
+                        SubscriptionStatus.TRIAL.value,
+                    ]),
+                )
+            )
+            existing_names = set(existing_result.scalars())
 
+        sub_rows = []
+        stats_delta = {}
+        for sub_data in candidates:
             name = sub_data.get("name", "Неизвестный сервис")
             price = sub_data.get("price", 0)
             cycle = sub_data.get(
@@ -146,73 +181,82 @@ async def parse_forwarded_message(message: Message):
             category = sub_data.get("category", "other")
             is_trial = sub_data.get("is_trial", False)
 
-            if price <= 0:
-                skipped.append(name)
-                continue
-
-            # Проверяем дубликаты
-            existing = await session.execute(
-                select(Subscription).where(
-                    Subscription.user_id == user.id,
-                    Subscription.name == name,
-                    Subscription.status.in_([
-                        SubscriptionStatus.ACTIVE.value,
-                        SubscriptionStatus.TRIAL.value,
-                    ]),
-                )
-            )
-            if existing.scalar_one_or_none():
+            if name in existing_names:
                 skipped.append(f"{name} (уже есть)")
                 continue
+            existing_names.add(name)
 
             next_billing = get_next_billing_date(
                 date.today(), cycle
             )
-
-            sub = Subscription(
-                user_id=user.id,
-                name=name,
-                price=price,
-                category=category,
-                billing_cycle=cycle,
-                next_billing_date=next_billing,
-                is_trial=is_trial,
-                trial_end_date=next_billing if is_trial else None,
-                status=(
-                    SubscriptionStatus.TRIAL.value
-                    if is_trial
-                    else SubscriptionStatus.ACTIVE.value
-                ),
+            status = (
+                SubscriptionStatus.TRIAL.value
+                if is_trial
+                else SubscriptionStatus.ACTIVE.value
+            )
+            sub_rows.append({
+                "user_id": user.id,
+                "name": name,
+                "price": price,
+                "category": category,
+                "billing_cycle": cycle,
+                "next_billing_date": next_billing,
+                "is_trial": is_trial,
+                "trial_end_date": next_billing if is_trial else None,
+                "status": status,
+                "usage_level": UsageLevel.UNKNOWN.value,
+            })
+            after = SubscriptionSnapshot(
+                monthly=get_monthly_price(price, cycle),
+                status=status,
                 usage_level=UsageLevel.UNKNOWN.value,
             )
-            session.add(sub)
+            for col, d in subscription_delta(None, after).items():
+                stats_delta[col] = stats_delta.get(col, 0) + d
             added.append(sub_data)
 
-            # Уведомление о продлении
-            reminder_date = datetime.combine(
-                next_billing - timedelta(days=3),
-                datetime.min.time().replace(hour=10),
-            )
-            if reminder_date > datetime.utcnow():
-                notif = Notification(
-                    user_id=user.id,
-                    notification_type=NotificationType.RENEWAL_REMINDER.value,
-                    message=(
-                        f"⏰ Через 3 дня спишется "
-                        f"{format_money(price)} за {name}!"
+        if sub_rows:
+            sub_ids = (
+                await session.scalars(
+                    insert(Subscription).returning(
+                        Subscription.id, sort_by_parameter_order=True
                     ),
-                    scheduled_at=reminder_date,
+                    sub_rows,
+                )
+            ).all()
+            await apply_stats_delta(session, user.id, stats_delta)
+            await bump_data_version(session, user.id)
+
+            # Уведомления о продлении
+            now = datetime.utcnow()
+            notif_rows = []
+            for sub_id, row in zip(sub_ids, sub_rows):
+                reminder_date = datetime.combine(
+                    row["next_billing_date"] - timedelta(days=3),
+                    datetime.min.time().replace(hour=10),
                 )
-                session.add(notif)
+                if reminder_date > now:
+                    notif_rows.append({
+                        "user_id": user.id,
+                        "subscription_id": sub_id,
+                        "notification_type": (
+                            NotificationType.RENEWAL_REMINDER.value
+                        ),
+                        "message": (
+                            f"⏰ Через 3 дня спишется "
+                            f"{format_money(row['price'])} "
+                            f"за {row['name']}!"
+                        ),
+                        "scheduled_at": reminder_date,
+                    })
+            if notif_rows:
+                await session.execute(insert(Notification), notif_rows)
 
         # Обновляем статистику
         if added:
-            stats_result = await session.execute(
-                select(GlobalStats).limit(1)
+            await increment_global_stats(
+                session, total_subscriptions_found=len(added)
             )
-            stats = stats_result.scalar_one_or_none()
-            if stats:
-                stats.total_subscriptions_found += len(added)
 
             # Social proof
             total_found_amount = sum(
@@ -234,6 +278,11 @@ async def parse_forwarded_message(message: Message):
 
         await session.commit()
 
+    if added:
+        await achievements.on_event(
+            user, AchievementEvent.SUBSCRIPTION_ADDED
+        )
+
     # Формируем ответ
     if added:
         text = f"✅ <b>Найдено подписок: {len(added)}</b>\n\n"
@@ -12,15 +12,16 @@ from aiogram.types import (
 from aiogram.filters import Command
 from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Payment, PaymentStatus,
-)
+from bot.database import async_session, User
 from bot.utils.helpers import format_money
 from bot.keyboards.inline import (
     premium_keyboard, back_to_menu_keyboard,
 )
 from bot.config import config
-from bot.services.payment_service import payment_service
+from bot.services.payment_service import (
+    payment_service, purchase_idempotence_key,
+)
+from bot.services.payment_events import activate_premium
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -234,6 +235,8 @@ async def buy_premium(callback: CallbackQuery):
                 user_id=user.id,
                 telegram_id=callback.from_user.id,
                 description="SubKiller Premium — 1 месяц",
+                # Повторное нажатие не создаст второй платёж
+                idempotence_key=purchase_idempotence_key(user.id),
             )
         )
 
@@ -295,38 +298,13 @@ async def check_payment(callback: CallbackQuery):
         return
 
     if is_paid:
-        # Активируем Premium
-        async with async_session() as session:
-            result = await session.execute(
-                select(User).where(
-                    User.telegram_id == callback.from_user.id
-                )
+        # Тот же путь, что у вебхука: дважды Premium не продлевается
+        user, _ = await activate_premium(payment_id)
+        if user is None or user.telegram_id != callback.from_user.id:
+            await callback.answer(
+                "❌ Платёж не найден.", show_alert=True,
             )
-            user = result.scalar_one_or_none()
-
-            if user:
-                now = datetime.utcnow()
-                if (
-                    user.premium_until
-                    and user.premium_until > now
-                ):
-                    user.premium_until += timedelta(days=30)
-                else:
-                    user.premium_until = now + timedelta(days=30)
-                user.is_premium = True
-
-                # Обновляем платёж
-                pay_result = await session.execute(
-                    select(Payment).where(
-                        Payment.yookassa_payment_id == payment_id
-                    )
-                )
-                payment = pay_result.scalar_one_or_none()
-                if payment:
-                    payment.status = PaymentStatus.SUCCEEDED.value
-                    payment.confirmed_at = now
-
-                await session.commit()
+            return
 
         await callback.message.edit_text(
             f"🎉 <b>Premium активирован!</b>\n\n"
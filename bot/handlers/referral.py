@@ -14,6 +14,9 @@ from bot.database import (
 from bot.utils.helpers import format_money
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import config
+from bot.services.achievement_service import (
+    achievements, AchievementEvent,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -53,6 +56,10 @@ async def process_referral(
         f"за приглашение {new_user_tg_id}"
     )
 
+    await achievements.on_event(
+        referrer, AchievementEvent.REFERRAL_JOINED
+    )
+
     # Уведомляем реферера
     try:
         from bot.loader import bot
@@ -9,9 +9,10 @@ from aiogram.types import CallbackQuery
 from sqlalchemy import select, func, desc
 
 from bot.database import (
-    async_session, SocialProofEvent, GlobalStats, User,
+    async_session, SocialProofEvent, User,
 )
 from bot.utils.helpers import format_money
+from bot.services.global_stats_service import get_global_stats
 from bot.keyboards.inline import back_to_menu_keyboard
 
 logger = logging.getLogger(__name__)
@@ -87,14 +88,9 @@ async def show_social_proof(callback: CallbackQuery):
     if time.time() - _cache_updated_at > 1800:
         await generate_social_proof()
 
-    async with async_session() as session:
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
-        )
-        stats = stats_result.scalar_one_or_none()
-
-    total_saved = stats.total_saved if stats else 0
-    total_users = stats.total_users if stats else 0
+    stats = await get_global_stats()
+    total_saved = stats["total_saved"]
+    total_users = stats["total_users"]
 
     text = "📢 <b>ПРЯМО СЕЙЧАС</b>\n\n"
 
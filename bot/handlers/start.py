@@ -1,26 +1,50 @@
 """Стартовые хендлеры: /start, /help, /menu, регистрация."""
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command, CommandObject
-from sqlalchemy import select, func
+from sqlalchemy import select, update, func, case, or_
 
 from bot.loader import bot
 from bot.database import (
-    async_session, User, Subscription,
-    GlobalStats, SubscriptionStatus,
+    async_session, dialect_insert, bump_data_version,
+    User, Subscription,
+    SubscriptionStatus,
 )
 from bot.keyboards.inline import main_menu_keyboard
 from bot.keyboards.reply import main_reply_keyboard
 from bot.utils.helpers import (
     generate_referral_code, format_money,
 )
+from bot.services.global_stats_service import (
+    increment_global_stats, get_global_stats,
+)
+from bot.services.write_queue import write_queue
+from bot.services.achievement_service import (
+    achievements, AchievementEvent,
+)
 from bot.config import config
 
 router = Router()
 
 
+def _visit_changed(
+    user: User,
+    today: date,
+    username: str | None,
+    first_name: str | None,
+    last_name: str | None,
+) -> bool:
+    """Нужно ли что-то записывать при визите."""
+    return (
+        user.last_visit != today
+        or user.username != username
+        or user.first_name != first_name
+        or user.last_name != last_name
+    )
+
+
 async def get_or_create_user(
     telegram_id: int,
     username: str | None = None,
@@ -28,7 +52,45 @@ async def get_or_create_user(
     last_name: str | None = None,
     referred_by_code: str | None = None,
 ) -> User:
-    """Получить или создать пользователя."""
+    """
+    Получить или создать пользователя.
+
+    Сначала один SELECT: повторный визит в тот же день без смены
+    профиля на нём и заканчивается, без записи.
+
+    Нового пользователя создаёт INSERT ... ON CONFLICT (telegram_id)
+    DO NOTHING RETURNING: при двух параллельных /start строку
+    вставит один, второй получит пустой RETURNING и пойдёт
+    обычным путём визита.
+
+    Визит существующего — условный UPDATE ... RETURNING: строка
+    меняется, только если сменился день или профиль, а стрик
+    (вчера → +1, сегодня → как есть, иначе 1) и рекорд считаются
+    в самом UPDATE. Если условие не прошло (визит уже записал
+    параллельный запрос), пользователь перечитывается. С включённой
+    очередью записи обновление уходит в неё.
+    """
+    user, new_day = await _upsert_visit(
+        telegram_id, username, first_name, last_name, referred_by_code,
+    )
+    if new_day:
+        # Стрик и «дни без новых подписок» меняются раз в сутки
+        await achievements.on_event(
+            user, AchievementEvent.STREAK_UPDATED
+        )
+    return user
+
+
+async def _upsert_visit(
+    telegram_id: int,
+    username: str | None,
+    first_name: str | None,
+    last_name: str | None,
+    referred_by_code: str | None,
+) -> tuple[User, bool]:
+    """Учесть визит. Возвращает (пользователь, первый ли визит за день)."""
+    today = date.today()
+
     async with async_session() as session:
         result = await session.execute(
             select(User).where(User.telegram_id == telegram_id)
@@ -36,72 +98,131 @@ async def get_or_create_user(
         user = result.scalar_one_or_none()
 
         if user:
-            # Обновляем стрик
-            today = date.today()
-            if user.last_visit:
-                diff = (today - user.last_visit).days
-                if diff == 1:
-                    user.current_streak += 1
-                    if user.current_streak > user.max_streak:
-                        user.max_streak = user.current_streak
-                elif diff > 1:
-                    user.current_streak = 1
-            else:
-                user.current_streak = 1
+            # Визит мог быть уже учтён, но ещё не записан
+            write_queue.apply_pending(user)
+
+        if user and not _visit_changed(
+            user, today, username, first_name, last_name
+        ):
+            return user, False
+
+        new_day = user is not None and user.last_visit != today
 
+        if user and write_queue.enabled:
+            # Стрик и профиль — через очередь записи
+            if user.last_visit == today - timedelta(days=1):
+                user.current_streak += 1
+            elif user.last_visit != today:
+                user.current_streak = 1
+            user.max_streak = max(user.max_streak, user.current_streak)
             user.last_visit = today
             user.username = username
             user.first_name = first_name
             user.last_name = last_name
-            await session.commit()
-            await session.refresh(user)
-            return user
-
-        # Обработка реферала
-        referred_by_id = None
-        if referred_by_code:
-            ref_result = await session.execute(
-                select(User).where(
-                    User.referral_code == referred_by_code
+            write_queue.set(
+                User, user.id,
+                current_streak=user.current_streak,
+                max_streak=user.max_streak,
+                last_visit=today,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+            )
+            return user, new_day
+
+        if user is None:
+            # Обработка реферала
+            referred_by_id = None
+            if referred_by_code:
+                referrer_id = await session.scalar(
+                    select(User.telegram_id).where(
+                        User.referral_code == referred_by_code
+                    )
                 )
+                if referrer_id:
+                    referred_by_id = referrer_id
+
+            result = await session.execute(
+                dialect_insert(User)
+                .values(
+                    telegram_id=telegram_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    referral_code=generate_referral_code(telegram_id),
+                    referred_by=referred_by_id,
+                    last_visit=today,
+                    current_streak=1,
+                    max_streak=1,
+                )
+                .on_conflict_do_nothing(index_elements=["telegram_id"])
+                .returning(User)
             )
-            referrer = ref_result.scalar_one_or_none()
-            if referrer:
-                referred_by_id = referrer.telegram_id
-
-        user = User(
-            telegram_id=telegram_id,
-            username=username,
-            first_name=first_name,
-            last_name=last_name,
-            referral_code=generate_referral_code(telegram_id),
-            referred_by=referred_by_id,
-            last_visit=date.today(),
-            current_streak=1,
-            max_streak=1,
-        )
-        session.add(user)
+            user = result.scalar_one_or_none()
 
-        # Обновляем глобальную статистику
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
-        )
-        stats = stats_result.scalar_one_or_none()
-        if stats:
-            stats.total_users += 1
-        else:
-            stats = GlobalStats(total_users=1)
-            session.add(stats)
+            if user:
+                # Обновляем глобальную статистику
+                await increment_global_stats(session, total_users=1)
+                await session.commit()
+
+                # Награждаем реферера
+                if referred_by_id:
+                    from bot.handlers.referral import process_referral
+                    await process_referral(referred_by_id, telegram_id)
+
+                return user, False
 
+            # Параллельный /start уже создал пользователя —
+            # дальше обычное обновление визита
+
+        # Стрик: вчера → +1, сегодня → без изменений, иначе → 1
+        yesterday = today - timedelta(days=1)
+        new_streak = case(
+            (User.last_visit == yesterday, User.current_streak + 1),
+            (User.last_visit == today, User.current_streak),
+            else_=1,
+        )
+        result = await session.execute(
+            update(User)
+            .where(
+                User.telegram_id == telegram_id,
+                or_(
+                    User.last_visit.is_(None),
+                    User.last_visit != today,
+                    User.username.is_distinct_from(username),
+                    User.first_name.is_distinct_from(first_name),
+                    User.last_name.is_distinct_from(last_name),
+                ),
+            )
+            .values(
+                current_streak=new_streak,
+                max_streak=case(
+                    (new_streak > User.max_streak, new_streak),
+                    else_=User.max_streak,
+                ),
+                last_visit=today,
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+            )
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
+        updated = result.scalar_one_or_none()
+        if updated:
+            await bump_data_version(session, updated.id)
         await session.commit()
-        await session.refresh(user)
 
-        # Награждаем реферера
-        if referred_by_id:
-            from bot.handlers.referral import process_referral
-            await process_referral(referred_by_id, telegram_id)
+        if updated:
+            return updated, new_day
 
-        return user
+        # Параллельный запрос уже записал этот визит
+        result = await session.execute(
+            select(User)
+            .where(User.telegram_id == telegram_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one(), False
 
 
 @router.message(CommandStart())
@@ -120,12 +241,8 @@ async def cmd_start(message: Message, command: CommandObject):
     )
 
     # Получаем общую статистику
-    async with async_session() as session:
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
-        )
-        stats = stats_result.scalar_one_or_none()
-        total_saved_all = stats.total_saved if stats else 0
+    global_stats = await get_global_stats()
+    total_saved_all = global_stats["total_saved"]
 
     welcome_text = (
         f"👋 Привет, <b>{message.from_user.first_name}</b>!\n\n"
@@ -174,6 +291,7 @@ async def cmd_menu(message: Message):
         telegram_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
+        last_name=message.from_user.last_name,
     )
 
     await message.answer(
@@ -192,6 +310,7 @@ async def back_to_menu(callback: CallbackQuery):
         telegram_id=callback.from_user.id,
         username=callback.from_user.username,
         first_name=callback.from_user.first_name,
+        last_name=callback.from_user.last_name,
     )
 
     await callback.message.edit_text(
@@ -237,6 +356,7 @@ async def cmd_help(message: Message):
         "/subs — Мои подписки\n"
         "/pain — Счётчик боли\n"
         "/report — Отчёт о подписках\n"
+        "/forecast — Прогноз списаний на год\n"
         "/top — Рейтинг экономии\n"
         "/ref — Реферальная ссылка\n"
         "/premium — Информация о Premium\n"
@@ -256,12 +376,9 @@ async def cmd_stats(message: Message):
         await message.answer("⛔ Только для администратора.")
         return
 
-    async with async_session() as session:
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
-        )
-        stats = stats_result.scalar_one_or_none()
+    global_stats = await get_global_stats()
 
+    async with async_session() as session:
         users_count = await session.execute(
             select(func.count(User.id))
         )
@@ -293,7 +410,7 @@ async def cmd_stats(message: Message):
         f"📋 Всего подписок: <b>{total_subs}</b>\n"
         f"✅ Активных: <b>{total_active}</b>\n"
         f"💰 Всего сэкономлено: "
-        f"<b>{format_money(stats.total_saved if stats else 0)}</b>\n"
+        f"<b>{format_money(global_stats['total_saved'])}</b>\n"
     )
 
 
@@ -9,14 +9,14 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func
+from sqlalchemy import select, insert, delete, func
 
 from bot.loader import bot
 from bot.database import (
     async_session, User, Subscription,
     SubscriptionStatus, UsageLevel, BillingCycle,
-    GlobalStats, SocialProofEvent, Notification,
-    NotificationType,
+    SocialProofEvent, Notification,
+    NotificationType, UserStats,
 )
 from bot.keyboards.inline import (
     add_subscription_keyboard,
@@ -37,6 +37,16 @@ from bot.utils.helpers import (
 from bot.config import (
     config, SUBSCRIPTION_CATEGORIES, POPULAR_SUBSCRIPTIONS,
 )
+from bot.services.stats_service import (
+    snapshot, subscription_delta, apply_subscription_change,
+    get_user_stats,
+)
+from bot.services.write_queue import write_queue
+from bot.services.global_stats_service import increment_global_stats
+from bot.services.leaderboard_service import leaderboard
+from bot.services.achievement_service import (
+    achievements, AchievementEvent, format_new_achievements,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -762,21 +772,19 @@ async def confirm_add_sub(
             usage_level=UsageLevel.UNKNOWN.value,
         )
         session.add(sub)
+        await apply_subscription_change(
+            session, user.id, None, snapshot(sub)
+        )
 
         # Обновляем дату последней новой подписки
-        result = await session.execute(
-            select(User).where(User.id == user.id)
+        await write_queue.defer_set(
+            session, User, user.id, last_new_sub_date=date.today()
         )
-        db_user = result.scalar_one()
-        db_user.last_new_sub_date = date.today()
 
         # Обновляем глобальную статистику
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
+        await increment_global_stats(
+            session, total_subscriptions_found=1
         )
-        stats = stats_result.scalar_one_or_none()
-        if stats:
-            stats.total_subscriptions_found += 1
 
         await session.commit()
         await session.refresh(sub)
@@ -840,6 +848,11 @@ async def confirm_add_sub(
     text += (
         f"💡 Оцени, как часто ты используешь {data['name']}:\n"
     )
+    text += format_new_achievements(
+        await achievements.on_event(
+            user, AchievementEvent.SUBSCRIPTION_ADDED
+        )
+    )
 
     await callback.message.edit_text(
         text,
@@ -907,11 +920,34 @@ async def set_usage_level(callback: CallbackQuery):
             )
             return
 
+        # Прошлый тап мог ещё не записаться
+        write_queue.apply_pending(sub)
+        before = snapshot(sub)
         sub.usage_level = level
         if level in (UsageLevel.HIGH.value, UsageLevel.MEDIUM.value):
             sub.last_used = date.today()
 
-        await session.commit()
+        stats = None
+        if write_queue.enabled:
+            # Частые тапы схлопываются в одну запись
+            write_queue.set(
+                Subscription, sub.id,
+                usage_level=sub.usage_level,
+                last_used=sub.last_used,
+            )
+            write_queue.add(
+                UserStats, user.id,
+                **subscription_delta(before, snapshot(sub)),
+            )
+            # В БД user_stats ещё старые — ачивки судим по строке
+            # с наложенными дельтами из очереди
+            stats = await get_user_stats(user.id)
+            write_queue.apply_pending_adds(stats)
+        else:
+            await apply_subscription_change(
+                session, user.id, before, snapshot(sub)
+            )
+            await session.commit()
 
     usage_names = {
         "high": "🟢 Активно использую",
@@ -924,6 +960,13 @@ async def set_usage_level(callback: CallbackQuery):
 
     text = f"✅ Оценка обновлена: {usage_names.get(level, level)}\n\n"
 
+    # Ачивки за здоровье — в конце ответа
+    new_achievements = format_new_achievements(
+        await achievements.on_event(
+            user, AchievementEvent.USAGE_UPDATED, stats=stats,
+        )
+    )
+
     if level in ("low", "none"):
         text += (
             f"⚠️ Ты тратишь {format_money(monthly)}/мес "
@@ -954,11 +997,13 @@ async def set_usage_level(callback: CallbackQuery):
             )
         )
 
+        text += new_achievements
         await callback.message.edit_text(
             text, reply_markup=builder.as_markup()
         )
     else:
         text += "Отлично! Продолжай пользоваться 👍"
+        text += new_achievements
         await callback.message.edit_text(
             text, reply_markup=back_to_menu_keyboard()
         )
@@ -1039,8 +1084,13 @@ async def confirm_cancel_subscription(callback: CallbackQuery):
         monthly = get_monthly_price(sub.price, sub.billing_cycle)
 
         # Отмечаем как отменённую
+        await write_queue.claim_pending(sub)
+        before = snapshot(sub)
         sub.status = SubscriptionStatus.CANCELLED.value
         sub.cancelled_at = datetime.utcnow()
+        await apply_subscription_change(
+            session, user.id, before, snapshot(sub)
+        )
 
         # Обновляем статистику пользователя
         user_result = await session.execute(
@@ -1051,13 +1101,11 @@ async def confirm_cancel_subscription(callback: CallbackQuery):
         db_user.total_cancelled += 1
 
         # Обновляем глобальную статистику
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
+        await increment_global_stats(
+            session,
+            total_saved=monthly,
+            total_subscriptions_cancelled=1,
         )
-        stats = stats_result.scalar_one_or_none()
-        if stats:
-            stats.total_saved += monthly
-            stats.total_subscriptions_cancelled += 1
 
         # Social proof
         social_event = SocialProofEvent(
@@ -1075,17 +1123,17 @@ async def confirm_cancel_subscription(callback: CallbackQuery):
         session.add(social_event)
 
         # Удаляем связанные уведомления
-        notif_result = await session.execute(
-            select(Notification).where(
+        await session.execute(
+            delete(Notification).where(
                 Notification.subscription_id == sub_id,
                 Notification.sent == False,
             )
         )
-        for notif in notif_result.scalars():
-            await session.delete(notif)
 
         await session.commit()
 
+    leaderboard.update_user(db_user)
+
     yearly_saved = monthly * 12
 
     text = (
@@ -1099,14 +1147,13 @@ async def confirm_cancel_subscription(callback: CallbackQuery):
     )
 
     # Проверяем ачивки
-    from bot.handlers.leaderboard import check_achievements
-    new_achievements = await check_achievements(
-        callback.from_user.id
+    text += format_new_achievements(
+        await achievements.on_event(
+            db_user,
+            AchievementEvent.SUBSCRIPTION_CANCELLED,
+            AchievementEvent.SAVINGS_CHANGED,
+        )
     )
-    if new_achievements:
-        text += "\n\n🏅 <b>Новые ачивки:</b>\n"
-        for ach in new_achievements:
-            text += f"{ach['emoji']} {ach['name']}\n"
 
     await callback.message.edit_text(
         text, reply_markup=back_to_menu_keyboard()
@@ -1225,11 +1272,16 @@ async def edit_cycle(
         )
         sub = result.scalar_one_or_none()
         if sub:
+            await write_queue.claim_pending(sub)
+            before = snapshot(sub)
             sub.billing_cycle = cycle
             # Пересчитываем следующую дату
             sub.next_billing_date = get_next_billing_date(
                 date.today(), cycle
             )
+            await apply_subscription_change(
+                session, user.id, before, snapshot(sub)
+            )
             await session.commit()
 
     await state.clear()
@@ -1275,7 +1327,12 @@ async def process_edit_value(
                 )
                 if new_price <= 0:
                     raise ValueError
+                await write_queue.claim_pending(sub)
+                before = snapshot(sub)
                 sub.price = new_price
+                await apply_subscription_change(
+                    session, user.id, before, snapshot(sub)
+                )
                 msg = f"✅ Цена обновлена: {format_money(new_price)}"
             except ValueError:
                 await message.answer("❌ Введи число.")
@@ -1341,42 +1398,50 @@ async def set_reminder(callback: CallbackQuery):
             return
 
         # Создаём напоминания: за 3 дня, за 1 день, в день
+        day_word = {
+            3: "через 3 дня",
+            1: "завтра",
+            0: "сегодня",
+        }
+        now = datetime.utcnow()
+        planned = {}
         for days_before in [3, 1, 0]:
             reminder_date = datetime.combine(
                 sub.next_billing_date - timedelta(days=days_before),
                 datetime.min.time().replace(hour=10),
             )
-            if reminder_date <= datetime.utcnow():
-                continue
+            if reminder_date > now:
+                planned[reminder_date] = days_before
 
-            # Проверяем, нет ли уже такого
-            existing = await session.execute(
-                select(Notification).where(
+        # Уже существующие — одним запросом
+        if planned:
+            existing_result = await session.execute(
+                select(Notification.scheduled_at).where(
                     Notification.subscription_id == sub_id,
-                    Notification.scheduled_at == reminder_date,
+                    Notification.scheduled_at.in_(list(planned)),
                     Notification.sent == False,
                 )
             )
-            if existing.scalar_one_or_none():
-                continue
-
-            day_word = {
-                3: "через 3 дня",
-                1: "завтра",
-                0: "сегодня",
-            }
-
-            notif = Notification(
-                user_id=user.id,
-                subscription_id=sub_id,
-                notification_type=NotificationType.RENEWAL_REMINDER.value,
-                message=(
-                    f"⏰ {sub.name}: списание {day_word[days_before]}! "
-                    f"({format_money(sub.price)})"
-                ),
-                scheduled_at=reminder_date,
-            )
-            session.add(notif)
+            for scheduled_at in existing_result.scalars():
+                planned.pop(scheduled_at, None)
+
+        if planned:
+            await session.execute(insert(Notification), [
+                {
+                    "user_id": user.id,
+                    "subscription_id": sub_id,
+                    "notification_type": (
+                        NotificationType.RENEWAL_REMINDER.value
+                    ),
+                    "message": (
+                        f"⏰ {sub.name}: списание "
+                        f"{day_word[days_before]}! "
+                        f"({format_money(sub.price)})"
+                    ),
+                    "scheduled_at": reminder_date,
+                }
+                for reminder_date, days_before in planned.items()
+            ])
 
         await session.commit()
 
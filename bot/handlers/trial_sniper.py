@@ -19,6 +19,13 @@ from bot.utils.helpers import (
     format_money, get_next_billing_date, days_until,
 )
 from bot.keyboards.inline import back_to_menu_keyboard
+from bot.services.stats_service import (
+    snapshot, apply_subscription_change,
+)
+from bot.services.global_stats_service import increment_global_stats
+from bot.services.achievement_service import (
+    achievements, AchievementEvent,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -259,6 +266,12 @@ async def activate_trial(callback: CallbackQuery):
             usage_level=UsageLevel.UNKNOWN.value,
         )
         session.add(sub)
+        await apply_subscription_change(
+            session, user.id, None, snapshot(sub)
+        )
+        await increment_global_stats(
+            session, total_subscriptions_found=1
+        )
 
         # Уведомление за 1 день
         reminder_date = datetime.combine(
@@ -299,6 +312,10 @@ async def activate_trial(callback: CallbackQuery):
         await session.commit()
         await session.refresh(sub)
 
+    await achievements.on_event(
+        user, AchievementEvent.SUBSCRIPTION_ADDED
+    )
+
     text = (
         f"🎯 <b>Автоснайпер активирован!</b>\n\n"
         f"Сервис: <b>{trial_data['name']}</b>\n"
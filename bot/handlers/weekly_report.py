@@ -7,16 +7,12 @@ from aiogram import Bot, Router, F
 from aiogram.types import CallbackQuery
 from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
-from bot.utils.helpers import (
-    format_money, get_monthly_price,
-    get_health_score, health_emoji,
-)
+from bot.database import async_session, User, UsageLevel
+from bot.utils.helpers import format_money, health_emoji
 from bot.keyboards.inline import back_to_menu_keyboard
 from bot.config import ALTERNATIVES_DB
+from bot.services.stats_service import ACTIVE_STATUSES
+from bot.services.portfolio import Portfolio
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -24,49 +20,20 @@ router = Router()
 
 async def generate_weekly_report(user: User) -> str:
     """Генерация текста еженедельного отчёта."""
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status.in_([
-                    SubscriptionStatus.ACTIVE.value,
-                    SubscriptionStatus.TRIAL.value,
-                ]),
-            )
-        )
-        subs = list(result.scalars().all())
+    portfolio = await Portfolio.load(user.id, statuses=ACTIVE_STATUSES)
 
-    if not subs:
+    if not portfolio.active_count:
         return ""
 
-    green = []
-    yellow = []
-    red = []
-    total_monthly = 0
-    wasted_monthly = 0
-
-    for s in subs:
-        monthly = get_monthly_price(s.price, s.billing_cycle)
-        total_monthly += monthly
-
-        if s.usage_level == UsageLevel.HIGH.value:
-            green.append(s)
-        elif s.usage_level == UsageLevel.MEDIUM.value:
-            yellow.append(s)
-        elif s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        ):
-            red.append(s)
-            wasted_monthly += monthly
-        else:
-            wasted_monthly += monthly * 0.3
-
-    used_count = len(green) + len(yellow)
-    score = get_health_score(
-        len(subs), used_count,
-        total_monthly, wasted_monthly,
+    green = portfolio.active_rows(UsageLevel.HIGH.value)
+    yellow = portfolio.active_rows(UsageLevel.MEDIUM.value)
+    red = portfolio.active_rows(
+        UsageLevel.LOW.value, UsageLevel.NONE.value,
     )
+    total_monthly = portfolio.total_monthly
+    wasted_monthly = portfolio.wasted_monthly(0.3)
+
+    score = portfolio.health_score(0.3)
     h_emoji = health_emoji(score)
 
     text = (
@@ -77,10 +44,7 @@ async def generate_weekly_report(user: User) -> str:
     )
 
     if green:
-        g_total = sum(
-            get_monthly_price(s.price, s.billing_cycle)
-            for s in green
-        )
+        g_total = portfolio.usage_monthly(UsageLevel.HIGH.value)
         names = ", ".join(s.name for s in green)
         text += (
             f"🟢 Активно используешь ({len(green)}): "
@@ -89,10 +53,7 @@ async def generate_weekly_report(user: User) -> str:
         )
 
     if yellow:
-        y_total = sum(
-            get_monthly_price(s.price, s.billing_cycle)
-            for s in yellow
-        )
+        y_total = portfolio.usage_monthly(UsageLevel.MEDIUM.value)
         names = ", ".join(s.name for s in yellow)
         text += (
             f"🟡 Редко используешь ({len(yellow)}): "
@@ -101,9 +62,9 @@ async def generate_weekly_report(user: User) -> str:
         )
 
     if red:
-        r_total = sum(
-            get_monthly_price(s.price, s.billing_cycle)
-            for s in red
+        r_total = (
+            portfolio.usage_monthly(UsageLevel.LOW.value)
+            + portfolio.usage_monthly(UsageLevel.NONE.value)
         )
         names = ", ".join(s.name for s in red)
         text += (
@@ -127,7 +88,7 @@ async def generate_weekly_report(user: User) -> str:
     # Рекомендации
     recommendations = []
     for s in red:
-        m = get_monthly_price(s.price, s.billing_cycle)
+        m = s.monthly
         alts = ALTERNATIVES_DB.get(s.name, [])
         if alts:
             best = alts[0]
@@ -1,7 +1,22 @@
-"""Точка входа — запуск бота и webapp."""
+"""
+Точка входа — запуск бота и webapp.
 
+Роль процесса — аргумент или APP_ROLE:
+
+    python -m bot.main           # combined: бот, планировщик и webapp
+    python -m bot.main bot       # только polling Telegram
+    python -m bot.main web       # webapp, WEB_CONCURRENCY процессов
+    python -m bot.main worker    # планировщик и фоновые задачи
+
+Роль bot запускается в одном экземпляре (polling), worker — тоже
+(иначе задания выполнятся дважды); web масштабируется.
+"""
+
+import argparse
 import asyncio
 import logging
+import os
+import signal
 import sys
 from contextlib import asynccontextmanager
 
@@ -32,6 +47,7 @@ async def set_bot_commands():
         BotCommand(command="subs", description="📋 Мои подписки"),
         BotCommand(command="pain", description="💀 Счётчик боли"),
         BotCommand(command="report", description="📊 Отчёт"),
+        BotCommand(command="forecast", description="📆 Прогноз списаний"),
         BotCommand(command="top", description="🏆 Рейтинг"),
         BotCommand(command="ref", description="👥 Пригласить друга"),
         BotCommand(command="premium", description="⭐ Premium"),
@@ -78,26 +94,140 @@ def setup_scheduler() -> AsyncIOScheduler:
         minutes=30,
     )
 
+    # Пересчёт агрегатов user_stats — каждую ночь в 04:00
+    from bot.services.stats_service import rebuild_user_stats
+    scheduler.add_job(
+        rebuild_user_stats,
+        "cron",
+        hour=4,
+        minute=0,
+    )
+
+    # Сверка глобальных счётчиков — каждую ночь в 04:10
+    from bot.services.global_stats_service import (
+        reconcile_global_stats
+    )
+    scheduler.add_job(
+        reconcile_global_stats,
+        "cron",
+        hour=4,
+        minute=10,
+    )
+
+    # Очистка старых уведомлений и social proof — в 04:30
+    from bot.services.retention_service import run_retention
+    scheduler.add_job(
+        run_retention,
+        "cron",
+        hour=4,
+        minute=30,
+    )
+
+    # Переобучение модели заброса — по воскресеньям в 04:40,
+    # до ночного пересчёта риска
+    from bot.services.abandon_model import train_model
+    scheduler.add_job(
+        train_model,
+        "cron",
+        day_of_week="sun",
+        hour=4,
+        minute=40,
+    )
+
+    # Пересчёт риска заброса подписок — в 04:50
+    from bot.services.prediction_service import run_prediction_batch
+    scheduler.add_job(
+        run_prediction_batch,
+        "cron",
+        hour=4,
+        minute=50,
+    )
+
+    # Необработанные уведомления YooKassa (повторы после ошибок,
+    # остатки после перезапуска) — каждую минуту
+    from bot.services.payment_events import payment_events
+    scheduler.add_job(
+        payment_events.process_pending,
+        "interval",
+        minutes=1,
+    )
+
+    # Распределения метрик по пользователям — в 05:10
+    from bot.services.distribution_service import build_distributions
+    scheduler.add_job(
+        build_distributions,
+        "cron",
+        hour=5,
+        minute=10,
+    )
+
+    return scheduler
+
+
+COMBINED = "combined"
+ROLES = (COMBINED, "bot", "web", "worker")
+
+
+async def prepare_data():
+    """Первичное заполнение агрегатов (роль worker или combined)."""
+    from bot.services.stats_service import (
+        rebuild_user_stats_if_empty
+    )
+    await rebuild_user_stats_if_empty()
+
+    from bot.services.global_stats_service import (
+        ensure_global_stats_row
+    )
+    await ensure_global_stats_row()
+
+    from bot.services.distribution_service import (
+        build_distributions_if_empty
+    )
+    await build_distributions_if_empty()
+
+
+def start_scheduler() -> AsyncIOScheduler:
+    logger.info("Запуск планировщика...")
+    scheduler = setup_scheduler()
+    scheduler.start()
     return scheduler
 
 
+async def close_services():
+    """Сбросить очереди и закрыть клиенты."""
+    from bot.services.write_queue import write_queue
+    await write_queue.close()
+    from bot.services.payment_service import payment_service
+    await payment_service.close()
+    from bot.services.payment_events import payment_events
+    await payment_events.close()
+
+
 async def on_startup():
     """Действия при запуске."""
     logger.info("Инициализация базы данных...")
     await init_db()
 
+    if config.process.role == COMBINED:
+        await prepare_data()
+
+    from bot.services.scenario_service import warm_up
+    await warm_up()
+
     logger.info("Установка команд бота...")
     await set_bot_commands()
 
-    logger.info("Запуск планировщика...")
-    scheduler = setup_scheduler()
-    scheduler.start()
+    if config.process.role == COMBINED:
+        start_scheduler()
 
     logger.info("✅ SubKiller Bot запущен!")
 
 
 async def on_shutdown():
     """Действия при остановке."""
+    from bot.services.write_queue import write_queue
+    await write_queue.close()
+
     logger.info("🛑 SubKiller Bot остановлен.")
     await bot.session.close()
 
@@ -122,7 +252,7 @@ async def start_bot():
 
 
 async def start_webapp():
-    """Запуск FastAPI webapp."""
+    """Запуск FastAPI webapp в текущем event loop (combined)."""
     import uvicorn
     from webapp.app import app
 
@@ -138,11 +268,98 @@ async def start_webapp():
 
 async def main():
     """Запуск бота и webapp параллельно."""
-    await asyncio.gather(
-        start_bot(),
-        start_webapp(),
+    try:
+        await asyncio.gather(
+            start_bot(),
+            start_webapp(),
+        )
+    finally:
+        # Mini App может писать и после остановки бота
+        await close_services()
+
+
+# ============== Раздельные роли ==============
+
+async def run_bot():
+    """Только бот: polling и хендлеры, без планировщика."""
+    try:
+        await start_bot()
+    finally:
+        await close_services()
+
+
+def run_web():
+    """
+    Только webapp: несколько процессов uvicorn. uvloop и httptools
+    подхватываются автоматически, если установлены.
+
+    Процесс заменяется на uvicorn CLI: дочерние процессы
+    импортируют только webapp.app, без бота и хендлеров.
+    """
+    asyncio.run(init_db())
+    logger.info(
+        f"Webapp: {config.process.web_workers} процесс(ов) "
+        f"на {config.webapp.host}:{config.webapp.port}"
     )
+    os.execv(sys.executable, [
+        sys.executable, "-m", "uvicorn", "webapp.app:app",
+        "--host", config.webapp.host,
+        "--port", str(config.webapp.port),
+        "--workers", str(config.process.web_workers),
+        "--loop", "auto",
+        "--http", "auto",
+        "--log-level", "info",
+    ])
+
+
+async def run_worker():
+    """Планировщик, первичные агрегаты и уведомления YooKassa."""
+    await init_db()
+    await prepare_data()
+    scheduler = start_scheduler()
+
+    from bot.services.payment_events import payment_events
+    payment_events.notify()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    logger.info("✅ SubKiller worker запущен!")
+    try:
+        await stop.wait()
+    finally:
+        scheduler.shutdown(wait=False)
+        await close_services()
+        await bot.session.close()
+        logger.info("🛑 SubKiller worker остановлен.")
+
+
+def run(role: str):
+    if role not in ROLES:
+        raise SystemExit(f"Неизвестная роль: {role} ({', '.join(ROLES)})")
+    # Процессы uvicorn читают роль из окружения
+    os.environ["APP_ROLE"] = role
+    config.process.role = role
+    logger.info(f"Роль процесса: {role}")
+
+    if role == "web":
+        run_web()
+    elif role == "bot":
+        asyncio.run(run_bot())
+    elif role == "worker":
+        asyncio.run(run_worker())
+    else:
+        asyncio.run(main())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SubKiller")
+    parser.add_argument(
+        "role", nargs="?", default=config.process.role, choices=ROLES,
+    )
+    run(parser.parse_args().role)
@@ -0,0 +1,447 @@
+"""
+Локальная модель заброса подписки — логистическая регрессия,
+обученная на нашей же истории отмен.
+
+Обучение офлайн (раз в неделю или вручную):
+
+    python -m bot.services.abandon_model
+
+Коэффициенты сохраняются в JSON (config.prediction.model_path),
+инференс — скалярное произведение по подпискам пользователя.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+
+from bot.config import config
+from bot.database import (
+    async_session, Subscription, SubscriptionStatus, UsageLevel,
+)
+from bot.utils.helpers import get_monthly_price
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+
+FEATURES = (
+    "usage_none", "usage_low", "usage_medium", "usage_high",
+    "idle_months", "is_trial", "log_monthly",
+)
+
+# Активные моложе этого срока ещё не «исход» — в обучение не идут
+MIN_AGE_DAYS = 30
+
+
+def features(
+    usage_level: str,
+    idle_days: int,
+    is_trial: bool,
+    monthly: float,
+) -> list[float]:
+    """
+    Вектор признаков (unknown — базовый уровень).
+    Возраст подписки сюда не входит: у отменённых он меряется
+    на дату отмены, у активных — на сегодня, и модель учила бы
+    «старая — значит не отменят» вместо поведения.
+    """
+    return [
+        1.0 if usage_level == UsageLevel.NONE.value else 0.0,
+        1.0 if usage_level == UsageLevel.LOW.value else 0.0,
+        1.0 if usage_level == UsageLevel.MEDIUM.value else 0.0,
+        1.0 if usage_level == UsageLevel.HIGH.value else 0.0,
+        # Дольше трёх месяцев — уже неважно насколько
+        min(max(idle_days, 0), 90) / 30,
+        1.0 if is_trial else 0.0,
+        math.log1p(max(monthly, 0.0)),
+    ]
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1 / (1 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1 + e)
+
+
+@dataclass
+class AbandonModel:
+    weights: list[float]
+    bias: float
+    name: str = f"logreg-v{MODEL_VERSION}"
+    trained_at: Optional[str] = None
+    samples: int = 0
+    report: dict = field(default_factory=dict)
+
+    def predict_proba(self, rows: Sequence[Sequence[float]]) -> list[float]:
+        """Вероятности заброса (0..1) для матрицы признаков."""
+        w, b = self.weights, self.bias
+        return [
+            _sigmoid(b + sum(wi * xi for wi, xi in zip(w, x)))
+            for x in rows
+        ]
+
+    def predict_percent(
+        self, rows: Sequence[Sequence[float]],
+    ) -> list[int]:
+        """Вероятности в процентах, в той же шкале 5..95, что эвристика."""
+        return [
+            min(95, max(5, round(p * 100)))
+            for p in self.predict_proba(rows)
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "name": self.name,
+            "features": list(FEATURES),
+            "weights": self.weights,
+            "bias": self.bias,
+            "trained_at": self.trained_at,
+            "samples": self.samples,
+            "report": self.report,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AbandonModel":
+        if (
+            data.get("version") != MODEL_VERSION
+            or tuple(data.get("features", ())) != FEATURES
+        ):
+            raise ValueError("incompatible model file")
+        return cls(
+            weights=[float(w) for w in data["weights"]],
+            bias=float(data["bias"]),
+            name=data.get("name", f"logreg-v{MODEL_VERSION}"),
+            trained_at=data.get("trained_at"),
+            samples=int(data.get("samples", 0)),
+            report=data.get("report", {}),
+        )
+
+
+# ============== Загрузка ==============
+
+_model: Optional[AbandonModel] = None
+# mtime файла, из которого загружена _model
+_mtime: Optional[int] = None
+
+
+def _file_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_model() -> Optional[AbandonModel]:
+    """
+    Текущая модель (None — нет файла, работает эвристика).
+    Файл перечитывается, когда меняется его mtime: модель,
+    переобученная отдельным процессом, подхватывается без рестарта.
+    """
+    global _model, _mtime
+    path = config.prediction.model_path
+    mtime = _file_mtime(path) if path else None
+    if mtime == _mtime:
+        return _model
+    _mtime = mtime
+    if mtime is None:
+        _model = None
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            _model = AbandonModel.from_dict(json.load(f))
+        logger.info(
+            f"Модель заброса загружена: {_model.name}, "
+            f"обучена на {_model.samples}"
+        )
+    except Exception as e:
+        # Оставляем прежнюю модель до следующей записи файла
+        logger.error(f"Abandon model load error: {e}")
+    return _model
+
+
+def is_uncertain(probability_percent: int) -> bool:
+    """Модель не уверена — вероятность близка к 50%."""
+    return (
+        abs(probability_percent - 50)
+        < config.prediction.uncertainty * 100
+    )
+
+
+def save_model(model: AbandonModel) -> None:
+    global _model, _mtime
+    path = config.prediction.model_path
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(model.to_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    _model, _mtime = model, _file_mtime(path)
+
+
+# ============== Обучающая выборка ==============
+
+async def load_training_set() -> tuple[list[list[float]], list[int], list[int]]:
+    """
+    Признаки, метки (1 — отменена) и эвристические оценки.
+    Признаки отменённых считаются на дату отмены.
+    """
+    from bot.services.prediction_service import days_since_last_use, score
+
+    today = date.today()
+    matured = datetime.utcnow() - timedelta(days=MIN_AGE_DAYS)
+    cancelled = SubscriptionStatus.CANCELLED.value
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                Subscription.status,
+                Subscription.usage_level,
+                Subscription.last_used,
+                Subscription.is_trial,
+                Subscription.price,
+                Subscription.billing_cycle,
+                Subscription.created_at,
+                Subscription.cancelled_at,
+            ).where(
+                (Subscription.status == cancelled)
+                | (Subscription.created_at <= matured)
+            )
+        )
+        rows = result.all()
+
+    x, y, heuristic = [], [], []
+    for (
+        status, usage, last_used, is_trial,
+        price, cycle, created_at, cancelled_at,
+    ) in rows:
+        label = 1 if status == cancelled else 0
+        ref = (
+            cancelled_at.date() if label and cancelled_at else today
+        )
+        idle = days_since_last_use(usage, last_used, created_at, ref)
+        monthly = get_monthly_price(price, cycle)
+        x.append(features(usage, idle, is_trial, monthly))
+        y.append(label)
+        heuristic.append(score(usage, idle, bool(is_trial)))
+    return x, y, heuristic
+
+
+# ============== Обучение ==============
+
+def _solve(a: list[list[float]], b: list[float]) -> list[float]:
+    """Решение системы a·x = b методом Гаусса."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        if abs(m[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                k = m[r][col] / m[col][col]
+                if k:
+                    for c in range(col, n + 1):
+                        m[r][c] -= k * m[col][c]
+    return [
+        m[i][n] / m[i][i] if abs(m[i][i]) >= 1e-12 else 0.0
+        for i in range(n)
+    ]
+
+
+def fit(
+    x: Sequence[Sequence[float]],
+    y: Sequence[int],
+    l2: float = 1.0,
+    iterations: int = 25,
+) -> AbandonModel:
+    """
+    Логистическая регрессия методом Ньютона (IRLS) с L2.
+    Признаков мало, поэтому гессиан обращается напрямую.
+    """
+    n_features = len(FEATURES) + 1  # + bias
+    beta = [0.0] * n_features
+    rows = [[1.0, *row] for row in x]
+
+    for _ in range(iterations):
+        grad = [0.0] * n_features
+        hess = [[0.0] * n_features for _ in range(n_features)]
+        for row, label in zip(rows, y):
+            p = _sigmoid(sum(b * v for b, v in zip(beta, row)))
+            err = p - label
+            weight = p * (1 - p)
+            for i, vi in enumerate(row):
+                grad[i] += err * vi
+                hrow = hess[i]
+                wi = weight * vi
+                for j in range(i, n_features):
+                    hrow[j] += wi * row[j]
+        # Симметрия и регуляризация (bias не штрафуем)
+        for i in range(n_features):
+            for j in range(i):
+                hess[i][j] = hess[j][i]
+            if i:
+                grad[i] += l2 * beta[i]
+                hess[i][i] += l2
+        step = _solve(hess, grad)
+        beta = [b - s for b, s in zip(beta, step)]
+        if max(abs(s) for s in step) < 1e-6:
+            break
+
+    return AbandonModel(weights=beta[1:], bias=beta[0])
+
+
+# ============== Отчёт ==============
+
+def _auc(scores: Sequence[float], labels: Sequence[int]) -> float:
+    """ROC AUC через ранги (с учётом одинаковых оценок)."""
+    pairs = sorted(zip(scores, labels))
+    pos = sum(labels)
+    neg = len(labels) - pos
+    if not pos or not neg:
+        return 0.5
+    rank_sum = 0.0
+    i = 0
+    while i < len(pairs):
+        j = i
+        while j < len(pairs) and pairs[j][0] == pairs[i][0]:
+            j += 1
+        avg_rank = (i + j + 1) / 2
+        rank_sum += avg_rank * sum(label for _, label in pairs[i:j])
+        i = j
+    return (rank_sum - pos * (pos + 1) / 2) / (pos * neg)
+
+
+def _metrics(probs: Sequence[float], labels: Sequence[int]) -> dict:
+    eps = 1e-6
+    n = len(labels) or 1
+    log_loss = -sum(
+        yv * math.log(max(p, eps)) + (1 - yv) * math.log(max(1 - p, eps))
+        for p, yv in zip(probs, labels)
+    ) / n
+    brier = sum((p - yv) ** 2 for p, yv in zip(probs, labels)) / n
+    accuracy = sum(
+        (p >= 0.5) == bool(yv) for p, yv in zip(probs, labels)
+    ) / n
+    return {
+        "auc": round(_auc(probs, labels), 4),
+        "log_loss": round(log_loss, 4),
+        "brier": round(brier, 4),
+        "accuracy": round(accuracy, 4),
+    }
+
+
+def _latency_us(fn, rows, repeat: int = 20) -> float:
+    """Медианная задержка на одну подписку, мкс."""
+    if not rows:
+        return 0.0
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return round(timings[len(timings) // 2] / len(rows) * 1e6, 3)
+
+
+def evaluate(
+    x: list[list[float]],
+    y: list[int],
+    heuristic: list[int],
+    holdout: float = 0.2,
+    seed: int = 42,
+) -> tuple[AbandonModel, dict]:
+    """Обучить на части выборки и сравнить с эвристикой на отложенной."""
+    idx = list(range(len(y)))
+    random.Random(seed).shuffle(idx)
+    cut = int(len(idx) * (1 - holdout))
+    train, test = idx[:cut], idx[cut:]
+
+    model = fit([x[i] for i in train], [y[i] for i in train])
+    x_test = [x[i] for i in test]
+    y_test = [y[i] for i in test]
+
+    from bot.services.prediction_service import score
+
+    def heuristic_fn(rows):
+        # Эвристика работает по сырым полям — восстанавливаем их
+        usage_names = (
+            UsageLevel.NONE.value, UsageLevel.LOW.value,
+            UsageLevel.MEDIUM.value, UsageLevel.HIGH.value,
+        )
+        return [
+            score(
+                next(
+                    (u for u, v in zip(usage_names, r[:4]) if v),
+                    UsageLevel.UNKNOWN.value,
+                ),
+                int(r[4] * 30), bool(r[5]),
+            )
+            for r in rows
+        ]
+
+    report = {
+        "train_size": len(train),
+        "test_size": len(test),
+        "positive_rate": round(sum(y) / len(y), 4) if y else 0,
+        "model": _metrics(model.predict_proba(x_test), y_test),
+        "heuristic": _metrics(
+            [heuristic[i] / 100 for i in test], y_test
+        ),
+        "latency_us": {
+            "model": _latency_us(model.predict_percent, x_test),
+            "heuristic": _latency_us(heuristic_fn, x_test),
+        },
+    }
+    return model, report
+
+
+async def train_model(save: bool = True) -> Optional[dict]:
+    """
+    Офлайн-обучение: выборка из БД → модель → отчёт.
+    Модель сохраняется, только если она не хуже эвристики по AUC.
+    """
+    x, y, heuristic = await load_training_set()
+    positives = sum(y)
+    if (
+        len(y) < config.prediction.min_samples
+        or not positives
+        or positives == len(y)
+    ):
+        logger.info(
+            f"Модель заброса: мало данных ({len(y)}, "
+            f"отмен {positives}) — остаётся эвристика"
+        )
+        return None
+
+    model, report = await asyncio.to_thread(evaluate, x, y, heuristic)
+    # Финальная модель — на всей выборке
+    final = await asyncio.to_thread(fit, x, y)
+    final.trained_at = datetime.utcnow().isoformat()
+    final.samples = len(y)
+    final.report = report
+
+    better = report["model"]["auc"] >= report["heuristic"]["auc"]
+    if save and better:
+        save_model(final)
+    logger.info(
+        f"Модель заброса: AUC {report['model']['auc']} "
+        f"(эвристика {report['heuristic']['auc']}), "
+        f"{'сохранена' if save and better else 'не сохранена'}"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asyncio.run(train_model()), indent=2))
@@ -0,0 +1,325 @@
+"""
+Ачивки — событийная инкрементальная проверка.
+
+Каждое правило объявляет доменные события, от которых зависит.
+При событии проверяются только затронутые и ещё не полученные
+правила, против уже посчитанных счётчиков (users, user_stats).
+Полученные ачивки кэшируются на пользователя битовой маской,
+поэтому в обычном случае проверка не делает ни одного запроса.
+"""
+
+import enum
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import select, func
+
+from bot.config import ACHIEVEMENTS
+from bot.database import async_session, User, UserAchievement, UserStats
+from bot.utils.helpers import get_health_score
+
+logger = logging.getLogger(__name__)
+
+# Сколько пользователей держать в кэше масок
+CACHE_SIZE = 10_000
+
+
+class AchievementEvent(str, enum.Enum):
+    SUBSCRIPTION_ADDED = "subscription_added"
+    SUBSCRIPTION_CANCELLED = "subscription_cancelled"
+    USAGE_UPDATED = "usage_updated"
+    STREAK_UPDATED = "streak_updated"
+    REFERRAL_JOINED = "referral_joined"
+    SAVINGS_CHANGED = "savings_changed"
+
+
+ALL_EVENTS = tuple(AchievementEvent)
+
+
+@dataclass
+class AchievementFacts:
+    """Счётчики, против которых проверяются правила."""
+    user: User
+    stats: Optional[UserStats] = None
+    referral_count: int = 0
+
+
+@dataclass(frozen=True)
+class AchievementRule:
+    key: str
+    events: frozenset
+    check: Callable[[AchievementFacts], bool]
+    needs_stats: bool = False
+    needs_referrals: bool = False
+
+
+def _days_without_new_subs(user: User) -> int:
+    if not user.last_new_sub_date:
+        return 0
+    return (date.today() - user.last_new_sub_date).days
+
+
+def _health_score(stats: Optional[UserStats]) -> int:
+    if not stats or not stats.active_count:
+        return 0
+    return get_health_score(
+        stats.active_count, stats.used_count,
+        stats.total_monthly, stats.wasted_monthly,
+    )
+
+
+def _rule(key, events, check, **needs) -> AchievementRule:
+    return AchievementRule(key, frozenset(events), check, **needs)
+
+
+_E = AchievementEvent
+
+RULES: tuple[AchievementRule, ...] = (
+    # --- Подписки ---
+    _rule(
+        "first_sub_added", [_E.SUBSCRIPTION_ADDED],
+        lambda f: bool(f.stats and f.stats.total_count),
+        needs_stats=True,
+    ),
+    # --- Отмены ---
+    *(
+        _rule(
+            key, [_E.SUBSCRIPTION_CANCELLED],
+            lambda f, n=n: (f.user.total_cancelled or 0) >= n,
+        )
+        for key, n in (
+            ("first_sub_cancelled", 1),
+            ("five_subs_cancelled", 5),
+            ("ten_subs_cancelled", 10),
+        )
+    ),
+    # --- Экономия (в месяц) ---
+    *(
+        _rule(
+            f"saved_{n}", [_E.SAVINGS_CHANGED],
+            lambda f, n=n: (f.user.total_saved or 0) >= n,
+        )
+        for n in (1000, 5000, 10000, 50000, 100000)
+    ),
+    # --- Стрики ---
+    _rule(
+        "week_streak", [_E.STREAK_UPDATED],
+        lambda f: (f.user.current_streak or 0) >= 7,
+    ),
+    _rule(
+        "month_streak", [_E.STREAK_UPDATED],
+        lambda f: (f.user.current_streak or 0) >= 30,
+    ),
+    # --- Без новых подписок (проверяется при ежедневном визите) ---
+    _rule(
+        "no_new_subs_week", [_E.STREAK_UPDATED],
+        lambda f: _days_without_new_subs(f.user) >= 7,
+    ),
+    _rule(
+        "no_new_subs_month", [_E.STREAK_UPDATED],
+        lambda f: _days_without_new_subs(f.user) >= 30,
+    ),
+    # --- Здоровье ---
+    *(
+        _rule(
+            key,
+            [
+                _E.SUBSCRIPTION_ADDED,
+                _E.SUBSCRIPTION_CANCELLED,
+                _E.USAGE_UPDATED,
+            ],
+            lambda f, n=n: _health_score(f.stats) >= n,
+            needs_stats=True,
+        )
+        for key, n in (("health_score_80", 80), ("health_score_100", 100))
+    ),
+    # --- Рефералы ---
+    _rule(
+        "invited_friend", [_E.REFERRAL_JOINED],
+        lambda f: f.referral_count >= 1,
+        needs_referrals=True,
+    ),
+    _rule(
+        "invited_five", [_E.REFERRAL_JOINED],
+        lambda f: f.referral_count >= 5,
+        needs_referrals=True,
+    ),
+)
+
+# Бит ачивки в маске — по порядку в ACHIEVEMENTS
+ACHIEVEMENT_BITS = {key: 1 << i for i, key in enumerate(ACHIEVEMENTS)}
+
+RULES_BY_EVENT: dict[AchievementEvent, tuple[AchievementRule, ...]] = {
+    event: tuple(r for r in RULES if event in r.events)
+    for event in AchievementEvent
+}
+
+
+def _mask_of(keys: Iterable[str]) -> int:
+    mask = 0
+    for key in keys:
+        mask |= ACHIEVEMENT_BITS.get(key, 0)
+    return mask
+
+
+class AchievementEngine:
+    """Проверка ачивок по событиям с кэшем масок."""
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache_size = cache_size
+        # user_id → маска полученных ачивок
+        self._earned: OrderedDict[int, int] = OrderedDict()
+        # Пользователи, по которым уже была полная проверка
+        self._synced: set[int] = set()
+
+    async def earned_mask(self, user_id: int) -> int:
+        """Маска полученных ачивок (из кэша или одним запросом)."""
+        mask = self._earned.get(user_id)
+        if mask is not None:
+            self._earned.move_to_end(user_id)
+            return mask
+
+        async with async_session() as session:
+            result = await session.execute(
+                select(UserAchievement.achievement_key).where(
+                    UserAchievement.user_id == user_id
+                )
+            )
+            mask = _mask_of(result.scalars())
+        self._remember(user_id, mask)
+        return mask
+
+    def _remember(self, user_id: int, mask: int) -> None:
+        self._earned[user_id] = mask
+        self._earned.move_to_end(user_id)
+        while len(self._earned) > self.cache_size:
+            evicted, _ = self._earned.popitem(last=False)
+            self._synced.discard(evicted)
+
+    def forget(self, user_id: int) -> None:
+        self._earned.pop(user_id, None)
+        self._synced.discard(user_id)
+
+    def earned_keys(self, mask: int) -> list[str]:
+        """Ключи ачивок из маски — в порядке ACHIEVEMENTS."""
+        return [
+            key for key, bit in ACHIEVEMENT_BITS.items() if mask & bit
+        ]
+
+    def pending_rules(
+        self, mask: int, events: Iterable[AchievementEvent],
+    ) -> list[AchievementRule]:
+        """Затронутые событиями и ещё не полученные правила."""
+        seen = set()
+        rules = []
+        for event in events:
+            for rule in RULES_BY_EVENT.get(event, ()):
+                if rule.key in seen:
+                    continue
+                seen.add(rule.key)
+                if not mask & ACHIEVEMENT_BITS.get(rule.key, 0):
+                    rules.append(rule)
+        return rules
+
+    async def on_event(
+        self,
+        user: User,
+        *events: AchievementEvent,
+        stats: Optional[UserStats] = None,
+        referral_count: Optional[int] = None,
+    ) -> list[dict]:
+        """
+        Проверить правила, затронутые событиями.
+        Возвращает новые ачивки: словари из ACHIEVEMENTS с key.
+        Ошибки не пробрасываются — ачивки не должны ломать хендлер.
+        """
+        try:
+            return await self._evaluate(
+                user, events, stats, referral_count
+            )
+        except Exception as e:
+            logger.error(f"Achievements error for {user.telegram_id}: {e}")
+            return []
+
+    async def sync(self, user: User) -> list[dict]:
+        """
+        Полная проверка всех правил — один раз на пользователя
+        за время жизни процесса (догоняет ачивки, заработанные
+        до появления событий). Дальше — только по событиям.
+        """
+        if user.id in self._synced:
+            return []
+        new = await self.on_event(user, *ALL_EVENTS)
+        if user.id in self._earned:
+            self._synced.add(user.id)
+        return new
+
+    async def _evaluate(
+        self,
+        user: User,
+        events: Iterable[AchievementEvent],
+        stats: Optional[UserStats],
+        referral_count: Optional[int],
+    ) -> list[dict]:
+        mask = await self.earned_mask(user.id)
+        rules = self.pending_rules(mask, events)
+        if not rules:
+            return []
+
+        # Счётчики — только те, что нужны оставшимся правилам
+        facts = AchievementFacts(user=user, stats=stats)
+        need_stats = stats is None and any(r.needs_stats for r in rules)
+        need_refs = referral_count is None and any(
+            r.needs_referrals for r in rules
+        )
+        if need_stats or need_refs:
+            async with async_session() as session:
+                if need_stats:
+                    facts.stats = await session.get(UserStats, user.id)
+                if need_refs:
+                    referral_count = await session.scalar(
+                        select(func.count(User.id)).where(
+                            User.referred_by == user.telegram_id
+                        )
+                    )
+        facts.referral_count = referral_count or 0
+
+        earned = [r.key for r in rules if r.check(facts)]
+        if not earned:
+            return []
+
+        async with async_session() as session:
+            # Другой процесс мог выдать их раньше — маска у него своя
+            result = await session.execute(
+                select(UserAchievement.achievement_key).where(
+                    UserAchievement.user_id == user.id,
+                    UserAchievement.achievement_key.in_(earned),
+                )
+            )
+            already = set(result.scalars())
+            session.add_all([
+                UserAchievement(user_id=user.id, achievement_key=key)
+                for key in earned
+                if key not in already
+            ])
+            await session.commit()
+
+        self._remember(user.id, mask | _mask_of(earned) | _mask_of(already))
+        earned = [key for key in earned if key not in already]
+        return [{"key": key, **ACHIEVEMENTS[key]} for key in earned]
+
+
+def format_new_achievements(new: list[dict]) -> str:
+    """Блок «Новые ачивки» для ответа хендлера."""
+    if not new:
+        return ""
+    text = "\n\n🏅 <b>Новые ачивки:</b>\n"
+    for ach in new:
+        text += f"{ach['emoji']} {ach['name']}\n"
+    return text
+
+
+achievements = AchievementEngine()
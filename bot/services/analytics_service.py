@@ -1,106 +1,66 @@
 """Аналитический сервис — расчёты для дашбордов."""
 
 import logging
-from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import select, func
+from sqlalchemy import select
 
-from bot.database import (
-    async_session, User, Subscription,
-    SubscriptionStatus, UsageLevel,
-)
-from bot.utils.helpers import get_monthly_price
+from bot.database import async_session, Subscription, UsageLevel
+from bot.services.stats_service import ACTIVE_STATUSES, monthly_price_sql
+from bot.services.read_models import SUB_ROW_COLUMNS, SubRow, to_sub_row
+from bot.services.portfolio import PortfolioTotals
 
 logger = logging.getLogger(__name__)
 
 
-async def get_user_analytics(user_id: int) -> dict:
-    """Полная аналитика по пользователю."""
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user_id
-            )
-        )
-        all_subs = list(result.scalars().all())
-
-    active = [
-        s for s in all_subs
-        if s.status in (
-            SubscriptionStatus.ACTIVE.value,
-            SubscriptionStatus.TRIAL.value,
-        )
-    ]
-    cancelled = [
-        s for s in all_subs
-        if s.status == SubscriptionStatus.CANCELLED.value
-    ]
-
-    total_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in active
+async def _most_expensive(
+    user_id: int, *levels: str,
+) -> Optional[SubRow]:
+    """Самая дорогая активная подписка — одна строка из БД."""
+    monthly = monthly_price_sql(
+        Subscription.price, Subscription.billing_cycle
     )
-
-    wasted_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in active
-        if s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        )
-    )
-
-    saved_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in cancelled
+    query = select(*SUB_ROW_COLUMNS).where(
+        Subscription.user_id == user_id,
+        Subscription.status.in_(ACTIVE_STATUSES),
     )
+    if levels:
+        query = query.where(Subscription.usage_level.in_(levels))
+    async with async_session() as session:
+        row = (await session.execute(
+            query.order_by(monthly.desc()).limit(1)
+        )).first()
+    return to_sub_row(row) if row else None
 
-    # Категории
-    categories = {}
-    for s in active:
-        m = get_monthly_price(s.price, s.billing_cycle)
-        cat = s.category or "other"
-        categories[cat] = categories.get(cat, 0) + m
 
-    # Самая дорогая
-    most_expensive = None
-    if active:
-        most_expensive = max(
-            active,
-            key=lambda s: get_monthly_price(
-                s.price, s.billing_cycle
-            ),
-        )
+async def get_user_analytics(user_id: int) -> dict:
+    """Полная аналитика по пользователю."""
+    totals = await PortfolioTotals.load(user_id)
 
-    # Самая бесполезная
-    most_wasted = None
-    wasted_subs = [
-        s for s in active
-        if s.usage_level in (
-            UsageLevel.LOW.value,
-            UsageLevel.NONE.value,
-        )
-    ]
-    if wasted_subs:
-        most_wasted = max(
-            wasted_subs,
-            key=lambda s: get_monthly_price(
-                s.price, s.billing_cycle
-            ),
-        )
+    total_monthly = totals.total_monthly
+    # Как в user_stats: потери — только low/none
+    wasted_monthly = totals.wasted_monthly(0)
+    saved_monthly = totals.saved_monthly
 
     return {
-        "total_subs": len(all_subs),
-        "active_count": len(active),
-        "cancelled_count": len(cancelled),
+        "total_subs": totals.total_count,
+        "active_count": totals.active_count,
+        "cancelled_count": totals.cancelled_count,
         "total_monthly": total_monthly,
         "total_yearly": total_monthly * 12,
         "wasted_monthly": wasted_monthly,
         "wasted_yearly": wasted_monthly * 12,
         "saved_monthly": saved_monthly,
         "saved_yearly": saved_monthly * 12,
-        "categories": categories,
-        "most_expensive": most_expensive,
-        "most_wasted": most_wasted,
-    }
\ No newline at end of file
+        "categories": totals.by_category(),
+        "most_expensive": (
+            await _most_expensive(user_id)
+            if totals.active_count else None
+        ),
+        "most_wasted": (
+            await _most_expensive(
+                user_id, UsageLevel.LOW.value, UsageLevel.NONE.value,
+            )
+            if totals.wasted_count else None
+        ),
+    }
@@ -0,0 +1,307 @@
+"""
+Распределения метрик по всем пользователям.
+
+Периодическое задание строит компактные гистограммы (фиксированные
+корзины) по оценке здоровья, месячным тратам, доле потерь и тратам
+по категориям и сохраняет их в distribution_snapshots. Процессы
+держат гистограммы в памяти, поэтому «лучше, чем у 72%» — это
+bisect по границам корзин, без обхода пользователей.
+"""
+
+import json
+import logging
+import time
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import select, delete, insert, func
+
+from bot.database import (
+    async_session, DistributionSnapshot, Subscription, UserStats,
+)
+from bot.services.stats_service import ACTIVE_STATUSES, monthly_price_sql
+from bot.utils.helpers import get_health_score
+
+logger = logging.getLogger(__name__)
+
+HEALTH_SCORE = "health_score"
+MONTHLY_SPEND = "monthly_spend"
+WASTED_SHARE = "wasted_share"
+CATEGORY_PREFIX = "category:"
+
+# Доля «не оценённых», как на дашборде здоровья
+UNKNOWN_WASTE_SHARE = 0.5
+
+# Меньше пользователей — сравнение не показываем
+MIN_POPULATION = 20
+
+# Время жизни кэша в процессе (сек); задание обновляет его сразу
+CACHE_TTL = 600
+# Как часто сверять метку сборки с БД (сек)
+STAMP_TTL = 60
+
+
+def _spend_edges() -> list[float]:
+    """Логарифмические корзины трат: 0, 50₽ … ~500 000₽ (шаг 10%)."""
+    edges = [0.0]
+    edge = 50.0
+    while edge < 500_000:
+        edges.append(round(edge, 2))
+        edge *= 1.1
+    return edges
+
+
+EDGES: dict[str, list[float]] = {
+    HEALTH_SCORE: [float(i) for i in range(101)],
+    MONTHLY_SPEND: _spend_edges(),
+    WASTED_SHARE: [i / 100 for i in range(101)],
+}
+
+
+def edges_for(metric: str) -> list[float]:
+    if metric.startswith(CATEGORY_PREFIX):
+        return EDGES[MONTHLY_SPEND]
+    return EDGES[metric]
+
+
+class Histogram:
+    """Гистограмма с накопленными суммами для поиска ранга."""
+
+    __slots__ = ("edges", "counts", "cumulative", "total")
+
+    def __init__(self, edges: Sequence[float], counts: Sequence[int]):
+        self.edges = list(edges)
+        self.counts = list(counts)
+        # cumulative[i] — сколько значений левее корзины i
+        self.cumulative = [0, *accumulate(self.counts)]
+        self.total = self.cumulative[-1]
+
+    @classmethod
+    def from_values(
+        cls, edges: Sequence[float], values: Iterable[float],
+    ) -> "Histogram":
+        counts = [0] * len(edges)
+        for v in values:
+            counts[max(0, bisect_right(edges, v) - 1)] += 1
+        return cls(edges, counts)
+
+    def percentile_rank(self, value: float) -> float:
+        """
+        Доля пользователей (%) со значением меньше value.
+        Внутри корзины — линейная интерполяция.
+        """
+        if not self.total:
+            return 0.0
+        i = max(0, bisect_right(self.edges, value) - 1)
+        lo = self.edges[i]
+        hi = self.edges[i + 1] if i + 1 < len(self.edges) else None
+        inside = 0.0
+        if hi is not None and hi > lo:
+            inside = self.counts[i] * min(1.0, (value - lo) / (hi - lo))
+        elif hi is None:
+            inside = self.counts[i] * 0.5
+        return (self.cumulative[i] + inside) / self.total * 100
+
+
+# ============== Построение ==============
+
+def user_metrics(
+    active_count: int,
+    used_count: int,
+    total_monthly: float,
+    wasted_monthly: float,
+    unknown_monthly: float,
+) -> dict[str, float]:
+    """Метрики пользователя — те же формулы, что на дашборде."""
+    wasted = wasted_monthly + unknown_monthly * UNKNOWN_WASTE_SHARE
+    return {
+        HEALTH_SCORE: get_health_score(
+            active_count, used_count, total_monthly, wasted,
+        ),
+        MONTHLY_SPEND: total_monthly,
+        WASTED_SHARE: (
+            min(1.0, wasted / total_monthly) if total_monthly > 0 else 0.0
+        ),
+    }
+
+
+async def build_distributions() -> int:
+    """
+    Пересобрать все гистограммы: user_stats + один group by
+    по категориям. Возвращает число пользователей в выборке.
+    """
+    monthly = monthly_price_sql(
+        Subscription.price, Subscription.billing_cycle
+    )
+    category = func.coalesce(Subscription.category, "other")
+
+    async with async_session() as session:
+        stats = (await session.execute(
+            select(
+                UserStats.active_count,
+                UserStats.used_count,
+                UserStats.total_monthly,
+                UserStats.wasted_monthly,
+                UserStats.unknown_monthly,
+            ).where(UserStats.active_count > 0)
+        )).all()
+        by_category = (await session.execute(
+            select(category, func.sum(monthly))
+            .where(Subscription.status.in_(ACTIVE_STATUSES))
+            .group_by(Subscription.user_id, category)
+        )).all()
+
+    values: dict[str, list[float]] = {m: [] for m in EDGES}
+    for row in stats:
+        for metric, v in user_metrics(*row).items():
+            values[metric].append(v)
+    for cat, total in by_category:
+        if total:
+            values.setdefault(f"{CATEGORY_PREFIX}{cat}", []).append(total)
+
+    now = datetime.utcnow()
+    histograms = {
+        metric: Histogram.from_values(edges_for(metric), vals)
+        for metric, vals in values.items()
+    }
+    async with async_session() as session:
+        await session.execute(delete(DistributionSnapshot))
+        await session.execute(
+            insert(DistributionSnapshot),
+            [
+                {
+                    "metric": metric,
+                    "edges": json.dumps(h.edges),
+                    "counts": json.dumps(h.counts),
+                    "total": h.total,
+                    "built_at": now,
+                }
+                for metric, h in histograms.items()
+            ],
+        )
+        await session.commit()
+
+    _set_cache(histograms, now)
+    logger.info(
+        f"Распределения: {len(stats)} пользователей, "
+        f"{len(histograms)} метрик"
+    )
+    return len(stats)
+
+
+async def build_distributions_if_empty() -> None:
+    """Первичное заполнение после появления таблицы."""
+    async with async_session() as session:
+        exists = await session.scalar(
+            select(DistributionSnapshot.metric).limit(1)
+        )
+    if exists is None:
+        await build_distributions()
+
+
+# ============== Чтение ==============
+
+_cache: dict[str, Histogram] = {}
+_cache_updated_at: float = 0
+_built_at: Optional[datetime] = None
+_stamp_checked_at: float = 0
+
+
+def _set_cache(
+    histograms: dict[str, Histogram], built_at: Optional[datetime],
+) -> None:
+    global _cache, _cache_updated_at, _built_at
+    _cache = histograms
+    _cache_updated_at = time.time()
+    _built_at = built_at
+
+
+async def get_distributions() -> dict[str, Histogram]:
+    """Гистограммы из кэша (перечитываются раз в CACHE_TTL)."""
+    if _cache_updated_at and time.time() - _cache_updated_at < CACHE_TTL:
+        return _cache
+    return await _load_distributions()
+
+
+async def _load_distributions() -> dict[str, Histogram]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                DistributionSnapshot.metric,
+                DistributionSnapshot.edges,
+                DistributionSnapshot.counts,
+                DistributionSnapshot.built_at,
+            )
+        )
+        rows = result.all()
+    histograms = {
+        metric: Histogram(json.loads(edges), json.loads(counts))
+        for metric, edges, counts, _ in rows
+    }
+    _set_cache(histograms, max((r[3] for r in rows), default=None))
+    return histograms
+
+
+async def distributions_stamp() -> str:
+    """
+    Метка сборки гистограмм (для ETag ответов со сравнением).
+    Раз в STAMP_TTL сверяется с max(built_at) в БД: у всех воркеров
+    метка сходится не позже чем через STAMP_TTL, а на каждый ответ
+    запроса нет. Если сборка новее кэша — кэш перечитывается,
+    чтобы ответ совпадал с меткой.
+    """
+    global _stamp_checked_at
+    now = time.time()
+    if now - _stamp_checked_at >= STAMP_TTL:
+        async with async_session() as session:
+            built_at = await session.scalar(
+                select(func.max(DistributionSnapshot.built_at))
+            )
+        _stamp_checked_at = now
+        # Сборок ещё не было (built_at None) — перечитывать нечего
+        if built_at != _built_at or (
+            built_at is not None and not _cache_updated_at
+        ):
+            await _load_distributions()
+    return _built_at.strftime("%Y%m%d%H%M%S") if _built_at else "0"
+
+
+async def compare_portfolio(portfolio) -> Optional[dict]:
+    """
+    Место пользователя среди всех: перцентили здоровья, трат,
+    доли потерь и самой крупной категории. None — если выборка
+    ещё слишком мала или у пользователя нет активных подписок.
+    """
+    if not portfolio.active_count:
+        return None
+    histograms = await get_distributions()
+    health = histograms.get(HEALTH_SCORE)
+    if not health or health.total < MIN_POPULATION:
+        return None
+
+    metrics = user_metrics(
+        portfolio.active_count,
+        portfolio.used_count,
+        portfolio.total_monthly,
+        portfolio.wasted_monthly(0),
+        portfolio.unknown_monthly,
+    )
+    result = {
+        metric: round(histograms[metric].percentile_rank(value))
+        for metric, value in metrics.items()
+        if metric in histograms
+    }
+
+    categories = portfolio.by_category()
+    if categories:
+        cat, spend = max(categories.items(), key=lambda kv: kv[1])
+        h = histograms.get(f"{CATEGORY_PREFIX}{cat}")
+        if h and h.total >= MIN_POPULATION:
+            result["top_category"] = {
+                "category": cat,
+                "monthly": spend,
+                "percentile": round(h.percentile_rank(spend)),
+            }
+    return result
@@ -0,0 +1,202 @@
+"""
+Прогноз списаний на год вперёд.
+
+Даты списаний каждой подписки считаются в закрытой форме:
+первая дата в горизонте — якорь + k·шаг (k — одним делением),
+дальше — range по ординалам дат. Потоки подписок уже
+отсортированы, поэтому календарь собирается k-way слиянием
+через heapq.merge без общей сортировки.
+
+Результат кэшируется на пользователя и живёт, пока не изменится
+набор подписок (сверяется по сигнатуре строк) или не наступит
+следующий день.
+"""
+
+import heapq
+import logging
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+from sqlalchemy import select
+
+from bot.database import async_session, Subscription
+from bot.services.stats_service import ACTIVE_STATUSES
+from bot.utils.helpers import BILLING_DAYS
+
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = 365
+CACHE_SIZE = 5_000
+
+FORECAST_COLUMNS = (
+    Subscription.id,
+    Subscription.name,
+    Subscription.price,
+    Subscription.billing_cycle,
+    Subscription.is_trial,
+    Subscription.trial_end_date,
+    Subscription.next_billing_date,
+)
+
+
+class Charge(NamedTuple):
+    day: date
+    subscription_id: int
+    name: str
+    amount: float
+
+
+class MonthTotal(NamedTuple):
+    month: date  # первое число месяца
+    total: float
+    count: int
+    # Часть месяца внутри горизонта
+    first: date
+    last: date
+
+    @property
+    def partial(self) -> bool:
+        """Месяц обрезан горизонтом (первый и последний из 13)."""
+        return (
+            self.first.day != 1
+            or (self.last + timedelta(days=1)).day != 1
+        )
+
+
+def charge_ordinals(
+    anchor: date, step_days: int, start: date, end: date,
+) -> range:
+    """
+    Ординалы всех списаний в [start, end] для ряда
+    anchor + k·step (k ≥ 0) — без перебора циклов.
+    """
+    behind = (start - anchor).days
+    k = -(-behind // step_days) if behind > 0 else 0
+    first = anchor.toordinal() + k * step_days
+    return range(first, end.toordinal() + 1, step_days)
+
+
+def _anchor(row) -> Optional[date]:
+    """С какой даты идут списания (у триала — с конца триала)."""
+    _, _, _, _, is_trial, trial_end, next_billing = row
+    if is_trial and trial_end:
+        return trial_end
+    return next_billing
+
+
+def _stream(row, start: date, end: date) -> Iterator[tuple]:
+    sub_id, name, price, cycle = row[:4]
+    anchor = _anchor(row)
+    for ordinal in charge_ordinals(
+        anchor, BILLING_DAYS.get(cycle, 30), start, end
+    ):
+        yield ordinal, sub_id, name, price
+
+
+class Forecast:
+    """Календарь списаний на горизонт."""
+
+    __slots__ = ("start", "end", "charges", "unscheduled", "_months")
+
+    def __init__(
+        self, rows: Sequence, start: date, horizon_days: int = HORIZON_DAYS,
+    ):
+        self.start = start
+        self.end = start + timedelta(days=horizon_days - 1)
+        scheduled = [r for r in rows if _anchor(r)]
+        # Подписки без известной даты списания — в прогноз не попадают
+        self.unscheduled = len(rows) - len(scheduled)
+        self.charges = [
+            Charge(date.fromordinal(o), sub_id, name, price)
+            for o, sub_id, name, price in heapq.merge(
+                *(_stream(r, start, self.end) for r in scheduled)
+            )
+        ]
+        self._months: Optional[list[MonthTotal]] = None
+
+    @property
+    def total(self) -> float:
+        return sum(c.amount for c in self.charges)
+
+    def by_day(self) -> list[tuple[date, float, list[Charge]]]:
+        """Дни со списаниями: дата, сумма, списания."""
+        days = []
+        for c in self.charges:
+            if days and days[-1][0] == c.day:
+                days[-1][1] += c.amount
+                days[-1][2].append(c)
+            else:
+                days.append([c.day, c.amount, [c]])
+        return [tuple(d) for d in days]
+
+    def by_month(self) -> list[MonthTotal]:
+        """
+        Суммы по календарным месяцам горизонта (включая пустые).
+        Год от произвольной даты задевает 13 месяцев: первый и
+        последний неполные, у них partial и границы first/last.
+        """
+        if self._months is None:
+            months = []
+            month = self.start.replace(day=1)
+            i = 0
+            while month <= self.end:
+                nxt = (month + timedelta(days=32)).replace(day=1)
+                total = 0.0
+                count = 0
+                while i < len(self.charges) and self.charges[i].day < nxt:
+                    total += self.charges[i].amount
+                    count += 1
+                    i += 1
+                months.append(MonthTotal(
+                    month, total, count,
+                    max(month, self.start),
+                    min(nxt - timedelta(days=1), self.end),
+                ))
+                month = nxt
+            self._months = months
+        return self._months
+
+    def upcoming(self, limit: int = 10) -> list[Charge]:
+        return self.charges[:limit]
+
+
+# ============== Кэш ==============
+
+# user_id → (ключ, прогноз)
+_cache: OrderedDict[int, tuple[tuple, Forecast]] = OrderedDict()
+
+
+async def get_forecast(
+    user_id: int, today: Optional[date] = None,
+) -> Forecast:
+    """
+    Прогноз пользователя. Запрос к БД — один лёгкий select;
+    раскладка по датам пересчитывается, только если подписки
+    изменились. Сверка по строкам, а не по сигналу инвалидации,
+    поэтому кэш корректен и в боте, и в Mini App одновременно.
+    """
+    today = today or date.today()
+    async with async_session() as session:
+        result = await session.execute(
+            select(*FORECAST_COLUMNS)
+            .where(
+                Subscription.user_id == user_id,
+                Subscription.status.in_(ACTIVE_STATUSES),
+            )
+            .order_by(Subscription.id)
+        )
+        rows = [tuple(r) for r in result]
+
+    key = (today, hash(tuple(rows)))
+    cached = _cache.get(user_id)
+    if cached and cached[0] == key:
+        _cache.move_to_end(user_id)
+        return cached[1]
+
+    forecast = Forecast(rows, today)
+    _cache[user_id] = (key, forecast)
+    _cache.move_to_end(user_id)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return forecast
@@ -164,8 +164,12 @@ class GigaChatService:
         days_since_signup: int,
         days_since_last_use: int,
         monthly_price: float,
+        fallback: Optional[dict] = None,
     ) -> dict:
-        """Предсказание: будет ли пользователь использовать подписку."""
+        """
+        Предсказание: будет ли пользователь использовать подписку.
+        При ошибке — fallback (если передан) или грубая оценка.
+        """
         system_prompt = """Ты — AI-аналитик подписок.
 Проанализируй данные и предскажи, будет ли пользователь использовать подписку.
 
@@ -204,6 +208,8 @@ class GigaChatService:
 
         except (json.JSONDecodeError, Exception) as e:
             logger.error(f"Ошибка предсказания: {e}")
+            if fallback is not None:
+                return fallback
             return {
                 "will_abandon": days_since_last_use > 30,
                 "probability_percent": min(
@@ -0,0 +1,164 @@
+"""Глобальные счётчики — атомарные инкременты и кэш чтения."""
+
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update, func, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from bot.database import (
+    async_session, dialect_insert,
+    GlobalStats, User, Subscription, SubscriptionStatus,
+)
+from bot.services.write_queue import write_queue
+
+logger = logging.getLogger(__name__)
+
+# Единственная строка со счётчиками
+GLOBAL_STATS_ID = 1
+
+# Время жизни кэша чтения (сек)
+CACHE_TTL = 60
+
+_cache: dict = {}
+_cache_updated_at: float = 0
+
+# Ключ session.info с дельтами, ждущими коммита сессии
+PENDING_KEY = "global_stats_deltas"
+
+
+async def ensure_global_stats_row() -> None:
+    """Создать строку счётчиков, если её ещё нет."""
+    async with async_session() as session:
+        await session.execute(
+            dialect_insert(GlobalStats)
+            .values(id=GLOBAL_STATS_ID)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        await session.commit()
+
+
+async def increment_global_stats(
+    session: AsyncSession,
+    **deltas: float,
+) -> None:
+    """
+    UPDATE global_stats SET x = x + :d — без чтения строки,
+    поэтому параллельные сессии не теряют обновления.
+    Коммит остаётся за вызывающим кодом.
+    С включённой очередью записи дельты копятся в session.info
+    и уходят в очередь только после коммита сессии.
+    """
+    if write_queue.enabled:
+        pending = session.info.setdefault(PENDING_KEY, {})
+        for col, d in deltas.items():
+            pending[col] = pending.get(col, 0) + d
+        return
+
+    values = {
+        col: getattr(GlobalStats, col) + d
+        for col, d in deltas.items()
+        if d
+    }
+    if not values:
+        return
+
+    await session.execute(
+        update(GlobalStats)
+        .where(GlobalStats.id == GLOBAL_STATS_ID)
+        .values(**values, updated_at=datetime.utcnow())
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_after_commit(session: Session) -> None:
+    """Закоммиченные дельты — в очередь записи."""
+    deltas = session.info.pop(PENDING_KEY, None)
+    if deltas:
+        write_queue.add(GlobalStats, GLOBAL_STATS_ID, **deltas)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_after_rollback(session: Session, transaction) -> None:
+    """Откат или закрытие без коммита — дельты отбрасываются."""
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+async def refresh_global_stats_cache() -> dict:
+    """Перечитать счётчики в кэш."""
+    global _cache, _cache_updated_at
+
+    async with async_session() as session:
+        stats = await session.get(GlobalStats, GLOBAL_STATS_ID)
+
+    _cache = {
+        "total_users": stats.total_users if stats else 0,
+        "total_saved": stats.total_saved if stats else 0.0,
+        "total_subscriptions_found": (
+            stats.total_subscriptions_found if stats else 0
+        ),
+        "total_subscriptions_cancelled": (
+            stats.total_subscriptions_cancelled if stats else 0
+        ),
+    }
+    _cache_updated_at = time.time()
+    return _cache
+
+
+async def get_global_stats() -> dict:
+    """Счётчики из кэша (обновляется раз в CACHE_TTL)."""
+    if not _cache or time.time() - _cache_updated_at > CACHE_TTL:
+        return await refresh_global_stats_cache()
+    return _cache
+
+
+async def reconcile_global_stats() -> dict:
+    """
+    Пересчитать истинные значения из users/subscriptions
+    и исправить накопившийся дрейф.
+    """
+    async with async_session() as session:
+        users_row = (
+            await session.execute(
+                select(
+                    func.count(User.id),
+                    func.coalesce(func.sum(User.total_saved), 0.0),
+                )
+            )
+        ).one()
+        subs_row = (
+            await session.execute(
+                select(
+                    func.count(Subscription.id),
+                    func.count(Subscription.id).filter(
+                        Subscription.status
+                        == SubscriptionStatus.CANCELLED.value
+                    ),
+                )
+            )
+        ).one()
+
+        values = {
+            "total_users": users_row[0],
+            "total_saved": users_row[1],
+            "total_subscriptions_found": subs_row[0],
+            "total_subscriptions_cancelled": subs_row[1],
+        }
+        await session.execute(
+            dialect_insert(GlobalStats)
+            .values(id=GLOBAL_STATS_ID)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        await session.execute(
+            update(GlobalStats)
+            .where(GlobalStats.id == GLOBAL_STATS_ID)
+            .values(**values, updated_at=datetime.utcnow())
+        )
+        await session.commit()
+
+    logger.info(f"Глобальная статистика сверена: {values}")
+    await refresh_global_stats_cache()
+    return values
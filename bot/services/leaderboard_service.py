@@ -0,0 +1,137 @@
+"""Лидерборд экономии — отсортированный снимок в памяти."""
+
+import bisect
+import logging
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+
+from bot.database import async_session, User
+
+logger = logging.getLogger(__name__)
+
+# Полная перезагрузка снимка не реже, чем раз в N секунд
+REFRESH_INTERVAL = 300
+
+
+class LeaderboardEntry(NamedTuple):
+    """Участник рейтинга."""
+    telegram_id: int
+    name: str
+    total_saved: float
+    total_cancelled: int
+
+
+def _display_name(username: Optional[str], first_name: Optional[str]) -> str:
+    return username or first_name or "Аноним"
+
+
+class Leaderboard:
+    """
+    Рейтинг по total_saved.
+
+    _keys — отсортированный список (-total_saved, telegram_id),
+    поэтому позиция и соседи ищутся через bisect за O(log n).
+    """
+
+    def __init__(self):
+        self._keys: list[tuple[float, int]] = []
+        self._entries: dict[int, LeaderboardEntry] = {}
+        self._loaded_at: float = 0
+
+    async def refresh(self) -> None:
+        """Перечитать всех участников из БД."""
+        async with async_session() as session:
+            result = await session.execute(
+                select(
+                    User.telegram_id,
+                    User.username,
+                    User.first_name,
+                    User.total_saved,
+                    User.total_cancelled,
+                ).where(User.total_saved > 0)
+            )
+            rows = result.all()
+
+        entries = {
+            tg_id: LeaderboardEntry(
+                telegram_id=tg_id,
+                name=_display_name(username, first_name),
+                total_saved=saved,
+                total_cancelled=cancelled or 0,
+            )
+            for tg_id, username, first_name, saved, cancelled in rows
+        }
+        self._entries = entries
+        self._keys = sorted(
+            (-e.total_saved, e.telegram_id) for e in entries.values()
+        )
+        self._loaded_at = time.time()
+        logger.info(f"Лидерборд обновлён: {len(entries)} участников")
+
+    async def ensure_fresh(self) -> None:
+        """Перезагрузить снимок, если он устарел."""
+        if time.time() - self._loaded_at > REFRESH_INTERVAL:
+            await self.refresh()
+
+    def update_user(self, user: User) -> None:
+        """Учесть изменение экономии пользователя без перезагрузки."""
+        if not self._loaded_at:
+            # Снимок ещё не загружен — подтянется при первом чтении
+            return
+
+        old = self._entries.pop(user.telegram_id, None)
+        if old is not None:
+            key = (-old.total_saved, old.telegram_id)
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+        if user.total_saved and user.total_saved > 0:
+            entry = LeaderboardEntry(
+                telegram_id=user.telegram_id,
+                name=_display_name(user.username, user.first_name),
+                total_saved=user.total_saved,
+                total_cancelled=user.total_cancelled or 0,
+            )
+            self._entries[user.telegram_id] = entry
+            bisect.insort(
+                self._keys, (-entry.total_saved, entry.telegram_id)
+            )
+
+    # ============== Запросы ==============
+
+    @property
+    def total(self) -> int:
+        """Количество участников (total_saved > 0)."""
+        return len(self._keys)
+
+    def top(self, n: int = 10) -> list[LeaderboardEntry]:
+        """Первые n участников."""
+        return [self._entries[tg_id] for _, tg_id in self._keys[:n]]
+
+    def get(self, telegram_id: int) -> Optional[LeaderboardEntry]:
+        return self._entries.get(telegram_id)
+
+    def rank(self, telegram_id: int) -> int:
+        """
+        Позиция пользователя (1 + число участников с большей
+        экономией). 0 — если пользователь не в рейтинге.
+        """
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return 0
+        return bisect.bisect_left(self._keys, (-entry.total_saved,)) + 1
+
+    def gap_to_position(self, telegram_id: int, position: int = 10) -> float:
+        """Сколько не хватает до указанной позиции (0 — уже там)."""
+        if position < 1 or len(self._keys) < position:
+            return 0.0
+        target_saved = -self._keys[position - 1][0]
+        entry = self._entries.get(telegram_id)
+        current = entry.total_saved if entry else 0.0
+        return max(target_saved - current, 0.0)
+
+
+leaderboard = Leaderboard()
@@ -107,8 +107,10 @@ async def check_and_send_notifications(bot: Bot):
                         notif.sent_at = now
                         continue
 
-                # Для обычных напоминаний
-                if notif.notification_type == "renewal_reminder":
+                # Напоминания и алерты по конкретной подписке
+                if notif.notification_type in (
+                    "renewal_reminder", "prediction", "unused_alert",
+                ):
                     if notif.subscription_id:
                         sub_result = await session.execute(
                             select(Subscription).where(
@@ -0,0 +1,296 @@
+"""
+Фоновая обработка уведомлений YooKassa.
+
+Вебхук только сохраняет событие в payment_events (повтор той же
+пары платёж + событие игнорируется) и сразу отвечает 200 —
+YooKassa не ждёт ни БД, ни Telegram. Активацию Premium и
+сообщение пользователю выполняет обработчик: по сигналу от
+вебхука и раз в минуту по расписанию (повторы после ошибок,
+события, оставшиеся после перезапуска).
+
+Активация идемпотентна: платёж переводится в succeeded условным
+UPDATE, и продлевает Premium только тот, кто это сделал — вебхук
+и кнопка «Я оплатил» не продлят подписку дважды.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, or_, and_
+
+from bot.database import (
+    async_session, dialect_insert,
+    User, Payment, PaymentEvent,
+    PaymentStatus, PaymentEventStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+PREMIUM_DAYS = 30
+MAX_ATTEMPTS = 5
+BATCH_SIZE = 50
+# Пауза перед повтором события, завершившегося ошибкой
+RETRY_AFTER = timedelta(minutes=1)
+# Захваченное, но не завершённое событие (процесс упал) — вернуть
+STALE_AFTER = timedelta(minutes=5)
+
+
+# ============== Приём ==============
+
+async def record_event(body: dict, raw: str) -> bool:
+    """
+    Сохранить уведомление. False — такое событие уже было
+    (повторная доставка) или в нём нет id платежа.
+    """
+    payment_id = (body.get("object") or {}).get("id")
+    event = body.get("event")
+    if not payment_id or not event:
+        return False
+
+    async with async_session() as session:
+        result = await session.execute(
+            dialect_insert(PaymentEvent)
+            .values(
+                payment_id=payment_id,
+                event=event,
+                payload=raw,
+                status=PaymentEventStatus.PENDING.value,
+                attempts=0,
+                received_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(
+                index_elements=["payment_id", "event"]
+            )
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+
+# ============== Применение ==============
+
+async def activate_premium(
+    payment_id: str,
+) -> tuple[Optional[User], bool]:
+    """
+    Отметить платёж оплаченным и продлить Premium владельцу.
+    Возвращает (пользователь, продлён ли сейчас); пользователь
+    None — платёж не найден.
+    """
+    now = datetime.utcnow()
+    async with async_session() as session:
+        payment = (await session.execute(
+            select(Payment).where(
+                Payment.yookassa_payment_id == payment_id
+            )
+        )).scalar_one_or_none()
+        if payment is None:
+            return None, False
+
+        claimed = await session.execute(
+            update(Payment)
+            .where(
+                Payment.id == payment.id,
+                Payment.status != PaymentStatus.SUCCEEDED.value,
+            )
+            .values(
+                status=PaymentStatus.SUCCEEDED.value,
+                confirmed_at=now,
+            )
+        )
+        user = await session.get(User, payment.user_id)
+        if claimed.rowcount != 1 or user is None:
+            # Уже применён (вебхуком или кнопкой)
+            return user, False
+
+        if user.premium_until and user.premium_until > now:
+            user.premium_until += timedelta(days=PREMIUM_DAYS)
+        else:
+            user.premium_until = now + timedelta(days=PREMIUM_DAYS)
+        user.is_premium = True
+        await session.commit()
+
+    logger.info(
+        f"Premium activated for user {user.telegram_id} "
+        f"until {user.premium_until}"
+    )
+    return user, True
+
+
+async def cancel_payment_record(payment_id: str) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(Payment)
+            .where(
+                Payment.yookassa_payment_id == payment_id,
+                Payment.status != PaymentStatus.SUCCEEDED.value,
+            )
+            .values(status=PaymentStatus.CANCELLED.value)
+        )
+        await session.commit()
+
+
+async def _send_confirmation(user: User) -> None:
+    try:
+        from bot.loader import bot
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text=(
+                "🎉 <b>Оплата прошла!</b>\n\n"
+                f"⭐ Premium активирован на {PREMIUM_DAYS} дней!\n"
+                f"📅 До: {user.premium_until.strftime('%d.%m.%Y')}"
+            ),
+        )
+    except Exception as e:
+        # Premium уже выдан — повторять событие ради сообщения не нужно
+        logger.error(f"Notification error: {e}")
+
+
+async def apply_event(payment_id: str, event: str) -> None:
+    """Применить одно событие. Исключение — повторить позже."""
+    if event == "payment.succeeded":
+        user, activated = await activate_premium(payment_id)
+        if user is None:
+            raise LookupError(f"payment {payment_id} not found")
+        if activated:
+            await _send_confirmation(user)
+    elif event == "payment.canceled":
+        await cancel_payment_record(payment_id)
+
+
+# ============== Обработчик ==============
+
+class PaymentEventWorker:
+    """Разбирает payment_events в фоне."""
+
+    def __init__(self):
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def notify(self) -> None:
+        """Разбудить обработчик (после записи нового события)."""
+        if self._closed:
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(
+                self._run()
+            )
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.process_pending()
+            except Exception as e:
+                logger.error(f"Payment events error: {e}")
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return and_(
+            PaymentEvent.attempts < MAX_ATTEMPTS,
+            or_(
+                PaymentEvent.status == PaymentEventStatus.PENDING.value,
+                and_(
+                    PaymentEvent.status == PaymentEventStatus.FAILED.value,
+                    PaymentEvent.updated_at < now - RETRY_AFTER,
+                ),
+                and_(
+                    PaymentEvent.status
+                    == PaymentEventStatus.PROCESSING.value,
+                    PaymentEvent.updated_at < now - STALE_AFTER,
+                ),
+            ),
+        )
+
+    async def _claim(self, payment_id: str, event: str) -> bool:
+        """Захватить событие (условный UPDATE — не дважды)."""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                update(PaymentEvent)
+                .where(
+                    PaymentEvent.payment_id == payment_id,
+                    PaymentEvent.event == event,
+                    self._claimable(now),
+                )
+                .values(
+                    status=PaymentEventStatus.PROCESSING.value,
+                    attempts=PaymentEvent.attempts + 1,
+                    updated_at=now,
+                )
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _finish(
+        self, payment_id: str, event: str, error: Optional[str] = None,
+    ) -> None:
+        async with async_session() as session:
+            await session.execute(
+                update(PaymentEvent)
+                .where(
+                    PaymentEvent.payment_id == payment_id,
+                    PaymentEvent.event == event,
+                )
+                .values(
+                    status=(
+                        PaymentEventStatus.FAILED.value if error
+                        else PaymentEventStatus.DONE.value
+                    ),
+                    last_error=error,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+
+    async def process_pending(self) -> int:
+        """Обработать всё, что ждёт. Возвращает число событий."""
+        done = 0
+        while True:
+            async with async_session() as session:
+                batch = (await session.execute(
+                    select(
+                        PaymentEvent.payment_id,
+                        PaymentEvent.event,
+                    )
+                    .where(self._claimable(datetime.utcnow()))
+                    .order_by(PaymentEvent.received_at)
+                    .limit(BATCH_SIZE)
+                )).all()
+            if not batch:
+                return done
+
+            for payment_id, event in batch:
+                if not await self._claim(payment_id, event):
+                    continue
+                try:
+                    await apply_event(payment_id, event)
+                except Exception as e:
+                    logger.error(
+                        f"Payment event {event} {payment_id}: {e}"
+                    )
+                    await self._finish(payment_id, event, str(e)[:500])
+                    continue
+                await self._finish(payment_id, event)
+                done += 1
+
+            if len(batch) < BATCH_SIZE:
+                return done
+
+
+# Синглтон
+payment_events = PaymentEventWorker()
@@ -1,26 +1,120 @@
-"""Сервис оплаты через YooKassa."""
-
+"""
+Сервис оплаты через YooKassa.
+
+Вместо синхронного SDK — собственный клиент на httpx.AsyncClient:
+HTTPS-запрос к API не блокирует общий event loop бота и Mini App.
+Соединения переиспользуются (keep-alive), у каждого запроса есть
+таймауты, у изменяющих — ключ идемпотентности. Сетевые ошибки,
+5xx и 202 («ещё обрабатывается») повторяются с тем же ключом —
+YooKassa вернёт уже созданный платёж, а не создаст второй.
+"""
+
+import asyncio
 import logging
+import time
 import uuid
-from datetime import datetime
+from typing import Optional
 
-from yookassa import Configuration, Payment as YooPayment
-from sqlalchemy import select
+import httpx
 
 from bot.config import config
 from bot.database import (
-    async_session, Payment, PaymentStatus,
+    async_session, dialect_insert, Payment, PaymentStatus,
 )
 
 logger = logging.getLogger(__name__)
 
+# Пауза перед повтором (сек), удваивается
+RETRY_DELAY = 0.5
+# Повторное «Купить» в пределах окна (сек) возвращает тот же платёж
+PURCHASE_KEY_WINDOW = 15 * 60
+
+
+def purchase_idempotence_key(
+    user_id: int, now: Optional[float] = None,
+) -> str:
+    """Ключ покупки Premium: один на пользователя в пределах окна."""
+    now = time.time() if now is None else now
+    return f"premium-{user_id}-{int(now // PURCHASE_KEY_WINDOW)}"
+
 
 class PaymentService:
     """Клиент YooKassa."""
 
     def __init__(self):
-        Configuration.account_id = config.yookassa.shop_id
-        Configuration.secret_key = config.yookassa.secret_key
+        self.cfg = config.yookassa
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий пул соединений (создаётся при первом запросе)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.cfg.api_url,
+                auth=(self.cfg.shop_id, self.cfg.secret_key),
+                timeout=httpx.Timeout(
+                    self.cfg.timeout, connect=self.cfg.connect_timeout,
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.cfg.max_connections,
+                    max_keepalive_connections=self.cfg.max_connections,
+                ),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict] = None,
+        idempotence_key: Optional[str] = None,
+    ) -> dict:
+        headers = {}
+        if idempotence_key:
+            headers["Idempotence-Key"] = idempotence_key
+        # Повтор безопасен только для GET и запросов с ключом
+        retries = self.cfg.retries if (
+            method == "GET" or idempotence_key
+        ) else 0
+
+        for attempt in range(retries + 1):
+            delay = RETRY_DELAY * 2 ** attempt
+            try:
+                response = await self.client.request(
+                    method, path, json=json, headers=headers,
+                )
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"YooKassa {method} {path}: {e!r}, повтор")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code == 202:
+                # Запрос с этим ключом ещё обрабатывается
+                if attempt == retries:
+                    raise httpx.HTTPStatusError(
+                        "YooKassa: запрос ещё обрабатывается",
+                        request=response.request,
+                        response=response,
+                    )
+                retry_after = response.json().get("retry_after")
+                if retry_after:
+                    delay = min(retry_after / 1000, self.cfg.timeout)
+            elif response.status_code >= 500 and attempt < retries:
+                logger.warning(
+                    f"YooKassa {method} {path}: "
+                    f"{response.status_code}, повтор"
+                )
+            else:
+                response.raise_for_status()
+                return response.json()
+            await asyncio.sleep(delay)
 
     async def create_payment(
         self,
@@ -28,17 +122,21 @@ class PaymentService:
         user_id: int,
         telegram_id: int,
         description: str = "SubKiller Premium",
+        idempotence_key: Optional[str] = None,
     ) -> tuple[str, str]:
         """
         Создание платежа.
         Возвращает (payment_url, payment_id).
+        С тем же idempotence_key YooKassa вернёт уже созданный платёж.
         """
-        idempotence_key = str(uuid.uuid4())
+        idempotence_key = idempotence_key or str(uuid.uuid4())
 
-        payment = YooPayment.create(
-            {
+        payment = await self._request(
+            "POST",
+            "/payments",
+            json={
                 "amount": {
-                    "value": str(amount),
+                    "value": f"{amount:.2f}",
                     "currency": "RUB",
                 },
                 "confirmation": {
@@ -56,23 +154,28 @@ class PaymentService:
                     "telegram_id": telegram_id,
                 },
             },
-            idempotence_key,
+            idempotence_key=idempotence_key,
         )
 
-        payment_url = payment.confirmation.confirmation_url
-        payment_id = payment.id
+        payment_url = payment["confirmation"]["confirmation_url"]
+        payment_id = payment["id"]
 
-        # Сохраняем в БД
+        # Сохраняем в БД (повтор по тому же ключу — та же строка)
         async with async_session() as session:
-            db_payment = Payment(
-                user_id=user_id,
-                yookassa_payment_id=payment_id,
-                amount=amount,
-                currency="RUB",
-                status=PaymentStatus.PENDING.value,
-                description=description,
+            await session.execute(
+                dialect_insert(Payment)
+                .values(
+                    user_id=user_id,
+                    yookassa_payment_id=payment_id,
+                    amount=amount,
+                    currency="RUB",
+                    status=PaymentStatus.PENDING.value,
+                    description=description,
+                )
+                .on_conflict_do_nothing(
+                    index_elements=["yookassa_payment_id"]
+                )
             )
-            session.add(db_payment)
             await session.commit()
 
         logger.info(
@@ -84,8 +187,8 @@ class PaymentService:
     async def check_payment(self, payment_id: str) -> bool:
         """Проверка статуса платежа."""
         try:
-            payment = YooPayment.find_one(payment_id)
-            return payment.status == "succeeded"
+            payment = await self._request("GET", f"/payments/{payment_id}")
+            return payment.get("status") == "succeeded"
         except Exception as e:
             logger.error(f"Payment check error: {e}")
             return False
@@ -93,7 +196,12 @@ class PaymentService:
     async def cancel_payment(self, payment_id: str) -> bool:
         """Отмена платежа."""
         try:
-            YooPayment.cancel(payment_id)
+            await self._request(
+                "POST",
+                f"/payments/{payment_id}/cancel",
+                json={},
+                idempotence_key=str(uuid.uuid4()),
+            )
             return True
         except Exception as e:
             logger.error(f"Payment cancel error: {e}")
@@ -101,4 +209,4 @@ class PaymentService:
 
 
 # Синглтон
-payment_service = PaymentService()
\ No newline at end of file
+payment_service = PaymentService()
@@ -0,0 +1,334 @@
+"""
+Портфель подписок пользователя — общий движок метрик.
+
+Строится один раз на запрос из read-моделей (SubRow) в компактные
+массивы: месячная цена, код использования, код статуса, код
+категории. Все агрегаты считаются за один проход и кэшируются,
+экраны только рендерят готовые числа.
+
+Экранам, которым строки не нужны (только суммы), хватает
+PortfolioTotals: одна строка user_stats и group by по категориям.
+"""
+
+from array import array
+from datetime import date, datetime
+from typing import Iterable, Optional, Sequence
+
+from bot.config import SUBSCRIPTION_CATEGORIES
+from bot.database import SubscriptionStatus, UsageLevel
+from bot.services.read_models import SubRow, load_sub_rows
+from bot.services.stats_service import get_user_stats, get_category_totals
+from bot.utils.helpers import (
+    get_health_score, annuity_factor, calculate_lifetime_loss,
+)
+
+# Коды использования (индексы в агрегатах)
+USAGE_LEVELS: tuple[str, ...] = (
+    UsageLevel.HIGH.value,
+    UsageLevel.MEDIUM.value,
+    UsageLevel.LOW.value,
+    UsageLevel.NONE.value,
+    UsageLevel.UNKNOWN.value,
+)
+USAGE_CODES = {level: i for i, level in enumerate(USAGE_LEVELS)}
+HIGH, MEDIUM, LOW, NONE, UNKNOWN = range(len(USAGE_LEVELS))
+
+STATUSES: tuple[str, ...] = (
+    SubscriptionStatus.ACTIVE.value,
+    SubscriptionStatus.TRIAL.value,
+    SubscriptionStatus.CANCELLED.value,
+    SubscriptionStatus.PAUSED.value,
+)
+STATUS_CODES = {status: i for i, status in enumerate(STATUSES)}
+ACTIVE, TRIAL, CANCELLED, PAUSED = range(len(STATUSES))
+
+CATEGORIES: tuple[str, ...] = tuple(SUBSCRIPTION_CATEGORIES)
+CATEGORY_CODES = {cat: i for i, cat in enumerate(CATEGORIES)}
+
+# Доля «не оценённых» подписок, считающаяся потерей по умолчанию
+UNKNOWN_WASTE_SHARE = 0.5
+
+
+class _Metrics:
+    """Метрики из агрегатов — общие для Portfolio и PortfolioTotals."""
+
+    __slots__ = ()
+
+    def health_score(
+        self, unknown_share: float = UNKNOWN_WASTE_SHARE
+    ) -> int:
+        return get_health_score(
+            self.active_count, self.used_count,
+            self.total_monthly, self.wasted_monthly(unknown_share),
+        )
+
+    def pain(
+        self,
+        unknown_share: float = UNKNOWN_WASTE_SHARE,
+        now: Optional[datetime] = None,
+    ) -> dict:
+        return pain_counters(
+            self.total_monthly, self.wasted_monthly(unknown_share), now
+        )
+
+
+class Portfolio(_Metrics):
+    """Подписки пользователя в виде параллельных массивов."""
+
+    __slots__ = (
+        "rows", "monthly", "usage", "status", "category",
+        "_category_names",
+        "_active_count", "_status_counts",
+        "_usage_counts", "_usage_sums",
+        "_category_sums", "_cancelled_monthly",
+    )
+
+    def __init__(self, rows: Sequence[SubRow]):
+        self.rows = rows
+        self.monthly = array("d", (r.monthly for r in rows))
+        self.usage = array(
+            "b", (USAGE_CODES.get(r.usage_level, UNKNOWN) for r in rows)
+        )
+        self.status = array(
+            "b", (STATUS_CODES.get(r.status, PAUSED) for r in rows)
+        )
+        self.category = self._encode_categories(rows)
+        self._aggregate()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[SubRow]) -> "Portfolio":
+        return cls(list(rows))
+
+    @classmethod
+    async def load(
+        cls,
+        user_id: int,
+        statuses: Optional[Sequence[str]] = None,
+    ) -> "Portfolio":
+        """Портфель пользователя (по умолчанию — все статусы)."""
+        return cls(await load_sub_rows(user_id, statuses=statuses))
+
+    def _encode_categories(self, rows: Sequence[SubRow]) -> array:
+        """Коды категорий; неизвестные получают коды после известных."""
+        codes = CATEGORY_CODES
+        names = list(CATEGORIES)
+        encoded = array("h")
+        for r in rows:
+            cat = r.category or "other"
+            code = codes.get(cat)
+            if code is None:
+                if codes is CATEGORY_CODES:
+                    codes = dict(CATEGORY_CODES)
+                code = codes[cat] = len(names)
+                names.append(cat)
+            encoded.append(code)
+        self._category_names = names
+        return encoded
+
+    def _aggregate(self) -> None:
+        """Все суммы за один проход."""
+        status_counts = [0] * len(STATUSES)
+        usage_counts = [0] * len(USAGE_LEVELS)
+        usage_sums = [0.0] * len(USAGE_LEVELS)
+        category_sums = [0.0] * len(self._category_names)
+        cancelled_monthly = 0.0
+
+        for m, u, st, cat in zip(
+            self.monthly, self.usage, self.status, self.category
+        ):
+            status_counts[st] += 1
+            if st == ACTIVE or st == TRIAL:
+                usage_counts[u] += 1
+                usage_sums[u] += m
+                category_sums[cat] += m
+            elif st == CANCELLED:
+                cancelled_monthly += m
+
+        self._status_counts = status_counts
+        self._active_count = status_counts[ACTIVE] + status_counts[TRIAL]
+        self._usage_counts = usage_counts
+        self._usage_sums = usage_sums
+        self._category_sums = category_sums
+        self._cancelled_monthly = cancelled_monthly
+
+    # ============== Счётчики ==============
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def active_count(self) -> int:
+        return self._active_count
+
+    @property
+    def cancelled_count(self) -> int:
+        return self._status_counts[CANCELLED]
+
+    @property
+    def used_count(self) -> int:
+        return self._usage_counts[HIGH] + self._usage_counts[MEDIUM]
+
+    @property
+    def wasted_count(self) -> int:
+        return self._usage_counts[LOW] + self._usage_counts[NONE]
+
+    def usage_count(self, level: str) -> int:
+        return self._usage_counts[USAGE_CODES[level]]
+
+    # ============== Суммы (в месяц) ==============
+
+    @property
+    def total_monthly(self) -> float:
+        return sum(self._usage_sums)
+
+    @property
+    def saved_monthly(self) -> float:
+        """Месячная стоимость отменённых подписок."""
+        return self._cancelled_monthly
+
+    def usage_monthly(self, level: str) -> float:
+        return self._usage_sums[USAGE_CODES[level]]
+
+    @property
+    def unknown_monthly(self) -> float:
+        return self._usage_sums[UNKNOWN]
+
+    def wasted_monthly(
+        self, unknown_share: float = UNKNOWN_WASTE_SHARE
+    ) -> float:
+        """Потери: low/none целиком + доля не оценённых."""
+        return (
+            self._usage_sums[LOW]
+            + self._usage_sums[NONE]
+            + self._usage_sums[UNKNOWN] * unknown_share
+        )
+
+    def by_category(self) -> dict[str, float]:
+        """Месячные траты по категориям (только активные)."""
+        return {
+            self._category_names[i]: total
+            for i, total in enumerate(self._category_sums)
+            if total
+        }
+
+    # ============== Строки для рендера ==============
+
+    def active_rows(self, *levels: str) -> list[SubRow]:
+        """Активные подписки (опционально — с указанным использованием)."""
+        codes = {USAGE_CODES[lvl] for lvl in levels}
+        return [
+            self.rows[i]
+            for i, (st, u) in enumerate(zip(self.status, self.usage))
+            if (st == ACTIVE or st == TRIAL) and (not codes or u in codes)
+        ]
+
+    def most_expensive(self, *levels: str) -> Optional[SubRow]:
+        """Самая дорогая активная подписка (среди указанных уровней)."""
+        rows = self.active_rows(*levels)
+        return max(rows, key=lambda r: r.monthly) if rows else None
+
+
+class PortfolioTotals(_Metrics):
+    """
+    Агрегаты портфеля без строк подписок: тот же интерфейс сумм
+    и счётчиков, что у Portfolio, но из user_stats (O(1) строка).
+    """
+
+    __slots__ = ("stats", "_categories")
+
+    def __init__(self, stats, categories: dict[str, float]):
+        self.stats = stats
+        self._categories = categories
+
+    @classmethod
+    async def load(
+        cls, user_id: int, categories: bool = True,
+    ) -> "PortfolioTotals":
+        """categories=False — без запроса по категориям."""
+        stats = await get_user_stats(user_id)
+        by_category = {}
+        if categories and stats.active_count:
+            by_category = await get_category_totals(user_id)
+        return cls(stats, by_category)
+
+    @property
+    def total_count(self) -> int:
+        return self.stats.total_count
+
+    @property
+    def active_count(self) -> int:
+        return self.stats.active_count
+
+    @property
+    def cancelled_count(self) -> int:
+        return self.stats.cancelled_count
+
+    @property
+    def used_count(self) -> int:
+        return self.stats.used_count
+
+    @property
+    def wasted_count(self) -> int:
+        return self.stats.wasted_count
+
+    @property
+    def total_monthly(self) -> float:
+        return self.stats.total_monthly
+
+    @property
+    def saved_monthly(self) -> float:
+        return self.stats.saved_monthly
+
+    @property
+    def unknown_monthly(self) -> float:
+        return self.stats.unknown_monthly
+
+    def wasted_monthly(
+        self, unknown_share: float = UNKNOWN_WASTE_SHARE
+    ) -> float:
+        return (
+            self.stats.wasted_monthly
+            + self.stats.unknown_monthly * unknown_share
+        )
+
+    def by_category(self) -> dict[str, float]:
+        return {cat: total for cat, total in self._categories.items() if total}
+
+
+def pain_counters(
+    total_monthly: float,
+    wasted_monthly: float,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Сколько утекает: в минуту, сегодня, за месяц, год и жизнь."""
+    now = now or datetime.now()
+    total_daily = total_monthly / 30
+    wasted_daily = wasted_monthly / 30
+    per_minute = wasted_daily / (24 * 60)
+    day_of_year = (now.date() - date(now.year, 1, 1)).days + 1
+
+    return {
+        "total_monthly": total_monthly,
+        "wasted_monthly": wasted_monthly,
+        "total_daily": total_daily,
+        "wasted_daily": wasted_daily,
+        "per_minute": per_minute,
+        # С начала дня / месяца / года
+        "today_wasted": per_minute * (now.hour * 60 + now.minute),
+        "month_wasted": wasted_daily * now.day,
+        "year_wasted": wasted_daily * day_of_year,
+        # За жизнь (40 лет)
+        "lifetime_wasted": calculate_lifetime_loss(wasted_monthly),
+    }
+
+
+def investment_projection(
+    monthly_amount: float,
+    years: Iterable[int],
+    annual_return: float,
+) -> dict[int, float]:
+    """Будущая стоимость ежемесячных взносов на несколько горизонтов."""
+    return {
+        y: round(monthly_amount * annuity_factor(y, annual_return), 0)
+        for y in years
+    }
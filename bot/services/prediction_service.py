@@ -1,84 +1,124 @@
 """Сервис предсказаний — локальные алгоритмы без AI."""
 
+import asyncio
 import logging
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional, Sequence
 
-from bot.database.models import Subscription, UsageLevel
+from sqlalchemy import select, delete
+
+from bot.database import (
+    async_session, dialect_insert,
+    User, Subscription, Notification, SubscriptionPrediction,
+    NotificationType, UsageLevel,
+)
+from bot.config import config
+from bot.services.abandon_model import get_model, features, is_uncertain
+from bot.services.stats_service import ACTIVE_STATUSES, WASTED_LEVELS
+from bot.utils.helpers import format_money, get_monthly_price
 
 logger = logging.getLogger(__name__)
 
+# Баллы за уровень использования
+USAGE_POINTS = {
+    UsageLevel.NONE.value: 70,
+    UsageLevel.LOW.value: 50,
+    UsageLevel.MEDIUM.value: 20,
+    UsageLevel.HIGH.value: 5,
+}
+UNKNOWN_POINTS = 40
+TRIAL_POINTS = 15
 
-def predict_abandonment(sub: Subscription) -> dict:
+# Пороги риска
+ABANDON_THRESHOLD = 60
+HIGH_RISK_THRESHOLD = 80
+
+# Пакетный пересчёт
+BATCH_CHUNK_SIZE = 1000
+UNUSED_ALERT_DAYS = 30
+ALERT_COOLDOWN_DAYS = 30
+
+
+def _idle_points(days_since_last_use: int) -> int:
+    """Фактор времени без использования."""
+    if days_since_last_use > 60:
+        return 20
+    if days_since_last_use > 30:
+        return 10
+    if days_since_last_use > 14:
+        return 5
+    return 0
+
+
+def days_since_last_use(
+    usage_level: str,
+    last_used: Optional[date],
+    created_at: Optional[datetime],
+    today: Optional[date] = None,
+) -> int:
     """
-    Локальное предсказание заброса подписки
-    (фоллбэк без GigaChat).
+    Дней без использования. Для low/none без даты —
+    с момента добавления, но не меньше 30.
     """
-    days_since_signup = (
-        datetime.utcnow() - sub.created_at
-    ).days
-
-    days_since_last_use = 0
-    if sub.last_used:
-        days_since_last_use = (
-            date.today() - sub.last_used
-        ).days
-    elif sub.usage_level in (
-        UsageLevel.LOW.value,
-        UsageLevel.NONE.value,
-    ):
-        days_since_last_use = max(30, days_since_signup)
-
-    # Базовая вероятность
-    base_prob = 0
-
-    # Фактор неиспользования
-    if sub.usage_level == UsageLevel.NONE.value:
-        base_prob += 70
-    elif sub.usage_level == UsageLevel.LOW.value:
-        base_prob += 50
-    elif sub.usage_level == UsageLevel.MEDIUM.value:
-        base_prob += 20
-    elif sub.usage_level == UsageLevel.HIGH.value:
-        base_prob += 5
-    else:
-        base_prob += 40  # unknown
+    today = today or date.today()
+    if last_used:
+        return (today - last_used).days
+    if usage_level in WASTED_LEVELS:
+        days_since_signup = (
+            (today - created_at.date()).days if created_at else 0
+        )
+        return max(30, days_since_signup)
+    return 0
 
-    # Фактор времени без использования
-    if days_since_last_use > 60:
-        base_prob += 20
-    elif days_since_last_use > 30:
-        base_prob += 10
-    elif days_since_last_use > 14:
-        base_prob += 5
 
-    # Trial-фактор
-    if sub.is_trial:
-        base_prob += 15
+def score(usage_level: str, idle_days: int, is_trial: bool) -> int:
+    """Вероятность заброса, % (5..95)."""
+    base_prob = (
+        USAGE_POINTS.get(usage_level, UNKNOWN_POINTS)
+        + _idle_points(idle_days)
+        + (TRIAL_POINTS if is_trial else 0)
+    )
+    return min(95, max(5, base_prob))
 
-    probability = min(95, max(5, base_prob))
 
-    from bot.utils.helpers import get_monthly_price
+def predict_abandonment(sub: Subscription) -> dict:
+    """
+    Локальное предсказание заброса подписки
+    (фоллбэк без GigaChat).
+    """
+    idle = days_since_last_use(
+        sub.usage_level, sub.last_used, sub.created_at
+    )
+    probability = score(sub.usage_level, idle, sub.is_trial)
     monthly = get_monthly_price(sub.price, sub.billing_cycle)
+    return describe(sub.name, sub.usage_level, probability, idle, monthly)
+
 
+def describe(
+    name: str,
+    usage_level: str,
+    probability: int,
+    idle_days: int,
+    monthly: float,
+) -> dict:
+    """Предсказание в формате экрана и GigaChat."""
     return {
-        "will_abandon": probability >= 60,
+        "will_abandon": probability >= ABANDON_THRESHOLD,
         "probability_percent": probability,
         "predicted_waste_6months": monthly * 6 * (probability / 100),
-        "recommendation": _get_recommendation(probability, sub),
-        "reason": _get_reason(
-            days_since_last_use, sub.usage_level
-        ),
+        "recommendation": _get_recommendation(probability, name),
+        "reason": _get_reason(idle_days, usage_level),
     }
 
 
-def _get_recommendation(prob: int, sub: Subscription) -> str:
+def _get_recommendation(prob: int, name: str) -> str:
     if prob >= 80:
-        return f"Срочно отмени {sub.name} — деньги улетают впустую"
+        return f"Срочно отмени {name} — деньги улетают впустую"
     if prob >= 60:
-        return f"Попробуй заменить {sub.name} на бесплатную альтернативу"
+        return f"Попробуй заменить {name} на бесплатную альтернативу"
     if prob >= 40:
-        return f"Оцени, нужен ли тебе {sub.name} на следующий месяц"
-    return f"{sub.name} используется нормально"
+        return f"Оцени, нужен ли тебе {name} на следующий месяц"
+    return f"{name} используется нормально"
 
 
 def _get_reason(days_since_last_use: int, usage: str) -> str:
@@ -90,4 +130,350 @@ def _get_reason(days_since_last_use: int, usage: str) -> str:
         return f"Последнее использование {days_since_last_use} дней назад"
     if usage == UsageLevel.LOW.value:
         return "Используется очень редко"
-    return "Используется нерегулярно"
\ No newline at end of file
+    return "Используется нерегулярно"
+
+
+# ============== Пакетный пересчёт ==============
+
+SCORING_COLUMNS = (
+    Subscription.id,
+    Subscription.user_id,
+    Subscription.name,
+    Subscription.price,
+    Subscription.billing_cycle,
+    Subscription.usage_level,
+    Subscription.last_used,
+    Subscription.is_trial,
+    Subscription.created_at,
+)
+
+
+class ScoredSub(NamedTuple):
+    subscription_id: int
+    user_id: int
+    name: str
+    usage_level: str
+    probability: int
+    idle_days: int
+    monthly: float
+    waste_6m: float
+    age_days: int = 0
+
+
+def model_name() -> str:
+    """Чем оцениваются подписки сейчас."""
+    model = get_model()
+    return model.name if model else "heuristic"
+
+
+def score_batch(
+    rows: Sequence, today: Optional[date] = None,
+) -> list[ScoredSub]:
+    """
+    Оценить пачку строк SCORING_COLUMNS.
+    Обычный Python, без numpy: строки один раз раскладываются
+    в списки по полям, затем несколько проходов генераторами —
+    признаки → вероятность (обученная модель, если есть, иначе
+    баллы эвристики). Выигрыш — в пачке вместо вызова на строку,
+    а не в векторных вычислениях.
+    """
+    today = today or date.today()
+    if not rows:
+        return []
+    (
+        ids, user_ids, names, prices, cycles,
+        levels, last_used, trials, created,
+    ) = zip(*rows)
+
+    idle = [
+        days_since_last_use(lvl, lu, ca, today)
+        for lvl, lu, ca in zip(levels, last_used, created)
+    ]
+    monthly = [
+        get_monthly_price(p, c) for p, c in zip(prices, cycles)
+    ]
+    age = [(today - ca.date()).days if ca else 0 for ca in created]
+
+    model = get_model()
+    if model:
+        probs = model.predict_percent([
+            features(lvl, d, bool(t), m)
+            for lvl, d, t, m in zip(levels, idle, trials, monthly)
+        ])
+    else:
+        probs = [
+            score(lvl, d, bool(t))
+            for lvl, d, t in zip(levels, idle, trials)
+        ]
+    return [
+        ScoredSub(i, u, n, lvl, prob, d, m, m * 6 * (prob / 100), a)
+        for i, u, n, lvl, prob, d, m, a in zip(
+            ids, user_ids, names, levels, probs, idle, monthly, age,
+        )
+    ]
+
+
+def _alert_for(s: ScoredSub) -> Optional[tuple[str, str]]:
+    """Тип и текст уведомления для рискованной подписки."""
+    if s.probability >= HIGH_RISK_THRESHOLD:
+        return (
+            NotificationType.PREDICTION.value,
+            f"🔮 <b>{s.name}</b>: вероятность, что ты её забросишь, — "
+            f"<b>{s.probability}%</b>.\n"
+            f"За 6 месяцев это {format_money(s.waste_6m)} впустую. "
+            f"Может, отменить сейчас?",
+        )
+    if (
+        s.usage_level in WASTED_LEVELS
+        and s.idle_days >= UNUSED_ALERT_DAYS
+    ):
+        return (
+            NotificationType.UNUSED_ALERT.value,
+            f"⚠️ Ты не пользуешься <b>{s.name}</b> уже "
+            f"{s.idle_days} дн., а платишь "
+            f"{format_money(s.monthly)}/мес.",
+        )
+    return None
+
+
+async def _enqueue_alerts(session, scored: list[ScoredSub]) -> int:
+    """Поставить уведомления по рискованным подпискам (без повторов)."""
+    candidates = {}
+    for s in scored:
+        alert = _alert_for(s)
+        if alert:
+            candidates[s.subscription_id] = (s, alert)
+    if not candidates:
+        return 0
+
+    now = datetime.utcnow()
+    alert_types = (
+        NotificationType.PREDICTION.value,
+        NotificationType.UNUSED_ALERT.value,
+    )
+    # Уже стоит в очереди или отправляли недавно
+    recent = await session.execute(
+        select(Notification.subscription_id).where(
+            Notification.subscription_id.in_(candidates),
+            Notification.notification_type.in_(alert_types),
+            (Notification.sent == False)
+            | (
+                Notification.sent_at
+                >= now - timedelta(days=ALERT_COOLDOWN_DAYS)
+            ),
+        )
+    )
+    for sub_id in recent.scalars():
+        candidates.pop(sub_id, None)
+
+    user_ids = {s.user_id for s, _ in candidates.values()}
+    if not user_ids:
+        return 0
+    enabled = set(
+        (await session.execute(
+            select(User.id).where(
+                User.id.in_(user_ids),
+                User.notifications_enabled == True,
+            )
+        )).scalars()
+    )
+
+    # Отправка утром, а не в момент ночного пересчёта
+    scheduled = datetime.combine(
+        date.today(), datetime.min.time().replace(hour=10)
+    )
+    scheduled = max(scheduled, now)
+
+    values = [
+        {
+            "user_id": s.user_id,
+            "subscription_id": s.subscription_id,
+            "notification_type": ntype,
+            "message": message,
+            "scheduled_at": scheduled,
+        }
+        for s, (ntype, message) in candidates.values()
+        if s.user_id in enabled
+    ]
+    if values:
+        await session.execute(dialect_insert(Notification), values)
+    return len(values)
+
+
+async def run_prediction_batch(chunk_size: int = BATCH_CHUNK_SIZE) -> dict:
+    """
+    Пересчитать риск по всем активным подпискам.
+    Пачки по id (keyset), одна транзакция на пачку.
+    """
+    started = datetime.utcnow()
+    today = date.today()
+    scorer = model_name()
+    scored_total = 0
+    alerts_total = 0
+    last_id = 0
+
+    while True:
+        async with async_session() as session:
+            result = await session.execute(
+                select(*SCORING_COLUMNS)
+                .where(
+                    Subscription.id > last_id,
+                    Subscription.status.in_(ACTIVE_STATUSES),
+                )
+                .order_by(Subscription.id)
+                .limit(chunk_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            scored = score_batch(rows, today)
+            stmt = dialect_insert(SubscriptionPrediction)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["subscription_id"],
+                    set_={
+                        col: stmt.excluded[col]
+                        for col in (
+                            "probability", "usage_level", "waste_6m",
+                            "days_since_last_use", "model", "scored_at",
+                        )
+                    },
+                ),
+                [
+                    {
+                        "subscription_id": s.subscription_id,
+                        "user_id": s.user_id,
+                        "probability": s.probability,
+                        "usage_level": s.usage_level,
+                        "waste_6m": s.waste_6m,
+                        "days_since_last_use": s.idle_days,
+                        "model": scorer,
+                        "scored_at": started,
+                    }
+                    for s in scored
+                ],
+            )
+            alerts_total += await _enqueue_alerts(session, scored)
+            await session.commit()
+
+        scored_total += len(rows)
+        last_id = rows[-1][0]
+        # Даём поработать остальным писателям
+        await asyncio.sleep(0)
+
+    # Отменённые и удалённые подписки больше не оцениваются
+    async with async_session() as session:
+        result = await session.execute(
+            delete(SubscriptionPrediction).where(
+                SubscriptionPrediction.scored_at < started
+            )
+        )
+        await session.commit()
+        removed = result.rowcount or 0
+
+    logger.info(
+        f"Предсказания: оценено {scored_total}, "
+        f"уведомлений {alerts_total}, удалено устаревших {removed}"
+    )
+    return {
+        "scored": scored_total,
+        "alerts": alerts_total,
+        "removed": removed,
+    }
+
+
+# ============== Чтение ==============
+
+async def load_predictions(user_id: int) -> list[tuple[ScoredSub, dict]]:
+    """
+    Предсказания по активным подпискам пользователя — из таблицы.
+    Подписки, добавленные или переоценённые после ночного
+    пересчёта, оцениваются на лету.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                *SCORING_COLUMNS,
+                SubscriptionPrediction.probability,
+                SubscriptionPrediction.usage_level,
+                SubscriptionPrediction.days_since_last_use,
+                SubscriptionPrediction.model,
+            )
+            .outerjoin(
+                SubscriptionPrediction,
+                SubscriptionPrediction.subscription_id == Subscription.id,
+            )
+            .where(
+                Subscription.user_id == user_id,
+                Subscription.status.in_(ACTIVE_STATUSES),
+            )
+            .order_by(Subscription.price.desc())
+        )
+        rows = result.all()
+
+    n = len(SCORING_COLUMNS)
+    scorer = model_name()
+    stale = [
+        row[:n] for row in rows
+        if row[n] is None or row[n + 1] != row[5] or row[n + 3] != scorer
+    ]
+    fresh = {s.subscription_id: s for s in score_batch(stale)}
+
+    predictions = []
+    for row in rows:
+        scored = fresh.get(row[0])
+        if scored is None:
+            probability, _, idle, _ = row[n:]
+            monthly = get_monthly_price(row[3], row[4])
+            created_at = row[8]
+            scored = ScoredSub(
+                row[0], row[1], row[2], row[5], probability, idle,
+                monthly, monthly * 6 * (probability / 100),
+                (date.today() - created_at.date()).days if created_at else 0,
+            )
+        predictions.append((
+            scored,
+            describe(
+                scored.name, scored.usage_level, scored.probability,
+                scored.idle_days, scored.monthly,
+            ),
+        ))
+    return predictions
+
+
+async def refine_uncertain(
+    predictions: list[tuple[ScoredSub, dict]],
+) -> list[tuple[ScoredSub, dict]]:
+    """
+    Уточнить через GigaChat только те подписки, где локальная
+    модель не уверена (вероятность около 50%). Не больше
+    config.prediction.gigachat_max_calls запросов на экран.
+    """
+    if not get_model():
+        return predictions
+    budget = config.prediction.gigachat_max_calls
+    uncertain = [
+        i for i, (s, _) in enumerate(predictions)
+        if is_uncertain(s.probability)
+    ][:budget]
+    if not uncertain:
+        return predictions
+
+    from bot.services.gigachat_service import gigachat_service
+
+    answers = await asyncio.gather(*(
+        gigachat_service.analyze_usage_prediction(
+            sub_name=predictions[i][0].name,
+            days_since_signup=predictions[i][0].age_days,
+            days_since_last_use=predictions[i][0].idle_days,
+            monthly_price=predictions[i][0].monthly,
+            fallback=predictions[i][1],
+        )
+        for i in uncertain
+    ))
+    refined = list(predictions)
+    for i, answer in zip(uncertain, answers):
+        if isinstance(answer.get("probability_percent"), (int, float)):
+            refined[i] = (refined[i][0], {**refined[i][1], **answer})
+    return refined
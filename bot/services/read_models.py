@@ -0,0 +1,136 @@
+"""
+Лёгкие read-модели подписок.
+
+Для расчётов не нужны ORM-сущности: select по конкретным
+колонкам возвращает кортежи без identity map и отслеживания
+изменений. Для записи по-прежнему используется Subscription.
+"""
+
+from datetime import date, datetime
+from typing import NamedTuple, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database import async_session, Subscription
+from bot.services.stats_service import ACTIVE_STATUSES
+from bot.utils.helpers import get_monthly_price
+
+
+class SubRow(NamedTuple):
+    """Подписка для аналитики."""
+    id: int
+    name: str
+    category: str
+    price: float
+    billing_cycle: str
+    status: str
+    usage_level: str
+    last_used: Optional[date]
+    monthly: float
+
+
+class SubListRow(NamedTuple):
+    """Подписка для списка в Mini App."""
+    id: int
+    name: str
+    category: str
+    price: float
+    billing_cycle: str
+    status: str
+    usage_level: str
+    last_used: Optional[date]
+    monthly: float
+    is_trial: bool
+    trial_end_date: Optional[date]
+    next_billing_date: Optional[date]
+    notes: Optional[str]
+    created_at: datetime
+
+
+SUB_ROW_COLUMNS = (
+    Subscription.id,
+    Subscription.name,
+    Subscription.category,
+    Subscription.price,
+    Subscription.billing_cycle,
+    Subscription.status,
+    Subscription.usage_level,
+    Subscription.last_used,
+)
+
+SUB_LIST_EXTRA_COLUMNS = (
+    Subscription.is_trial,
+    Subscription.trial_end_date,
+    Subscription.next_billing_date,
+    Subscription.notes,
+    Subscription.created_at,
+)
+
+
+def _sub_filter(
+    user_id: int,
+    statuses: Optional[Sequence[str]],
+    usage_levels: Optional[Sequence[str]],
+) -> list:
+    conditions = [Subscription.user_id == user_id]
+    if statuses is not None:
+        conditions.append(Subscription.status.in_(statuses))
+    if usage_levels is not None:
+        conditions.append(Subscription.usage_level.in_(usage_levels))
+    return conditions
+
+
+def to_sub_row(row) -> SubRow:
+    """Строка результата → SubRow (месячная цена считается один раз)."""
+    return SubRow(*row, get_monthly_price(row[3], row[4]))
+
+
+async def load_sub_rows(
+    user_id: int,
+    statuses: Optional[Sequence[str]] = ACTIVE_STATUSES,
+    usage_levels: Optional[Sequence[str]] = None,
+    session: Optional[AsyncSession] = None,
+) -> list[SubRow]:
+    """
+    Подписки пользователя как SubRow.
+    statuses=None — все статусы.
+    """
+    query = select(*SUB_ROW_COLUMNS).where(
+        *_sub_filter(user_id, statuses, usage_levels)
+    )
+    if session is not None:
+        result = await session.execute(query)
+        return [to_sub_row(row) for row in result]
+
+    async with async_session() as session:
+        result = await session.execute(query)
+        return [to_sub_row(row) for row in result]
+
+
+def to_sub_list_row(row) -> SubListRow:
+    return SubListRow(
+        *row[:8],
+        get_monthly_price(row[3], row[4]),
+        *row[8:],
+    )
+
+
+async def load_sub_list_rows(
+    user_id: int,
+    statuses: Optional[Sequence[str]] = None,
+    session: Optional[AsyncSession] = None,
+) -> list[SubListRow]:
+    """Подписки для списка, отсортированные по цене."""
+    query = (
+        select(*SUB_ROW_COLUMNS, *SUB_LIST_EXTRA_COLUMNS)
+        .where(*_sub_filter(user_id, statuses, None))
+        .order_by(Subscription.price.desc())
+    )
+    if session is not None:
+        result = await session.execute(query)
+        return [to_sub_list_row(row) for row in result]
+
+    async with async_session() as session:
+        result = await session.execute(query)
+        return [to_sub_list_row(row) for row in result]
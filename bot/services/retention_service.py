@@ -0,0 +1,234 @@
+"""Очистка старых строк (retention) и компактизация БД."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import select, delete, text
+
+from bot.config import config
+from bot.database import async_session, Notification, SocialProofEvent
+from bot.database.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Правило хранения для одной таблицы."""
+    name: str
+    model: Any
+    age_column: Any
+    max_age_days: int
+    conditions: tuple = ()
+    archive: bool = True
+
+
+@dataclass
+class RetentionReport:
+    """Результат прогона."""
+    deleted: dict[str, int] = field(default_factory=dict)
+    archived: dict[str, int] = field(default_factory=dict)
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return max(self.bytes_before - self.bytes_after, 0)
+
+
+def get_policies() -> list[RetentionPolicy]:
+    """Правила из конфига."""
+    cfg = config.retention
+    return [
+        # Отправленные уведомления больше не читаются
+        RetentionPolicy(
+            name="notifications",
+            model=Notification,
+            age_column=Notification.sent_at,
+            max_age_days=cfg.notifications_days,
+            conditions=(Notification.sent == True,),
+        ),
+        # generate_social_proof читает только последние сутки
+        RetentionPolicy(
+            name="social_proof_events",
+            model=SocialProofEvent,
+            age_column=SocialProofEvent.created_at,
+            max_age_days=cfg.social_proof_days,
+        ),
+    ]
+
+
+# ============== Архив ==============
+
+def _write_archive(table: str, rows: list[dict]) -> None:
+    """Дописать строки в gzip-JSONL (один файл на таблицу в день)."""
+    os.makedirs(config.retention.archive_dir, exist_ok=True)
+    path = os.path.join(
+        config.retention.archive_dir,
+        f"{table}-{datetime.utcnow():%Y%m%d}.jsonl.gz",
+    )
+    # gzip допускает дозапись отдельными членами
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=str))
+            f.write("\n")
+
+
+# ============== Удаление ==============
+
+async def purge(policy: RetentionPolicy) -> tuple[int, int]:
+    """
+    Удалить устаревшие строки пачками по id (keyset).
+    Каждая пачка — отдельная короткая транзакция.
+    Возвращает (удалено, заархивировано).
+    """
+    cfg = config.retention
+    table = policy.model.__table__
+    id_col = table.c.id
+    cutoff = datetime.utcnow() - timedelta(days=policy.max_age_days)
+    archive = policy.archive and bool(cfg.archive_dir)
+
+    deleted = 0
+    archived = 0
+    last_id = 0
+
+    while True:
+        async with async_session() as session:
+            query = (
+                select(table if archive else id_col)
+                .where(
+                    id_col > last_id,
+                    policy.age_column < cutoff,
+                    *policy.conditions,
+                )
+                .order_by(id_col)
+                .limit(cfg.batch_size)
+            )
+            result = await session.execute(query)
+
+            if archive:
+                rows = [dict(r) for r in result.mappings()]
+                ids = [r["id"] for r in rows]
+            else:
+                rows = []
+                ids = list(result.scalars())
+
+            if not ids:
+                break
+
+            if rows:
+                await asyncio.to_thread(
+                    _write_archive, policy.name, rows
+                )
+                archived += len(rows)
+
+            await session.execute(
+                delete(table).where(id_col.in_(ids))
+            )
+            await session.commit()
+
+        deleted += len(ids)
+        last_id = ids[-1]
+
+        # Даём поработать остальным писателям
+        await asyncio.sleep(0)
+
+    if deleted:
+        logger.info(
+            f"Retention {policy.name}: удалено {deleted}, "
+            f"в архив {archived}"
+        )
+    return deleted, archived
+
+
+# ============== Компактизация ==============
+
+async def _db_size() -> int:
+    """Размер базы в байтах."""
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            page_count = await conn.scalar(text("PRAGMA page_count"))
+            page_size = await conn.scalar(text("PRAGMA page_size"))
+            return (page_count or 0) * (page_size or 0)
+        if engine.dialect.name == "postgresql":
+            return await conn.scalar(
+                text("SELECT pg_database_size(current_database())")
+            ) or 0
+    return 0
+
+
+async def compact(tables: list[str]) -> None:
+    """
+    SQLite: incremental_vacuum + ANALYZE.
+    Полный VACUUM (блокирует базу) — только с RETENTION_FULL_VACUUM,
+    один раз, чтобы включить auto_vacuum=INCREMENTAL.
+    PostgreSQL: VACUUM (ANALYZE) по очищенным таблицам.
+    """
+    if engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            mode = await conn.scalar(text("PRAGMA auto_vacuum"))
+            if mode == 2:
+                # Прагма освобождает по странице на шаг выполнения,
+                # executescript прогоняет её до конца
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.executescript(
+                    "PRAGMA incremental_vacuum;"
+                )
+            elif config.retention.full_vacuum:
+                logger.info("Перевод SQLite в auto_vacuum=INCREMENTAL...")
+                await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+                await conn.execute(text("VACUUM"))
+            else:
+                free = await conn.scalar(text("PRAGMA freelist_count"))
+                logger.info(
+                    f"auto_vacuum выключен, свободных страниц: {free}"
+                )
+            for table in tables:
+                await conn.execute(text(f"ANALYZE {table}"))
+
+    elif engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            for table in tables:
+                await conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+
+
+async def run_retention() -> RetentionReport:
+    """Прогнать все правила и компактизацию."""
+    report = RetentionReport()
+    report.bytes_before = await _db_size()
+
+    for policy in get_policies():
+        try:
+            deleted, archived = await purge(policy)
+        except Exception as e:
+            logger.error(f"Retention {policy.name} error: {e}")
+            continue
+        report.deleted[policy.name] = deleted
+        report.archived[policy.name] = archived
+
+    cleaned = [name for name, n in report.deleted.items() if n]
+    if cleaned:
+        try:
+            await compact(cleaned)
+        except Exception as e:
+            logger.error(f"Compaction error: {e}")
+
+    report.bytes_after = await _db_size()
+    logger.info(
+        f"Retention: удалено {report.deleted}, "
+        f"в архив {report.archived}, "
+        f"освобождено {report.bytes_reclaimed} байт"
+    )
+    return report
@@ -0,0 +1,258 @@
+"""Агрегаты по подпискам пользователя (таблица user_stats)."""
+
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select, update, delete, func, case, literal, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database import (
+    async_session, dialect_insert,
+    Subscription, UserStats,
+    SubscriptionStatus, UsageLevel,
+)
+from bot.utils.helpers import get_monthly_price, MONTHLY_FACTORS
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (
+    SubscriptionStatus.ACTIVE.value,
+    SubscriptionStatus.TRIAL.value,
+)
+USED_LEVELS = (UsageLevel.HIGH.value, UsageLevel.MEDIUM.value)
+WASTED_LEVELS = (UsageLevel.LOW.value, UsageLevel.NONE.value)
+
+STAT_COLUMNS = (
+    "total_count", "active_count", "cancelled_count",
+    "used_count", "wasted_count", "unknown_count",
+    "total_monthly", "wasted_monthly", "unknown_monthly",
+    "saved_monthly",
+)
+
+
+class SubscriptionSnapshot(NamedTuple):
+    """Поля подписки, от которых зависят агрегаты."""
+    monthly: float
+    status: str
+    usage_level: str
+
+
+def snapshot(sub: Subscription) -> SubscriptionSnapshot:
+    """Снимок подписки до/после изменения."""
+    return SubscriptionSnapshot(
+        monthly=get_monthly_price(sub.price, sub.billing_cycle),
+        status=sub.status,
+        usage_level=sub.usage_level,
+    )
+
+
+def _contribution(snap: Optional[SubscriptionSnapshot]) -> dict:
+    """Вклад одной подписки в агрегаты."""
+    result = dict.fromkeys(STAT_COLUMNS, 0)
+    if snap is None:
+        return result
+
+    result["total_count"] = 1
+    if snap.status in ACTIVE_STATUSES:
+        result["active_count"] = 1
+        result["total_monthly"] = snap.monthly
+        if snap.usage_level in USED_LEVELS:
+            result["used_count"] = 1
+        elif snap.usage_level in WASTED_LEVELS:
+            result["wasted_count"] = 1
+            result["wasted_monthly"] = snap.monthly
+        elif snap.usage_level == UsageLevel.UNKNOWN.value:
+            result["unknown_count"] = 1
+            result["unknown_monthly"] = snap.monthly
+    elif snap.status == SubscriptionStatus.CANCELLED.value:
+        result["cancelled_count"] = 1
+        result["saved_monthly"] = snap.monthly
+    return result
+
+
+def subscription_delta(
+    before: Optional[SubscriptionSnapshot],
+    after: Optional[SubscriptionSnapshot],
+) -> dict:
+    """Разница агрегатов при переходе before → after."""
+    old = _contribution(before)
+    new = _contribution(after)
+    return {col: new[col] - old[col] for col in STAT_COLUMNS}
+
+
+async def apply_stats_delta(
+    session: AsyncSession,
+    user_id: int,
+    delta: dict,
+) -> None:
+    """
+    Атомарно применить дельту к строке user_stats.
+    Коммит остаётся за вызывающим кодом.
+    """
+    values = {
+        col: getattr(UserStats, col) + d
+        for col, d in delta.items()
+        if d
+    }
+    if not values:
+        return
+
+    await session.execute(
+        dialect_insert(UserStats)
+        .values(user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+    await session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(**values, updated_at=datetime.utcnow())
+    )
+
+
+async def apply_subscription_change(
+    session: AsyncSession,
+    user_id: int,
+    before: Optional[SubscriptionSnapshot],
+    after: Optional[SubscriptionSnapshot],
+) -> None:
+    """Учесть добавление/изменение/отмену подписки."""
+    await apply_stats_delta(
+        session, user_id, subscription_delta(before, after)
+    )
+
+
+# ============== Чтение ==============
+
+async def get_user_stats(user_id: int) -> UserStats:
+    """Агрегаты пользователя (нули, если подписок нет)."""
+    async with async_session() as session:
+        stats = await session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(
+            user_id=user_id,
+            **dict.fromkeys(STAT_COLUMNS, 0),
+        )
+    return stats
+
+
+def monthly_price_sql(price, billing_cycle):
+    """SQL-аналог get_monthly_price."""
+    return case(
+        *[
+            (billing_cycle == cycle, price * factor)
+            for cycle, factor in MONTHLY_FACTORS.items()
+            if factor != 1.0
+        ],
+        else_=price,
+    )
+
+
+async def get_category_totals(user_id: int) -> dict[str, float]:
+    """Месячные траты по категориям (только активные)."""
+    monthly = monthly_price_sql(
+        Subscription.price, Subscription.billing_cycle
+    )
+    async with async_session() as session:
+        result = await session.execute(
+            select(Subscription.category, func.sum(monthly))
+            .where(
+                Subscription.user_id == user_id,
+                Subscription.status.in_(ACTIVE_STATUSES),
+            )
+            .group_by(Subscription.category)
+        )
+        return {
+            (cat or "other"): total or 0
+            for cat, total in result.all()
+        }
+
+
+# ============== Восстановление ==============
+
+async def rebuild_user_stats() -> int:
+    """
+    Пересчитать user_stats из subscriptions одним
+    агрегирующим запросом. Исправляет возможный дрейф.
+    Строки обновляются upsert'ом по user_id, а не удаляются
+    целиком — дельты других пользователей, записанные во время
+    пересчёта, не теряются. Возвращает количество строк.
+    """
+    monthly = monthly_price_sql(
+        Subscription.price, Subscription.billing_cycle
+    )
+    is_active = Subscription.status.in_(ACTIVE_STATUSES)
+    is_cancelled = (
+        Subscription.status == SubscriptionStatus.CANCELLED.value
+    )
+    is_used = is_active & Subscription.usage_level.in_(USED_LEVELS)
+    is_wasted = is_active & Subscription.usage_level.in_(WASTED_LEVELS)
+    is_unknown = is_active & (
+        Subscription.usage_level == UsageLevel.UNKNOWN.value
+    )
+
+    def count_if(cond):
+        return func.sum(case((cond, 1), else_=0))
+
+    def sum_if(cond):
+        return func.sum(case((cond, monthly), else_=0.0))
+
+    query = (
+        select(
+            Subscription.user_id,
+            literal(datetime.utcnow()),
+            func.count(Subscription.id),
+            count_if(is_active),
+            count_if(is_cancelled),
+            count_if(is_used),
+            count_if(is_wasted),
+            count_if(is_unknown),
+            sum_if(is_active),
+            sum_if(is_wasted),
+            sum_if(is_unknown),
+            sum_if(is_cancelled),
+        )
+        # WHERE обязателен для SQLite: без него ON CONFLICT
+        # после INSERT ... SELECT разбирается неоднозначно
+        .where(true())
+        .group_by(Subscription.user_id)
+    )
+    stmt = dialect_insert(UserStats).from_select(
+        ["user_id", "updated_at", *STAT_COLUMNS], query
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            col: stmt.excluded[col]
+            for col in ("updated_at", *STAT_COLUMNS)
+        },
+    )
+
+    async with async_session() as session:
+        await session.execute(stmt)
+        # Пользователи, у которых не осталось подписок
+        await session.execute(
+            delete(UserStats).where(
+                UserStats.user_id.not_in(select(Subscription.user_id))
+            )
+        )
+        await session.commit()
+        count = await session.scalar(
+            select(func.count()).select_from(UserStats)
+        )
+
+    logger.info(f"user_stats пересчитана: {count} строк")
+    return count
+
+
+async def rebuild_user_stats_if_empty() -> None:
+    """Первичное заполнение после появления таблицы."""
+    async with async_session() as session:
+        has_stats = await session.scalar(
+            select(UserStats.user_id).limit(1)
+        )
+        has_subs = await session.scalar(
+            select(Subscription.id).limit(1)
+        )
+    if has_subs and not has_stats:
+        await rebuild_user_stats()
@@ -0,0 +1,258 @@
+"""
+Отложенная запись (write-behind) для мелких идемпотентных обновлений.
+
+SQLite пропускает только одного писателя, и каждый тап/визит,
+оформленный отдельной транзакцией, встаёт в очередь на блокировку.
+Очередь копит обновления по ключу (таблица, первичный ключ)
+и сбрасывает их одной транзакцией раз в interval_ms:
+
+- set — последнее значение побеждает (стрик, last_used, usage_level);
+- add — дельты суммируются (счётчики).
+
+Только для данных, потеря которых в худшем случае некритична
+и поправляется сверкой. Платежи и создание записей — напрямую.
+
+После close() очередь выключена (enabled = False): вызывающий
+код, проверяющий enabled, пишет напрямую, а set/add бросают
+RuntimeError — молча копить то, что уже никто не запишет, нельзя.
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.config import config
+from bot.database import async_session, dialect_insert, bump_for_rows
+
+logger = logging.getLogger(__name__)
+
+_Key = tuple[Any, Any]
+
+
+def _pk_column(model):
+    return model.__table__.primary_key.columns.values()[0]
+
+
+class WriteQueue:
+    """Коалесцирующая очередь отложенных UPDATE."""
+
+    def __init__(self, enabled: bool, interval_ms: int):
+        self.enabled = enabled
+        self.interval = interval_ms / 1000
+        self._sets: dict[_Key, dict[str, Any]] = {}
+        self._adds: dict[_Key, dict[str, float]] = {}
+        # Значения, которые сейчас записываются
+        self._inflight: dict[_Key, dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+    # ============== Постановка в очередь ==============
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("Write queue is closed")
+
+    def set(self, model, pk, **values) -> None:
+        """Запомнить новые значения колонок (последнее побеждает)."""
+        self._check_open()
+        self._sets.setdefault((model, pk), {}).update(values)
+        self._schedule()
+
+    def add(self, model, pk, **deltas) -> None:
+        """Прибавить к счётчикам (дельты суммируются)."""
+        self._check_open()
+        pending = self._adds.setdefault((model, pk), {})
+        for col, d in deltas.items():
+            if d:
+                pending[col] = pending.get(col, 0) + d
+        self._schedule()
+
+    def pending(self, model, pk) -> dict[str, Any]:
+        """Ещё не записанные значения set для строки."""
+        key = (model, pk)
+        return {
+            **self._inflight.get(key, {}),
+            **self._sets.get(key, {}),
+        }
+
+    def apply_pending(self, obj) -> None:
+        """Наложить несохранённые значения на загруженный объект."""
+        pk = getattr(obj, _pk_column(type(obj)).key)
+        for col, value in self.pending(type(obj), pk).items():
+            setattr(obj, col, value)
+
+    def apply_pending_adds(self, obj) -> None:
+        """Прибавить к загруженному объекту ещё не записанные дельты add."""
+        pk = getattr(obj, _pk_column(type(obj)).key)
+        for col, d in self._adds.get((type(obj), pk), {}).items():
+            setattr(obj, col, (getattr(obj, col) or 0) + d)
+
+    async def claim_pending(self, obj) -> None:
+        """
+        Наложить несохранённые значения и убрать их из очереди:
+        объект будет записан вызывающим кодом, а старое значение
+        из очереди не должно затереть новое.
+
+        Если строка сейчас записывается, ждём конца сброса: иначе
+        он может закоммитить старое значение после вызывающего кода
+        или при ошибке вернуть его в очередь.
+        """
+        key = (type(obj), getattr(obj, _pk_column(type(obj)).key))
+        values = self.pending(*key)
+        if key in self._inflight:
+            async with self._lock:
+                pass
+        values.update(self._sets.pop(key, {}))
+        for col, value in values.items():
+            setattr(obj, col, value)
+
+    async def defer_set(
+        self, session: AsyncSession, model, pk, **values,
+    ) -> None:
+        """
+        set через очередь, если она включена,
+        иначе обычный UPDATE в переданной сессии.
+        """
+        if self.enabled:
+            self.set(model, pk, **values)
+            return
+        await session.execute(
+            update(model)
+            .where(_pk_column(model) == pk)
+            .values(**values)
+        )
+
+    # ============== Сброс ==============
+
+    def _schedule(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._worker = asyncio.get_running_loop().create_task(
+                self._run()
+            )
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Даём накопиться обновлениям
+            await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write queue flush error: {e}")
+
+    async def flush(self) -> int:
+        """Записать всё накопленное одной транзакцией."""
+        if not self._sets and not self._adds:
+            return 0
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            sets, self._sets = self._sets, {}
+            adds, self._adds = self._adds, {}
+            self._inflight = sets
+            try:
+                async with async_session() as session:
+                    await self._write_sets(session, sets)
+                    await self._write_adds(session, adds)
+                    await self._bump_versions(session, sets, adds)
+                    await session.commit()
+            except BaseException:
+                # В том числе отмена посреди сброса при остановке
+                self._restore(sets, adds)
+                raise
+            finally:
+                self._inflight = {}
+        return len(sets) + len(adds)
+
+    @staticmethod
+    def _group(items: dict) -> dict:
+        """(модель, набор колонок) → список строк для executemany."""
+        groups: dict[tuple, list[dict]] = {}
+        for (model, pk), values in items.items():
+            if not values:
+                continue
+            cols = tuple(sorted(values))
+            groups.setdefault((model, cols), []).append(
+                {"_pk": pk, **{f"_v_{c}": values[c] for c in cols}}
+            )
+        return groups
+
+    async def _write_sets(self, session: AsyncSession, sets: dict) -> None:
+        for (model, cols), rows in self._group(sets).items():
+            table = model.__table__
+            stmt = (
+                update(table)
+                .where(_pk_column(model) == bindparam("_pk"))
+                .values({c: bindparam(f"_v_{c}") for c in cols})
+            )
+            await session.execute(stmt, rows)
+
+    async def _write_adds(self, session: AsyncSession, adds: dict) -> None:
+        for (model, cols), rows in self._group(adds).items():
+            table = model.__table__
+            pk_col = _pk_column(model)
+            # Строка-счётчик может ещё не существовать
+            await session.execute(
+                dialect_insert(model).on_conflict_do_nothing(
+                    index_elements=[pk_col.key]
+                ),
+                [{pk_col.key: row["_pk"]} for row in rows],
+            )
+            stmt = (
+                update(table)
+                .where(pk_col == bindparam("_pk"))
+                .values({
+                    c: table.c[c] + bindparam(f"_v_{c}") for c in cols
+                })
+            )
+            await session.execute(stmt, rows)
+
+    @staticmethod
+    async def _bump_versions(
+        session: AsyncSession, sets: dict, adds: dict,
+    ) -> None:
+        """Записи мимо ORM — версии данных для ETag вручную."""
+        pks_by_model: dict[Any, set] = {}
+        for model, pk in (*sets, *adds):
+            pks_by_model.setdefault(model, set()).add(pk)
+        for model, pks in pks_by_model.items():
+            await bump_for_rows(session, model, pks)
+
+    def _restore(self, sets: dict, adds: dict) -> None:
+        """Вернуть несохранённое в очередь (новые значения важнее)."""
+        for key, values in sets.items():
+            self._sets[key] = {**values, **self._sets.get(key, {})}
+        for key, deltas in adds.items():
+            pending = self._adds.setdefault(key, {})
+            for col, d in deltas.items():
+                pending[col] = pending.get(col, 0) + d
+
+    async def close(self) -> None:
+        """Остановить фоновый сброс и записать остаток."""
+        self._closed = True
+        self.enabled = False
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        flushed = await self.flush()
+        if flushed:
+            logger.info(f"Write queue: при остановке записано {flushed}")
+
+
+write_queue = WriteQueue(
+    enabled=config.db.write_queue,
+    interval_ms=config.db.write_queue_interval_ms,
+)
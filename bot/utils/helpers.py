@@ -3,6 +3,7 @@
 import hashlib
 import random
 import string
+from functools import lru_cache
 from datetime import date, datetime, timedelta
 from typing import Optional
 from bot.database.models import BillingCycle
@@ -37,33 +38,40 @@ def format_money(amount: float, currency: str = "RUB") -> str:
     return f"${amount:,.2f}"
 
 
+# Множители приведения цены к месяцу
+MONTHLY_FACTORS: dict[str, float] = {
+    BillingCycle.WEEKLY.value: 4.33,
+    BillingCycle.MONTHLY.value: 1.0,
+    BillingCycle.QUARTERLY.value: 1 / 3,
+    BillingCycle.SEMI_ANNUAL.value: 1 / 6,
+    BillingCycle.ANNUAL.value: 1 / 12,
+}
+
+
 def get_monthly_price(
     price: float, billing_cycle: str
 ) -> float:
     """Приведение цены к месячному значению."""
-    multipliers = {
-        BillingCycle.WEEKLY.value: price * 4.33,
-        BillingCycle.MONTHLY.value: price,
-        BillingCycle.QUARTERLY.value: price / 3,
-        BillingCycle.SEMI_ANNUAL.value: price / 6,
-        BillingCycle.ANNUAL.value: price / 12,
-    }
-    return multipliers.get(billing_cycle, price)
+    return price * MONTHLY_FACTORS.get(billing_cycle, 1.0)
+
+
+# Шаг между списаниями, дней
+BILLING_DAYS: dict[str, int] = {
+    BillingCycle.WEEKLY.value: 7,
+    BillingCycle.MONTHLY.value: 30,
+    BillingCycle.QUARTERLY.value: 90,
+    BillingCycle.SEMI_ANNUAL.value: 180,
+    BillingCycle.ANNUAL.value: 365,
+}
 
 
 def get_next_billing_date(
     current_date: date, billing_cycle: str
 ) -> date:
     """Расчёт следующей даты списания."""
-    deltas = {
-        BillingCycle.WEEKLY.value: timedelta(weeks=1),
-        BillingCycle.MONTHLY.value: timedelta(days=30),
-        BillingCycle.QUARTERLY.value: timedelta(days=90),
-        BillingCycle.SEMI_ANNUAL.value: timedelta(days=180),
-        BillingCycle.ANNUAL.value: timedelta(days=365),
-    }
-    delta = deltas.get(billing_cycle, timedelta(days=30))
-    return current_date + delta
+    return current_date + timedelta(
+        days=BILLING_DAYS.get(billing_cycle, 30)
+    )
 
 
 def days_until(target_date: date) -> int:
@@ -79,21 +87,26 @@ def calculate_yearly_cost(
     return monthly * 12
 
 
+@lru_cache(maxsize=256)
+def annuity_factor(years: int, annual_return: float) -> float:
+    """Во сколько раз вырастет сумма ежемесячных взносов по 1₽."""
+    monthly_rate = annual_return / 12
+    months = years * 12
+    if monthly_rate == 0:
+        return float(months)
+    return ((1 + monthly_rate) ** months - 1) / monthly_rate
+
+
 def calculate_investment_return(
     monthly_amount: float,
     years: int,
     annual_return: float = 0.10,
 ) -> float:
     """Расчёт инвестиционного дохода с ежемесячным взносом."""
-    monthly_rate = annual_return / 12
-    months = years * 12
-    if monthly_rate == 0:
-        return monthly_amount * months
+    if annual_return == 0:
+        return monthly_amount * years * 12
     # Формула будущей стоимости аннуитета
-    fv = monthly_amount * (
-        ((1 + monthly_rate) ** months - 1) / monthly_rate
-    )
-    return round(fv, 0)
+    return round(monthly_amount * annuity_factor(years, annual_return), 0)
 
 
 def calculate_lifetime_loss(
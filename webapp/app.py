@@ -1,40 +1,38 @@
 """FastAPI Mini App — веб-интерфейс SubKiller."""
 
 import logging
-import json
-import hashlib
-import hmac
+from contextlib import asynccontextmanager
 from datetime import datetime, date, timedelta
 from typing import Optional
-from urllib.parse import parse_qsl
 
+import orjson
 from fastapi import (
     FastAPI, Request, HTTPException,
     Depends, Query,
 )
 from fastapi.responses import (
-    HTMLResponse, JSONResponse, RedirectResponse,
+    HTMLResponse, JSONResponse, RedirectResponse, Response,
+    ORJSONResponse,
 )
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
-from sqlalchemy import select, desc, func
+from sqlalchemy import select, func
 
 from bot.config import config
 from bot.database import (
     async_session, init_db,
     User, Subscription, UserAchievement,
-    GlobalStats, Payment, Notification,
-    SubscriptionStatus, UsageLevel, PaymentStatus,
-    NotificationType, BillingCycle,
+    Notification,
+    SubscriptionStatus, UsageLevel,
+    NotificationType, BillingCycle, UserDataVersion,
+    get_data_version,
 )
 from bot.utils.helpers import (
     format_money, get_monthly_price,
-    get_health_score, health_emoji,
-    calculate_investment_return,
-    get_comparable_purchase, billing_cycle_name,
-    get_next_billing_date, days_until,
+    health_emoji,
+    get_comparable_purchase,
+    get_next_billing_date,
 )
 from bot.config import (
     SUBSCRIPTION_CATEGORIES,
@@ -43,14 +41,64 @@ from bot.config import (
     ALTERNATIVES_DB,
     SUBSCRIBER_TYPES,
 )
+from bot.services.stats_service import (
+    snapshot, apply_subscription_change,
+)
+from bot.services.global_stats_service import (
+    increment_global_stats, get_global_stats,
+)
+from bot.services.leaderboard_service import leaderboard
+from bot.services.achievement_service import (
+    achievements, AchievementEvent,
+)
+from bot.services.read_models import load_sub_list_rows, SubListRow
+from bot.services.portfolio import (
+    Portfolio, PortfolioTotals, pain_counters, investment_projection,
+)
+from bot.services.write_queue import write_queue
+from bot.services.forecast_service import get_forecast
+from bot.services.payment_events import payment_events, record_event
+from bot.services.payment_service import payment_service
+from webapp.serializers import json_response, StaticJSON, SubscriptionOut
+from webapp.assets import assets, router as static_router
+from webapp.auth import webapp_identity, webapp_user
+from webapp.pages import PageCache
+from webapp.ratelimit import RateLimiter, RateLimitMiddleware
+from bot.services.scenario_service import get_scenarios
+from bot.services.distribution_service import (
+    compare_portfolio, distributions_stamp,
+)
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Прогрев кэшей процесса. В роли web (отдельные процессы
+    uvicorn) здесь же закрываются очереди и клиенты; в combined
+    это делает bot.main.
+    """
+    from bot.services.scenario_service import warm_up
+    await warm_up()
+    yield
+    if config.process.role == "web":
+        await write_queue.close()
+        await payment_service.close()
+        await payment_events.close()
+
+
 app = FastAPI(
     title="SubRadar Mini App",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+# Лимиты на /api/* (webapp/ratelimit.py)
+rate_limiter = RateLimiter(config.rate_limit)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # Статика и шаблоны
 import os
 
@@ -64,12 +112,21 @@ os.makedirs(os.path.join(STATIC_DIR, "js"), exist_ok=True)
 os.makedirs(os.path.join(STATIC_DIR, "images"), exist_ok=True)
 os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
-app.mount(
-    "/static",
-    StaticFiles(directory=STATIC_DIR),
-    name="static",
-)
+# /static: отпечатки, gzip/br и immutable-кэш (webapp/assets.py)
+app.include_router(static_router)
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
+templates.env.globals["static"] = assets.url
+
+# Страницы зависят только от констант — рендерим один раз
+pages = PageCache(
+    templates.env,
+    {"webapp_url": config.webapp.url},
+    assets,
+    dev_mode=config.webapp.dev_mode,
+)
+pages.render_all([
+    "index.html", "subscriptions.html", "analytics.html", "premium.html",
+])
 
 
 # ============== Модели запросов ==============
@@ -95,40 +152,6 @@ class UpdateUsageRequest(BaseModel):
     usage_level: str
 
 
-# ============== Валидация Telegram WebApp ==============
-
-def validate_webapp_data(init_data: str) -> Optional[dict]:
-    """Валидация данных от Telegram WebApp."""
-    try:
-        parsed = dict(parse_qsl(init_data))
-        check_hash = parsed.pop("hash", "")
-
-        data_check_arr = sorted(
-            [f"{k}={v}" for k, v in parsed.items()]
-        )
-        data_check_string = "\n".join(data_check_arr)
-
-        secret_key = hmac.new(
-            b"WebAppData",
-            config.bot.token.encode(),
-            hashlib.sha256,
-        ).digest()
-
-        computed_hash = hmac.new(
-            secret_key,
-            data_check_string.encode(),
-            hashlib.sha256,
-        ).hexdigest()
-
-        if computed_hash == check_hash:
-            user_data = json.loads(parsed.get("user", "{}"))
-            return user_data
-        return None
-    except Exception as e:
-        logger.error(f"WebApp validation error: {e}")
-        return None
-
-
 async def get_user_from_tg_id(
     telegram_id: int,
 ) -> Optional[User]:
@@ -142,6 +165,48 @@ async def get_user_from_tg_id(
         return result.scalar_one_or_none()
 
 
+# ============== ETag ==============
+
+async def check_etag(
+    request: Request,
+    response: Response,
+    telegram_id: int,
+    *salt: str,
+) -> tuple[int, Optional[Response]]:
+    """
+    Сильный ETag по версии данных пользователя (+ соль для
+    зависящих от даты полей). Возвращает user_id и готовый
+    304-ответ, если у клиента актуальная версия.
+
+    Версия читается до данных: если запись проскочит между
+    ними, ETag окажется старше ответа и клиент просто получит
+    его заново при следующем запросе.
+    """
+    found = await get_data_version(telegram_id)
+    if found is None:
+        raise HTTPException(404, "User not found")
+    user_id, version = found
+    return user_id, apply_etag(
+        request, response, make_etag(version, *salt)
+    )
+
+
+def make_etag(version: int, *salt: str) -> str:
+    return '"' + "-".join(str(part) for part in (version, *salt)) + '"'
+
+
+def apply_etag(
+    request: Request, response: Response, etag: str,
+) -> Optional[Response]:
+    """304-ответ, если ETag совпал, иначе — заголовки в response."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 # ============== Healthcheck ==============
 
 @app.get("/health")
@@ -150,56 +215,59 @@ async def health_check():
     return {"status": "ok", "service": "SubKiller"}
 
 
+@app.get("/health/ratelimit")
+async def health_ratelimit():
+    """Счётчики лимитов этого процесса."""
+    return rate_limiter.stats()
+
+
 # ============== Страницы ==============
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Главная страница Mini App."""
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "webapp_url": config.webapp.url,
-        },
-    )
+    return pages.response(request, "index.html")
 
 
 @app.get("/subscriptions", response_class=HTMLResponse)
 async def subscriptions_page(request: Request):
     """Страница подписок."""
-    return templates.TemplateResponse(
-        "subscriptions.html",
-        {"request": request},
-    )
+    return pages.response(request, "subscriptions.html")
 
 
 @app.get("/analytics", response_class=HTMLResponse)
 async def analytics_page(request: Request):
     """Страница аналитики."""
-    return templates.TemplateResponse(
-        "analytics.html",
-        {"request": request},
-    )
+    return pages.response(request, "analytics.html")
 
 
 @app.get("/premium", response_class=HTMLResponse)
 async def premium_page(request: Request):
     """Страница Premium."""
-    return templates.TemplateResponse(
-        "premium.html",
-        {"request": request},
-    )
+    return pages.response(request, "premium.html")
 
 
 # ============== API ==============
 
-@app.get("/api/user/{telegram_id}")
-async def api_get_user(telegram_id: int):
+@app.get(
+    "/api/user/{telegram_id}", dependencies=[Depends(webapp_identity)],
+)
+async def api_get_user(
+    telegram_id: int, request: Request, response: Response,
+):
     """Получить данные пользователя."""
+    _, not_modified = await check_etag(request, response, telegram_id)
+    if not_modified:
+        return not_modified
+
     user = await get_user_from_tg_id(telegram_id)
     if not user:
         raise HTTPException(404, "User not found")
 
+    return json_response(user_payload(user), response)
+
+
+def user_payload(user: User) -> dict:
     return {
         "id": user.id,
         "telegram_id": user.telegram_id,
@@ -218,73 +286,36 @@ async def api_get_user(telegram_id: int):
     }
 
 
-@app.get("/api/subscriptions/{telegram_id}")
-async def api_get_subscriptions(telegram_id: int):
+@app.get(
+    "/api/subscriptions/{telegram_id}",
+    dependencies=[Depends(webapp_identity)],
+)
+async def api_get_subscriptions(
+    telegram_id: int, request: Request, response: Response,
+):
     """Получить подписки пользователя."""
-    user = await get_user_from_tg_id(telegram_id)
-    if not user:
-        raise HTTPException(404, "User not found")
+    # days_until_billing зависит от даты
+    user_id, not_modified = await check_etag(
+        request, response, telegram_id, date.today().isoformat(),
+    )
+    if not_modified:
+        return not_modified
+
+    subs = await load_sub_list_rows(user_id)
+    return json_response(subscriptions_payload(subs), response)
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription)
-            .where(Subscription.user_id == user.id)
-            .order_by(desc(Subscription.price))
-        )
-        subs = list(result.scalars().all())
-
-    subscriptions = []
-    for s in subs:
-        monthly = get_monthly_price(s.price, s.billing_cycle)
-        subscriptions.append({
-            "id": s.id,
-            "name": s.name,
-            "price": s.price,
-            "monthly_price": monthly,
-            "category": s.category,
-            "category_name": SUBSCRIPTION_CATEGORIES.get(
-                s.category, "Другое"
-            ),
-            "billing_cycle": s.billing_cycle,
-            "billing_cycle_name": billing_cycle_name(
-                s.billing_cycle
-            ),
-            "status": s.status,
-            "usage_level": s.usage_level,
-            "is_trial": s.is_trial,
-            "trial_end_date": (
-                s.trial_end_date.isoformat()
-                if s.trial_end_date else None
-            ),
-            "next_billing_date": (
-                s.next_billing_date.isoformat()
-                if s.next_billing_date else None
-            ),
-            "days_until_billing": (
-                days_until(s.next_billing_date)
-                if s.next_billing_date else None
-            ),
-            "last_used": (
-                s.last_used.isoformat()
-                if s.last_used else None
-            ),
-            "notes": s.notes,
-            "created_at": s.created_at.isoformat(),
-        })
 
-    return {"subscriptions": subscriptions}
+def subscriptions_payload(subs: list[SubListRow]) -> dict:
+    return {"subscriptions": [SubscriptionOut.from_row(s) for s in subs]}
 
 
 @app.post("/api/subscriptions/{telegram_id}")
 async def api_add_subscription(
     telegram_id: int,
     data: AddSubscriptionRequest,
+    user: User = Depends(webapp_user),
 ):
     """Добавить подписку через Mini App."""
-    user = await get_user_from_tg_id(telegram_id)
-    if not user:
-        raise HTTPException(404, "User not found")
-
     next_billing = None
     if data.next_billing_date:
         next_billing = date.fromisoformat(
@@ -319,6 +350,12 @@ async def api_add_subscription(
             usage_level=UsageLevel.UNKNOWN.value,
         )
         session.add(sub)
+        await apply_subscription_change(
+            session, user.id, None, snapshot(sub)
+        )
+        await increment_global_stats(
+            session, total_subscriptions_found=1
+        )
 
         # Уведомление
         if next_billing:
@@ -362,15 +399,15 @@ async def api_add_subscription(
                 session.add(trial_notif)
 
         # Обновляем дату последней подписки
-        user_result = await session.execute(
-            select(User).where(User.id == user.id)
+        await write_queue.defer_set(
+            session, User, user.id, last_new_sub_date=date.today()
         )
-        db_user = user_result.scalar_one()
-        db_user.last_new_sub_date = date.today()
 
         await session.commit()
         await session.refresh(sub)
 
+    await achievements.on_event(user, AchievementEvent.SUBSCRIPTION_ADDED)
+
     return {"status": "ok", "subscription_id": sub.id}
 
 
@@ -379,12 +416,9 @@ async def api_update_subscription(
     telegram_id: int,
     sub_id: int,
     data: UpdateSubscriptionRequest,
+    user: User = Depends(webapp_user),
 ):
     """Обновить подписку."""
-    user = await get_user_from_tg_id(telegram_id)
-    if not user:
-        raise HTTPException(404, "User not found")
-
     async with async_session() as session:
         result = await session.execute(
             select(Subscription).where(
@@ -396,6 +430,8 @@ async def api_update_subscription(
         if not sub:
             raise HTTPException(404, "Subscription not found")
 
+        await write_queue.claim_pending(sub)
+        before = snapshot(sub)
         if data.price is not None:
             sub.price = data.price
         if data.usage_level is not None:
@@ -409,8 +445,14 @@ async def api_update_subscription(
         if data.notes is not None:
             sub.notes = data.notes
 
+        await apply_subscription_change(
+            session, user.id, before, snapshot(sub)
+        )
         await session.commit()
 
+    if data.usage_level is not None:
+        await achievements.on_event(user, AchievementEvent.USAGE_UPDATED)
+
     return {"status": "ok"}
 
 
@@ -418,12 +460,9 @@ async def api_update_subscription(
 async def api_cancel_subscription(
     telegram_id: int,
     sub_id: int,
+    user: User = Depends(webapp_user),
 ):
     """Отменить подписку."""
-    user = await get_user_from_tg_id(telegram_id)
-    if not user:
-        raise HTTPException(404, "User not found")
-
     async with async_session() as session:
         result = await session.execute(
             select(Subscription).where(
@@ -439,8 +478,13 @@ async def api_cancel_subscription(
             sub.price, sub.billing_cycle
         )
 
+        await write_queue.claim_pending(sub)
+        before = snapshot(sub)
         sub.status = SubscriptionStatus.CANCELLED.value
         sub.cancelled_at = datetime.utcnow()
+        await apply_subscription_change(
+            session, user.id, before, snapshot(sub)
+        )
 
         # Обновляем статистику
         user_result = await session.execute(
@@ -451,98 +495,77 @@ async def api_cancel_subscription(
         db_user.total_cancelled += 1
 
         # Глобальная статистика
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
+        await increment_global_stats(
+            session,
+            total_saved=monthly,
+            total_subscriptions_cancelled=1,
         )
-        stats = stats_result.scalar_one_or_none()
-        if stats:
-            stats.total_saved += monthly
-            stats.total_subscriptions_cancelled += 1
 
         await session.commit()
 
+    leaderboard.update_user(db_user)
+    await achievements.on_event(
+        db_user,
+        AchievementEvent.SUBSCRIPTION_CANCELLED,
+        AchievementEvent.SAVINGS_CHANGED,
+    )
+
     return {
         "status": "ok",
         "saved_monthly": monthly,
     }
 
 
-@app.get("/api/analytics/{telegram_id}")
-async def api_get_analytics(telegram_id: int):
+@app.get(
+    "/api/analytics/{telegram_id}", dependencies=[Depends(webapp_identity)],
+)
+async def api_get_analytics(
+    telegram_id: int, request: Request, response: Response,
+):
     """Аналитика пользователя."""
+    # Счётчик боли зависит от даты, сравнение — от сборки гистограмм
+    _, not_modified = await check_etag(
+        request, response, telegram_id,
+        date.today().isoformat(), await distributions_stamp(),
+    )
+    if not_modified:
+        return not_modified
+
     user = await get_user_from_tg_id(telegram_id)
     if not user:
         raise HTTPException(404, "User not found")
 
-    async with async_session() as session:
-        result = await session.execute(
-            select(Subscription).where(
-                Subscription.user_id == user.id
-            )
-        )
-        all_subs = list(result.scalars().all())
-
-    active = [
-        s for s in all_subs
-        if s.status in (
-            SubscriptionStatus.ACTIVE.value,
-            SubscriptionStatus.TRIAL.value,
-        )
-    ]
-    cancelled = [
-        s for s in all_subs
-        if s.status == SubscriptionStatus.CANCELLED.value
-    ]
-
-    total_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in active
-    )
-    wasted_monthly = sum(
-        get_monthly_price(s.price, s.billing_cycle)
-        for s in active
-        if s.usage_level in (
-            UsageLevel.LOW.value, UsageLevel.NONE.value,
-        )
+    return json_response(
+        await analytics_payload(user, await PortfolioTotals.load(user.id)),
+        response,
     )
+
+
+async def analytics_payload(
+    user: User, portfolio: Portfolio | PortfolioTotals,
+) -> dict:
+    total_monthly = portfolio.total_monthly
+    wasted_monthly = portfolio.wasted_monthly(0)
     saved_monthly = user.total_saved
 
-    used_count = sum(
-        1 for s in active
-        if s.usage_level in (
-            UsageLevel.HIGH.value, UsageLevel.MEDIUM.value,
-        )
-    )
-    score = get_health_score(
-        len(active), used_count,
-        total_monthly, wasted_monthly,
-    )
+    score = portfolio.health_score(0)
 
     # Категории
     categories = {}
-    for s in active:
-        m = get_monthly_price(s.price, s.billing_cycle)
-        cat = SUBSCRIPTION_CATEGORIES.get(
-            s.category, "Другое"
-        )
+    for cat_key, m in portfolio.by_category().items():
+        cat = SUBSCRIPTION_CATEGORIES.get(cat_key, "Другое")
         categories[cat] = categories.get(cat, 0) + m
 
     # Инвестиции
     invest_amount = max(wasted_monthly, total_monthly * 0.3)
-    sp500_5y = calculate_investment_return(
-        invest_amount, 5, 0.10
-    )
-    sp500_10y = calculate_investment_return(
-        invest_amount, 10, 0.10
-    )
+    sp500 = investment_projection(invest_amount, (5, 10), 0.10)
+    scenarios = await get_scenarios(invest_amount)
 
     # Pain counter
-    per_minute = wasted_monthly / 30 / 24 / 60
-    now = datetime.now()
-    minutes_today = now.hour * 60 + now.minute
-    today_wasted = per_minute * minutes_today
-    day_of_month = now.day
-    month_wasted = (wasted_monthly / 30) * day_of_month
+    pain = pain_counters(total_monthly, wasted_monthly)
+
+    # Место среди всех пользователей (перцентили, None — мало данных)
+    comparison = await compare_portfolio(portfolio)
 
     return {
         "total_monthly": round(total_monthly, 0),
@@ -552,52 +575,161 @@ async def api_get_analytics(telegram_id: int):
         "wasted_yearly": round(wasted_monthly * 12, 0),
         "health_score": score,
         "health_emoji": health_emoji(score),
-        "active_count": len(active),
-        "cancelled_count": len(cancelled),
+        "active_count": portfolio.active_count,
+        "cancelled_count": portfolio.cancelled_count,
         "categories": categories,
         "investments": {
             "monthly_amount": round(invest_amount, 0),
-            "sp500_5y": round(sp500_5y, 0),
-            "sp500_10y": round(sp500_10y, 0),
+            "sp500_5y": sp500[5],
+            "sp500_10y": sp500[10],
+            # Перцентили Монте-Карло, в сегодняшних деньгах
+            "scenarios": {
+                f"{years}y": b._asdict()
+                for years, b in scenarios.items()
+            },
         },
         "pain_counter": {
-            "per_minute": round(per_minute, 4),
-            "today": round(today_wasted, 0),
-            "month": round(month_wasted, 0),
+            "per_minute": round(pain["per_minute"], 4),
+            "today": round(pain["today_wasted"], 0),
+            "month": round(pain["month_wasted"], 0),
             "year": round(wasted_monthly * 12, 0),
         },
+        "comparison": comparison,
+    }
+
+
+@app.get(
+    "/api/bootstrap/{telegram_id}", dependencies=[Depends(webapp_identity)],
+)
+async def api_bootstrap(
+    telegram_id: int, request: Request, response: Response,
+):
+    """
+    Всё для первого экрана Mini App одним ответом: пользователь,
+    подписки, аналитика и ачивки. Два запроса в одной сессии —
+    пользователь с версией и ачивками, затем подписки (из них же
+    строится Portfolio для аналитики). На 304 — только первый.
+    Метка гистограмм для ETag берётся из кэша процесса и сверяется
+    с БД не чаще раза в STAMP_TTL — отдельным коротким запросом.
+    """
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(
+                User,
+                UserDataVersion.version,
+                UserAchievement.achievement_key,
+                UserAchievement.achieved_at,
+            )
+            .outerjoin(
+                UserDataVersion, UserDataVersion.user_id == User.id
+            )
+            .outerjoin(
+                UserAchievement, UserAchievement.user_id == User.id
+            )
+            .where(User.telegram_id == telegram_id)
+        )).all()
+        if not rows:
+            raise HTTPException(404, "User not found")
+        user, version = rows[0][0], rows[0][1] or 0
+
+        not_modified = apply_etag(request, response, make_etag(
+            version, date.today().isoformat(),
+            await distributions_stamp(),
+        ))
+        if not_modified:
+            return not_modified
+
+        subs = await load_sub_list_rows(user.id, session=session)
+
+    earned = [(key, at) for _, _, key, at in rows if key]
+    return json_response({
+        "user": user_payload(user),
+        "subscriptions": subscriptions_payload(subs)["subscriptions"],
+        "analytics": await analytics_payload(user, Portfolio(subs)),
+        "achievements": achievements_payload(earned),
+    }, response)
+
+
+@app.get("/api/forecast/{telegram_id}")
+async def api_get_forecast(
+    telegram_id: int,
+    granularity: str = Query("month", pattern="^(month|day)$"),
+    user: User = Depends(webapp_user),
+):
+    """Прогноз списаний на 12 месяцев."""
+    forecast = await get_forecast(user.id)
+    data = {
+        "start": forecast.start.isoformat(),
+        "end": forecast.end.isoformat(),
+        "total": round(forecast.total, 0),
+        "unscheduled": forecast.unscheduled,
+        "months": [
+            {
+                "month": m.month.strftime("%Y-%m"),
+                "total": round(m.total, 0),
+                "count": m.count,
+                # Неполный месяц: границы внутри горизонта
+                "partial": m.partial,
+                "from": m.first.isoformat(),
+                "to": m.last.isoformat(),
+            }
+            for m in forecast.by_month()
+        ],
     }
+    if granularity == "day":
+        data["days"] = [
+            {
+                "date": day.isoformat(),
+                "total": round(total, 0),
+                "charges": [
+                    {
+                        "subscription_id": c.subscription_id,
+                        "name": c.name,
+                        "amount": c.amount,
+                    }
+                    for c in charges
+                ],
+            }
+            for day, total, charges in forecast.by_day()
+        ]
+    return data
 
 
 @app.get("/api/achievements/{telegram_id}")
-async def api_get_achievements(telegram_id: int):
+async def api_get_achievements(
+    telegram_id: int, user: User = Depends(webapp_user),
+):
     """Ачивки пользователя."""
-    user = await get_user_from_tg_id(telegram_id)
-    if not user:
-        raise HTTPException(404, "User not found")
-
     async with async_session() as session:
         result = await session.execute(
-            select(UserAchievement).where(
+            select(
+                UserAchievement.achievement_key,
+                UserAchievement.achieved_at,
+            ).where(
                 UserAchievement.user_id == user.id
             )
         )
-        user_achs = list(result.scalars().all())
+        user_achs = result.all()
+
+    return json_response(achievements_payload(user_achs))
+
 
+def achievements_payload(user_achs: list[tuple[str, datetime]]) -> dict:
+    """(ключ, когда получена) → полученные и закрытые ачивки."""
     earned = []
-    for ua in user_achs:
-        ach = ACHIEVEMENTS.get(ua.achievement_key)
+    for key, achieved_at in user_achs:
+        ach = ACHIEVEMENTS.get(key)
         if ach:
             earned.append({
-                "key": ua.achievement_key,
+                "key": key,
                 "name": ach["name"],
                 "emoji": ach["emoji"],
                 "description": ach["description"],
-                "achieved_at": ua.achieved_at.isoformat(),
+                "achieved_at": achieved_at.isoformat(),
             })
 
     locked = []
-    earned_keys = set(ua.achievement_key for ua in user_achs)
+    earned_keys = set(key for key, _ in user_achs)
     for key, ach in ACHIEVEMENTS.items():
         if key not in earned_keys:
             locked.append({
@@ -610,68 +742,64 @@ async def api_get_achievements(telegram_id: int):
     return {"earned": earned, "locked": locked}
 
 
+# Справочники не меняются — кодируются один раз при импорте
+POPULAR_PAYLOAD = StaticJSON({
+    "subscriptions": POPULAR_SUBSCRIPTIONS,
+    "categories": SUBSCRIPTION_CATEGORIES,
+})
+ALTERNATIVES_PAYLOADS = {
+    key: StaticJSON({"alternatives": alts})
+    for key, alts in ALTERNATIVES_DB.items()
+}
+NO_ALTERNATIVES = StaticJSON({"alternatives": []})
+
+
 @app.get("/api/alternatives/{sub_name}")
-async def api_get_alternatives(sub_name: str):
+async def api_get_alternatives(sub_name: str, request: Request):
     """Альтернативы для подписки."""
-    alts = ALTERNATIVES_DB.get(sub_name, [])
+    payload = ALTERNATIVES_PAYLOADS.get(sub_name)
 
     # Поиск по частичному совпадению
-    if not alts:
+    if payload is None:
         for key in ALTERNATIVES_DB:
             if key.lower() in sub_name.lower():
-                alts = ALTERNATIVES_DB[key]
+                payload = ALTERNATIVES_PAYLOADS[key]
                 break
             if sub_name.lower() in key.lower():
-                alts = ALTERNATIVES_DB[key]
+                payload = ALTERNATIVES_PAYLOADS[key]
                 break
 
-    return {"alternatives": alts}
+    return (payload or NO_ALTERNATIVES).response(request)
 
 
 @app.get("/api/popular-subscriptions")
-async def api_popular_subscriptions():
+async def api_popular_subscriptions(request: Request):
     """Список популярных подписок."""
-    return {
-        "subscriptions": POPULAR_SUBSCRIPTIONS,
-        "categories": SUBSCRIPTION_CATEGORIES,
-    }
+    return POPULAR_PAYLOAD.response(request)
 
 
 @app.get("/api/leaderboard")
 async def api_leaderboard():
     """Лидерборд."""
-    async with async_session() as session:
-        result = await session.execute(
-            select(User)
-            .where(User.total_saved > 0)
-            .order_by(desc(User.total_saved))
-            .limit(20)
-        )
-        users = list(result.scalars().all())
-
-        stats_result = await session.execute(
-            select(GlobalStats).limit(1)
-        )
-        stats = stats_result.scalar_one_or_none()
+    await leaderboard.ensure_fresh()
+    stats = await get_global_stats()
 
-    leaderboard = []
-    for i, u in enumerate(users):
-        name = u.username or u.first_name or "Аноним"
+    top = []
+    for i, entry in enumerate(leaderboard.top(20)):
+        name = entry.name
         if len(name) > 4:
             name = name[:4] + "***"
-        leaderboard.append({
+        top.append({
             "position": i + 1,
             "name": name,
-            "saved": round(u.total_saved, 0),
-            "cancelled": u.total_cancelled,
+            "saved": round(entry.total_saved, 0),
+            "cancelled": entry.total_cancelled,
         })
 
     return {
-        "leaderboard": leaderboard,
-        "total_saved": round(
-            stats.total_saved if stats else 0, 0
-        ),
-        "total_users": stats.total_users if stats else 0,
+        "leaderboard": top,
+        "total_saved": round(stats["total_saved"], 0),
+        "total_users": stats["total_users"],
     }
 
 
@@ -679,93 +807,26 @@ async def api_leaderboard():
 
 @app.post("/webhook/yookassa")
 async def yookassa_webhook(request: Request):
-    """Обработка уведомлений от YooKassa."""
+    """
+    Уведомление от YooKassa: сохранить и сразу ответить 200.
+    Premium и сообщение пользователю — в фоне (payment_events).
+    """
+    raw = await request.body()
     try:
-        body = await request.json()
-    except Exception:
+        body = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise HTTPException(400, "Invalid JSON")
+    if not isinstance(body, dict):
         raise HTTPException(400, "Invalid JSON")
 
-    event_type = body.get("event")
-    payment_obj = body.get("object", {})
-    payment_id = payment_obj.get("id")
-    status = payment_obj.get("status")
-
+    is_new = await record_event(body, raw.decode())
     logger.info(
-        f"YooKassa webhook: {event_type}, "
-        f"payment={payment_id}, status={status}"
+        f"YooKassa webhook: {body.get('event')}, "
+        f"payment={(body.get('object') or {}).get('id')}"
+        + ("" if is_new else " (повтор)")
     )
-
-    if event_type == "payment.succeeded" and payment_id:
-        async with async_session() as session:
-            result = await session.execute(
-                select(Payment).where(
-                    Payment.yookassa_payment_id == payment_id
-                )
-            )
-            payment = result.scalar_one_or_none()
-
-            if payment and payment.status != PaymentStatus.SUCCEEDED.value:
-                payment.status = PaymentStatus.SUCCEEDED.value
-                payment.confirmed_at = datetime.utcnow()
-
-                # Активируем Premium
-                user_result = await session.execute(
-                    select(User).where(
-                        User.id == payment.user_id
-                    )
-                )
-                user = user_result.scalar_one_or_none()
-
-                if user:
-                    now = datetime.utcnow()
-                    if (
-                        user.premium_until
-                        and user.premium_until > now
-                    ):
-                        user.premium_until += timedelta(days=30)
-                    else:
-                        user.premium_until = now + timedelta(
-                            days=30
-                        )
-                    user.is_premium = True
-
-                    logger.info(
-                        f"Premium activated for user "
-                        f"{user.telegram_id} until "
-                        f"{user.premium_until}"
-                    )
-
-                    # Уведомляем пользователя
-                    try:
-                        from bot.loader import bot
-                        await bot.send_message(
-                            chat_id=user.telegram_id,
-                            text=(
-                                "🎉 <b>Оплата прошла!</b>\n\n"
-                                "⭐ Premium активирован на "
-                                "30 дней!\n"
-                                f"📅 До: "
-                                f"{user.premium_until.strftime('%d.%m.%Y')}"
-                            ),
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Notification error: {e}"
-                        )
-
-                await session.commit()
-
-    elif event_type == "payment.canceled" and payment_id:
-        async with async_session() as session:
-            result = await session.execute(
-                select(Payment).where(
-                    Payment.yookassa_payment_id == payment_id
-                )
-            )
-            payment = result.scalar_one_or_none()
-            if payment:
-                payment.status = PaymentStatus.CANCELLED.value
-                await session.commit()
+    if is_new:
+        payment_events.notify()
 
     return {"status": "ok"}
 
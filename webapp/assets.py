@@ -0,0 +1,221 @@
+"""
+Статика Mini App: отпечатки, предсжатие и вечный кэш.
+
+При импорте каталог static обходится один раз: для каждого файла
+считается хэш содержимого, а текстовые файлы заранее сжимаются
+в gzip и (если установлен brotli) в br. Шаблоны получают функцию
+static('js/app.js') → /static/js/app.3f9c2a1b0d.js.
+
+URL с отпечатком отдаётся с immutable-кэшем на год: новая версия
+файла — новый URL. Обычный путь без хэша тоже работает (no-cache
++ ETag), чтобы старые ссылки не ломались. У каждой кодировки свой
+ETag: это разные байты, и 304 подтверждает именно ту копию,
+которая лежит у клиента.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # без brotli остаётся gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+URL_PREFIX = "/static"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Что имеет смысл сжимать
+COMPRESSIBLE = {
+    "text/css", "text/html", "text/plain",
+    "application/javascript", "text/javascript",
+    "application/json", "image/svg+xml",
+}
+# Мелкие файлы не сжимаем — выигрыш меньше заголовков
+MIN_COMPRESS_SIZE = 512
+# Суффикс ETag сжатой копии
+ETAG_SUFFIXES = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+@dataclass
+class Asset:
+    path: str  # относительный путь: js/app.js
+    hashed_path: str  # js/app.3f9c2a1b0d.js
+    media_type: str
+    digest: str
+    # кодировка → байты; "identity" есть всегда
+    bodies: dict[str, bytes] = field(default_factory=dict)
+    # кодировка → ETag
+    etags: dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.etags = {
+            encoding: f'"{self.digest}{ETAG_SUFFIXES[encoding]}"'
+            for encoding in self.bodies
+        }
+
+    def pick(self, accept_encoding: str) -> tuple[str, bytes]:
+        """Лучший вариант под Accept-Encoding клиента."""
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies["identity"]
+
+
+def _parse_accept_encoding(header: str) -> set[str]:
+    """
+    Кодировки с q > 0. «*» добавляет только те, что не названы
+    явно: «br;q=0, *» означает «что угодно, кроме br».
+    """
+    weights: dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    star = weights.pop("*", 0.0)
+    accepted = {name for name, q in weights.items() if q > 0}
+    if star > 0:
+        accepted |= {e for e in ("br", "gzip") if e not in weights}
+    return accepted
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match со списком тегов и слабым сравнением (W/)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _fingerprint(path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+def _build_asset(path: str, data: bytes) -> Asset:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type.endswith("javascript"):
+        media_type += "; charset=utf-8"
+
+    bodies = {"identity": data}
+    if (
+        media_type.split(";")[0] in COMPRESSIBLE
+        and len(data) >= MIN_COMPRESS_SIZE
+    ):
+        variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(data, quality=11)
+        for encoding, body in variants.items():
+            if len(body) < len(data):
+                bodies[encoding] = body
+
+    return Asset(
+        path=path,
+        hashed_path=_fingerprint(path, digest),
+        media_type=media_type,
+        digest=digest,
+        bodies=bodies,
+    )
+
+
+class AssetManifest:
+    """Все файлы статики в памяти, с отпечатками и сжатыми копиями."""
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self.by_path: dict[str, Asset] = {}
+        self.by_hashed: dict[str, Asset] = {}
+        self.load()
+
+    def load(self) -> None:
+        by_path = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                full = os.path.join(root, filename)
+                rel = os.path.relpath(full, self.directory).replace(
+                    os.sep, "/"
+                )
+                with open(full, "rb") as f:
+                    by_path[rel] = _build_asset(rel, f.read())
+        self.by_path = by_path
+        self.by_hashed = {a.hashed_path: a for a in by_path.values()}
+
+        raw = sum(len(a.bodies["identity"]) for a in by_path.values())
+        packed = sum(
+            min(len(b) for b in a.bodies.values())
+            for a in by_path.values()
+        )
+        logger.info(
+            f"Статика: {len(by_path)} файлов, "
+            f"{raw // 1024} КБ → {packed // 1024} КБ сжатыми"
+            + ("" if brotli else " (brotli не установлен, только gzip)")
+        )
+
+    def url(self, path: str) -> str:
+        """URL с отпечатком (для шаблонов)."""
+        path = path.lstrip("/")
+        asset = self.by_path.get(path)
+        if asset is None:
+            logger.warning(f"Статика: нет файла {path}")
+            return f"{URL_PREFIX}/{path}"
+        return f"{URL_PREFIX}/{asset.hashed_path}"
+
+    def lookup(self, path: str) -> tuple[Optional[Asset], bool]:
+        """(файл, адресован ли по отпечатку)."""
+        asset = self.by_hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self.by_path.get(path), False
+
+
+assets = AssetManifest()
+
+router = APIRouter()
+
+
+@router.get(URL_PREFIX + "/{path:path}", include_in_schema=False)
+async def serve_static(path: str, request: Request):
+    asset, immutable = assets.lookup(path)
+    if asset is None:
+        raise HTTPException(404, "Not found")
+
+    encoding, body = asset.pick(request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": asset.etags[encoding],
+        "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(
+        request.headers.get("if-none-match"), asset.etags[encoding]
+    ):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=asset.media_type, headers=headers)
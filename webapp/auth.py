@@ -0,0 +1,155 @@
+"""
+Аутентификация запросов Mini App по initData Telegram.
+
+Клиент передаёт строку Telegram.WebApp.initData в заголовке
+X-Telegram-Init-Data. Ключ WebAppData выводится из токена бота
+один раз; проверенные строки кэшируются (LRU), так что повторные
+запросы той же сессии не разбирают строку и не пересчитывают HMAC.
+Просроченные initData отклоняются и из кэша.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import Header, HTTPException
+from sqlalchemy import select
+
+from bot.config import config
+from bot.database import async_session, User
+
+logger = logging.getLogger(__name__)
+
+INIT_DATA_HEADER = "X-Telegram-Init-Data"
+CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True, slots=True)
+class WebAppIdentity:
+    """Проверенный пользователь из initData."""
+    telegram_id: int
+    user: dict
+    auth_date: int
+
+
+@lru_cache(maxsize=4)
+def secret_key(bot_token: str) -> bytes:
+    """HMAC-ключ WebAppData (зависит только от токена)."""
+    return hmac.new(
+        b"WebAppData", bot_token.encode(), hashlib.sha256,
+    ).digest()
+
+
+class InitDataVerifier:
+    """Проверка initData с LRU-кэшем успешных проверок."""
+
+    def __init__(self, max_age: int, size: int = CACHE_SIZE):
+        self.max_age = max_age
+        self.size = size
+        # Ключ — строка initData целиком: hash и auth_date входят
+        # в неё, а разбирать строку на попадании не нужно
+        self._cache: OrderedDict[str, WebAppIdentity] = OrderedDict()
+
+    def verify(
+        self, init_data: str, now: Optional[float] = None,
+    ) -> Optional[WebAppIdentity]:
+        """WebAppIdentity или None, если подпись неверна или устарела."""
+        if not init_data:
+            return None
+        now = time.time() if now is None else now
+        if init_data in self._cache:
+            return self.cached(init_data, now)
+
+        parsed = dict(parse_qsl(init_data, keep_blank_values=True))
+        check_hash = parsed.pop("hash", "")
+        identity = self._check(parsed, check_hash, now)
+        if identity is not None:
+            self._cache[init_data] = identity
+            if len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return identity
+
+    def cached(
+        self, init_data: str, now: Optional[float] = None,
+    ) -> Optional[WebAppIdentity]:
+        """Ранее проверенный initData из кэша — без разбора и HMAC."""
+        identity = self._cache.get(init_data)
+        if identity is None:
+            return None
+        now = time.time() if now is None else now
+        if now - identity.auth_date > self.max_age:
+            del self._cache[init_data]
+            return None
+        self._cache.move_to_end(init_data)
+        return identity
+
+    def _check(
+        self, parsed: dict, check_hash: str, now: float,
+    ) -> Optional[WebAppIdentity]:
+        data_check_string = "\n".join(
+            f"{k}={v}" for k, v in sorted(parsed.items())
+        )
+        computed = hmac.new(
+            secret_key(config.bot.token),
+            data_check_string.encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        if not hmac.compare_digest(computed, check_hash):
+            return None
+
+        try:
+            auth_date = int(parsed.get("auth_date", 0))
+            user = json.loads(parsed.get("user", "{}"))
+            telegram_id = int(user["id"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"initData без пользователя: {e}")
+            return None
+        if now - auth_date > self.max_age:
+            return None
+        return WebAppIdentity(telegram_id, user, auth_date)
+
+
+verifier = InitDataVerifier(max_age=config.webapp.auth_max_age)
+
+
+# ============== Зависимости FastAPI ==============
+
+async def webapp_identity(
+    telegram_id: int,
+    init_data: Optional[str] = Header(None, alias=INIT_DATA_HEADER),
+) -> WebAppIdentity:
+    """
+    Проверить initData и что он принадлежит владельцу telegram_id
+    из пути. Без обращения к БД.
+    """
+    if not config.webapp.auth_required:
+        return WebAppIdentity(telegram_id, {}, 0)
+
+    identity = verifier.verify(init_data or "")
+    if identity is None:
+        raise HTTPException(401, "Invalid initData")
+    if identity.telegram_id != telegram_id:
+        raise HTTPException(403, "Forbidden")
+    return identity
+
+
+async def webapp_user(
+    telegram_id: int,
+    init_data: Optional[str] = Header(None, alias=INIT_DATA_HEADER),
+) -> User:
+    """Проверенный пользователь из БД (для изменяющих запросов)."""
+    identity = await webapp_identity(telegram_id, init_data)
+    async with async_session() as session:
+        user = (await session.execute(
+            select(User).where(User.telegram_id == identity.telegram_id)
+        )).scalar_one_or_none()
+    if not user:
+        raise HTTPException(404, "User not found")
+    return user
@@ -0,0 +1,101 @@
+"""
+HTML-страницы Mini App, отрендеренные один раз.
+
+Шаблоны зависят только от констант (URL приложения, адреса статики
+с отпечатками), поэтому рендерятся при старте в байты с ETag
+и дальше отдаются как есть. В режиме разработки (WEBAPP_DEV)
+при изменении шаблонов или статики всё пересобирается.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from jinja2 import Environment
+
+from webapp.assets import AssetManifest
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedPage:
+    """Готовая страница: байты, ETag и заголовки."""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, html: str):
+        self.body = html.encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+        # Страница ссылается на статику с отпечатками —
+        # после деплоя клиент должен получить новые ссылки
+        self.headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+
+
+class PageCache:
+    """Отрендеренные шаблоны по имени."""
+
+    def __init__(
+        self,
+        env: Environment,
+        context: dict[str, Any],
+        assets: AssetManifest,
+        dev_mode: bool = False,
+    ):
+        self.env = env
+        self.context = context
+        self.assets = assets
+        self.dev_mode = dev_mode
+        self._pages: dict[str, RenderedPage] = {}
+        self._stamp: Optional[float] = None
+
+    def _sources_stamp(self) -> float:
+        """Последнее изменение шаблонов и статики."""
+        dirs = [*self.env.loader.searchpath, self.assets.directory]
+        latest = 0.0
+        for directory in dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    latest = max(
+                        latest,
+                        os.path.getmtime(os.path.join(root, filename)),
+                    )
+        return latest
+
+    def render_all(self, names: list[str]) -> None:
+        """Отрендерить страницы (при старте)."""
+        for name in names:
+            self._pages[name] = RenderedPage(
+                self.env.get_template(name).render(**self.context)
+            )
+        logger.info(f"Страницы отрендерены: {', '.join(names)}")
+
+    def _reload_if_changed(self) -> None:
+        stamp = self._sources_stamp()
+        if stamp == self._stamp:
+            return
+        if self._stamp is not None:
+            self.assets.load()
+        self._stamp = stamp
+        self.render_all(list(self._pages))
+
+    def get(self, name: str) -> RenderedPage:
+        if self.dev_mode:
+            self._reload_if_changed()
+        page = self._pages.get(name)
+        if page is None:
+            self.render_all([name])
+            page = self._pages[name]
+        return page
+
+    def response(self, request: Request, name: str) -> Response:
+        page = self.get(name)
+        if request.headers.get("if-none-match") == page.etag:
+            return Response(status_code=304, headers=page.headers)
+        return Response(
+            page.body,
+            media_type="text/html; charset=utf-8",
+            headers=page.headers,
+        )
@@ -0,0 +1,225 @@
+"""
+Ограничение частоты запросов к API Mini App.
+
+ASGI-middleware для /api/*:
+
+- token bucket на пользователя для запросов с проверенным initData
+  (за одним NAT их бывает много — IP для них не ограничивается)
+  и на IP для остальных; тяжёлые эндпоинты стоят больше токенов;
+- initData, которого ещё нет в кэше auth, до проверки подписи
+  (HMAC) идёт по корзине IP — поток поддельных initData упирается
+  в лимит IP раньше, чем в CPU;
+- корзины лежат в LRU ограниченного размера, неактивные дольше
+  idle_ttl выбрасываются;
+- при насыщении процесса (max_concurrent запросов в работе)
+  новые запросы сразу получают 429 вместо очереди.
+
+На отказ — 429 с Retry-After. Счётчики — RateLimiter.stats().
+IP берётся из request.client: за прокси uvicorn подставляет его
+из X-Forwarded-For (FORWARDED_ALLOW_IPS).
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+
+from bot.config import RateLimitConfig
+from webapp.auth import INIT_DATA_HEADER, verifier
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/"
+
+# Стоимость запроса в токенах (по префиксу пути)
+COSTS = {
+    "/api/bootstrap/": 3,
+    "/api/analytics/": 3,
+    "/api/forecast/": 2,
+}
+
+
+def request_cost(path: str) -> int:
+    for prefix, cost in COSTS.items():
+        if path.startswith(prefix):
+            return cost
+    return 1
+
+
+class TokenBuckets:
+    """Корзины по ключу в LRU с вытеснением по простою."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int, ttl: float):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.ttl = ttl
+        # ключ → [токены, время последнего обращения]
+        self._buckets: OrderedDict[object, list[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        # Порядок LRU совпадает с порядком обращений: старые — в начале
+        buckets = self._buckets
+        while buckets:
+            key, (_, last) = next(iter(buckets.items()))
+            if now - last < self.ttl and len(buckets) <= self.max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def _refill(self, key, now: float) -> list[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(
+                self.burst, bucket[0] + (now - bucket[1]) * self.rate
+            )
+            bucket[1] = now
+        return bucket
+
+    def wait_time(self, key, cost: float, now: float) -> float:
+        """0 — токенов хватает, иначе сколько секунд ждать."""
+        tokens = self._refill(key, now)[0]
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / self.rate
+
+    def take(self, key, cost: float) -> None:
+        self._buckets[key][0] -= cost
+
+
+class RateLimiter:
+    """Решение по запросу и счётчики процесса."""
+
+    def __init__(self, cfg: RateLimitConfig):
+        self.cfg = cfg
+        self.users = TokenBuckets(
+            cfg.user_rate, cfg.user_burst, cfg.max_keys, cfg.idle_ttl,
+        )
+        self.ips = TokenBuckets(
+            cfg.ip_rate, cfg.ip_burst, cfg.max_keys, cfg.idle_ttl,
+        )
+        self.inflight = 0
+        self.counters = {
+            "allowed": 0,
+            "limited_user": 0,
+            "limited_ip": 0,
+            "shed": 0,
+            "peak_inflight": 0,
+        }
+
+    def check(
+        self,
+        user_key: Optional[int],
+        ip: Optional[str],
+        cost: int,
+        now: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        None — пропустить, иначе Retry-After в секундах.
+        С user_key списывается только корзина пользователя,
+        без него — корзина IP.
+        """
+        if self.inflight >= self.cfg.max_concurrent:
+            self.counters["shed"] += 1
+            return 1
+
+        now = time.monotonic() if now is None else now
+        if user_key is not None:
+            buckets, key, counter = self.users, user_key, "limited_user"
+        elif ip:
+            buckets, key, counter = self.ips, ip, "limited_ip"
+        else:
+            self.counters["allowed"] += 1
+            return None
+
+        wait = buckets.wait_time(key, cost, now)
+        if wait:
+            self.counters[counter] += 1
+            return max(1, math.ceil(wait))
+        buckets.take(key, cost)
+        self.counters["allowed"] += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "inflight": self.inflight,
+            "user_keys": len(self.users),
+            "ip_keys": len(self.ips),
+        }
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RateLimitMiddleware:
+    """ASGI-middleware: лимиты и сброс нагрузки для /api/*."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+        self._init_data_header = INIT_DATA_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.limiter.cfg.enabled
+            or not scope["path"].startswith(API_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        init_data = _header(scope, self._init_data_header)
+        identity = verifier.cached(init_data) if init_data else None
+        cost = request_cost(scope["path"])
+
+        if identity is not None:
+            retry_after = self.limiter.check(identity.telegram_id, None, cost)
+        else:
+            # Новый или поддельный initData проверит (HMAC) зависимость
+            # auth — только если запрос прошёл лимит по IP. Успешная
+            # проверка попадёт в кэш, и дальше сессия идёт по
+            # корзине пользователя
+            client = scope.get("client")
+            retry_after = self.limiter.check(
+                None, client[0] if client else None, cost,
+            )
+        if retry_after is not None:
+            await self._reject(send, retry_after)
+            return
+
+        limiter = self.limiter
+        limiter.inflight += 1
+        if limiter.inflight > limiter.counters["peak_inflight"]:
+            limiter.counters["peak_inflight"] = limiter.inflight
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.inflight -= 1
+
+    @staticmethod
+    async def _reject(send, retry_after: int) -> None:
+        body = orjson.dumps({"detail": "Too Many Requests"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,117 @@
+"""
+Сериализация ответов Mini App через orjson.
+
+- json_response — ORJSONResponse в обход jsonable_encoder
+  (dict/list/dataclass/date orjson кодирует сам).
+- SubscriptionOut — типизированная строка списка подписок;
+  orjson сериализует dataclass напрямую, без промежуточного dict.
+- StaticJSON — константный payload, закодированный в байты один
+  раз при импорте, с ETag и долгим кэшем.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+from bot.config import SUBSCRIPTION_CATEGORIES
+from bot.services.read_models import SubListRow
+from bot.utils.helpers import billing_cycle_name, days_until
+
+# Кэш для неизменяемых справочников (сек)
+STATIC_MAX_AGE = 24 * 60 * 60
+
+
+def json_response(
+    content: Any,
+    response: Optional[Response] = None,
+    status_code: int = 200,
+) -> ORJSONResponse:
+    """
+    Готовый JSON-ответ. Заголовки, выставленные на response
+    (например, ETag), переносятся в ответ.
+    """
+    return ORJSONResponse(
+        content,
+        status_code=status_code,
+        headers=dict(response.headers) if response is not None else None,
+    )
+
+
+@dataclass(slots=True)
+class SubscriptionOut:
+    """Подписка в списке Mini App (даты orjson пишет в ISO)."""
+    id: int
+    name: str
+    price: float
+    monthly_price: float
+    category: str
+    category_name: str
+    billing_cycle: str
+    billing_cycle_name: str
+    status: str
+    usage_level: str
+    is_trial: bool
+    trial_end_date: Optional[date]
+    next_billing_date: Optional[date]
+    days_until_billing: Optional[int]
+    last_used: Optional[date]
+    notes: Optional[str]
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, s: SubListRow) -> "SubscriptionOut":
+        return cls(
+            id=s.id,
+            name=s.name,
+            price=s.price,
+            monthly_price=s.monthly,
+            category=s.category,
+            category_name=SUBSCRIPTION_CATEGORIES.get(
+                s.category, "Другое"
+            ),
+            billing_cycle=s.billing_cycle,
+            billing_cycle_name=billing_cycle_name(s.billing_cycle),
+            status=s.status,
+            usage_level=s.usage_level,
+            is_trial=s.is_trial,
+            trial_end_date=s.trial_end_date,
+            next_billing_date=s.next_billing_date,
+            days_until_billing=(
+                days_until(s.next_billing_date)
+                if s.next_billing_date else None
+            ),
+            last_used=s.last_used,
+            notes=s.notes,
+            created_at=s.created_at,
+        )
+
+
+class StaticJSON:
+    """Неизменяемый JSON: байты, ETag и заголовки считаются один раз."""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, content: Any, max_age: int = STATIC_MAX_AGE):
+        self.body = orjson.dumps(content)
+        digest = hashlib.sha1(self.body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={max_age}",
+        }
+
+    def response(self, request: Optional[Request] = None) -> Response:
+        if request is not None and (
+            request.headers.get("if-none-match") == self.etag
+        ):
+            return Response(status_code=304, headers=self.headers)
+        return Response(
+            self.body,
+            media_type="application/json",
+            headers=self.headers,
+        )
@@ -47,28 +47,68 @@ document.addEventListener('DOMContentLoaded', async () => {
 
 // ============== Загрузка данных ==============
 
+/**
+ * Заголовки запросов к API: initData подписан Telegram,
+ * по нему сервер проверяет, что запрос от владельца данных.
+ */
+function apiHeaders(extra = {}) {
+    return {
+        ...extra,
+        'X-Telegram-Init-Data': tg?.initData || '',
+    };
+}
+
+/**
+ * GET с ревалидацией по ETag: ответ хранится в localStorage,
+ * повторный запрос идёт с If-None-Match, и на 304 сервер
+ * ничего не пересчитывает — берём сохранённое.
+ */
+async function fetchJSON(url) {
+    const key = 'etag:' + url;
+    let cached = null;
+    try {
+        cached = JSON.parse(localStorage.getItem(key));
+    } catch (e) {
+        cached = null;
+    }
+
+    const headers = apiHeaders(
+        cached?.etag ? { 'If-None-Match': cached.etag } : {}
+    );
+    const res = await fetch(url, { headers, cache: 'no-store' });
+
+    if (res.status === 304 && cached) return cached.data;
+    if (!res.ok) return null;
+
+    const data = await res.json();
+    const etag = res.headers.get('ETag');
+    if (etag) {
+        try {
+            localStorage.setItem(key, JSON.stringify({ etag, data }));
+        } catch (e) {
+            // Переполнен storage — просто работаем без кэша
+        }
+    }
+    return data;
+}
+
 async function loadAll() {
     try {
-        const [userRes, subsRes, analytRes] =
-            await Promise.all([
-                fetch(`/api/user/${userId}`),
-                fetch(`/api/subscriptions/${userId}`),
-                fetch(`/api/analytics/${userId}`),
-            ]);
-
-        if (userRes.ok) {
-            userData = await userRes.json();
+        // Пользователь, подписки, аналитика и ачивки — одним запросом
+        const data = await fetchJSON(`/api/bootstrap/${userId}`);
+
+        if (data) {
+            userData = data.user;
             renderUserInfo();
-        }
-        if (subsRes.ok) {
-            const data = await subsRes.json();
+
             subsData = data.subscriptions || [];
             renderSubscriptions();
-        }
-        if (analytRes.ok) {
-            analyticsData = await analytRes.json();
+
+            analyticsData = data.analytics;
             renderAnalytics();
             startPainCounter();
+
+            renderAchievements(data.achievements);
         }
 
         // Загружаем популярные подписки
@@ -80,15 +120,6 @@ async function loadAll() {
             renderPopularSubs(popData);
             fillCategorySelect(popData.categories);
         }
-
-        // Загружаем ачивки
-        const achRes = await fetch(
-            `/api/achievements/${userId}`
-        );
-        if (achRes.ok) {
-            const achData = await achRes.json();
-            renderAchievements(achData);
-        }
     } catch (e) {
         console.error('Load error:', e);
         showToast('Ошибка загрузки данных');
@@ -323,7 +354,10 @@ function startPainCounter() {
     const amountEl = document.getElementById('pain-amount');
     const todayEl = document.getElementById('pain-today');
 
-    let accumulated = pc.today;
+    // Ответ может быть из кэша — «сегодня» считаем от текущего времени
+    const now = new Date();
+    let accumulated = pc.per_minute *
+        (now.getHours() * 60 + now.getMinutes());
     const perSecond = pc.per_minute / 60;
 
     if (painInterval) clearInterval(painInterval);
@@ -431,9 +465,9 @@ async function saveUsage(subId) {
             `/api/subscriptions/${userId}/${subId}`,
             {
                 method: 'PUT',
-                headers: {
+                headers: apiHeaders({
                     'Content-Type': 'application/json'
-                },
+                }),
                 body: JSON.stringify({
                     usage_level: usage
                 }),
@@ -462,7 +496,7 @@ async function cancelSub(subId) {
     try {
         const res = await fetch(
             `/api/subscriptions/${userId}/${subId}`,
-            { method: 'DELETE' }
+            { method: 'DELETE', headers: apiHeaders() }
         );
 
         if (res.ok) {
@@ -597,9 +631,9 @@ function setupForm() {
                 `/api/subscriptions/${userId}`,
                 {
                     method: 'POST',
-                    headers: {
+                    headers: apiHeaders({
                         'Content-Type': 'application/json'
-                    },
+                    }),
                     body: JSON.stringify(body),
                 }
             );